@@ -1,10 +1,17 @@
 import streamlit as st
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 import os
 import time
 import subprocess
 import platform
+from datetime import datetime, timezone
+from urllib.parse import quote
 from dotenv import load_dotenv
+from patient_db import (
+    CUISINES, EXISTS_PROJECTION, GENDERS, PATIENT_SEARCH_PAGE_SIZE, backfill_search_keys, duplicate_mrns,
+    ensure_indexes, search_keys, search_patients,
+)
 
 # Page configuration
 st.set_page_config(
@@ -166,17 +173,50 @@ client = MongoClient(connection_url)
 db = client["medical_records_db"]
 collection = db["patients"]
 
+# Streamlit reruns this script on every interaction; only set up indexes once per process.
+# Returns the duplicated MRNs that keep the unique MRN index from being built, if any.
+@st.cache_resource
+def prepare_patient_collection():
+    try:
+        ensure_indexes(collection)
+        duplicates = []
+    except DuplicateKeyError:
+        duplicates = duplicate_mrns(collection)
+    backfill_search_keys(collection)
+    return duplicates
+
+duplicated_mrns = prepare_patient_collection()
+
 # Utility functions
 def get_patient_by_mrn(mrn_number):
     return collection.find_one({"MRN Number": mrn_number})
 
+def patient_exists(mrn_number):
+    return collection.find_one({"MRN Number": mrn_number}, EXISTS_PROJECTION) is not None
+
+# "Last Updated" and "Record Version" let the chat backend notice edits and drop its cached copy of the patient
 def save_patient_data(patient_data):
-    collection.insert_one(patient_data)
+    collection.insert_one({
+        **patient_data,
+        **search_keys(patient_data),
+        "Last Updated": datetime.now(timezone.utc),
+        "Record Version": 1,
+    })
 
 def update_patient_data(mrn_number, updated_data):
-    collection.update_one({"MRN Number": mrn_number}, {"$set": updated_data})
-
-def activate_chat_application():
+    collection.update_one(
+        {"MRN Number": mrn_number},
+        {
+            "$set": {
+                **updated_data,
+                **search_keys(updated_data),
+                "Last Updated": datetime.now(timezone.utc),
+            },
+            "$inc": {"Record Version": 1},
+        },
+    )
+
+def activate_chat_application(mrn_number):
     st.write("Activating chat application...")
     
     # Commands for the chat application
@@ -195,6 +235,8 @@ def activate_chat_application():
 
     if process_uvicorn.poll() is None and process_npm.poll() is None:
         st.write("Chat application started successfully.")
+        # The chat client forwards the MRN with every query, so each tab talks about its own patient
+        st.markdown(f"[Open chat for patient {mrn_number}](http://localhost:3000/?mrn={quote(mrn_number)})")
     else:
         st.write("Failed to start the chat application. Please check the terminal for errors.")
 # Initialize session state
@@ -208,6 +250,14 @@ def main():
         st.title("🏥 Medical Records Management System")
         st.markdown("</div>", unsafe_allow_html=True)
 
+    if duplicated_mrns:
+        listed = ", ".join(f"{mrn} ({count} records)" for mrn, count in duplicated_mrns)
+        st.error(
+            "MRN Numbers must be unique, but these belong to more than one record: "
+            f"{listed}. Merge or renumber those records and restart the app; until then new "
+            "records with an existing MRN are not rejected."
+        )
+
     if not st.session_state.create_new_patient:
         display_main_form()
     else:
@@ -227,7 +277,7 @@ def display_main_form():
                 if mrd_number_input:
                     patient_data = get_patient_by_mrn(mrd_number_input)
                     if patient_data:
-                        display_patient_details(patient_data)
+                        display_patient_details(patient_data, key="lookup")
                     else:
                         st.warning("Patient not found. Would you like to create a new record?")
                 else:
@@ -236,9 +286,8 @@ def display_main_form():
         with col2:
             if st.button("💬 Open Chat"):
                 if mrd_number_input:
-                    patient_data = get_patient_by_mrn(mrd_number_input)
-                    if patient_data:
-                        activate_chat_application()
+                    if patient_exists(mrd_number_input):
+                        activate_chat_application(mrd_number_input)
                     else:
                         st.warning("Invalid MRN number")
                 else:
@@ -251,7 +300,52 @@ def display_main_form():
         
         st.markdown("</div>", unsafe_allow_html=True)
 
-def display_patient_details(patient_data):
+    display_patient_search()
+
+def display_patient_search():
+    with st.container():
+        st.markdown('<div class="form-container">', unsafe_allow_html=True)
+        st.subheader("🔍 Find Patient")
+
+        search_text = st.text_input("Search by partial MRN or name", placeholder="e.g., MRN12 or john sm")
+        # Go back to the first page whenever the search text changes
+        if st.session_state.get("patient_search_text") != search_text:
+            st.session_state.patient_search_text = search_text
+            st.session_state.patient_search_page = 0
+        page = st.session_state.get("patient_search_page", 0)
+
+        if search_text.strip():
+            found = search_patients(collection, search_text, page=page, page_size=PATIENT_SEARCH_PAGE_SIZE)
+            if found["results"]:
+                st.dataframe(found["results"], use_container_width=True)
+            else:
+                st.info("No matching patients")
+
+            col1, col2, col3 = st.columns([1, 1, 1])
+            with col1:
+                if page > 0 and st.button("⬅️ Previous"):
+                    st.session_state.patient_search_page = page - 1
+                    st.rerun()
+            with col2:
+                st.write(f"Page {page + 1}")
+            with col3:
+                if found["has_next"] and st.button("Next ➡️"):
+                    st.session_state.patient_search_page = page + 1
+                    st.rerun()
+
+            if found["results"]:
+                selected = st.selectbox("Open record", [""] + [row["MRN Number"] for row in found["results"]])
+                if selected:
+                    patient_data = get_patient_by_mrn(selected)
+                    if patient_data:
+                        display_patient_details(patient_data, key="search")
+
+        st.markdown("</div>", unsafe_allow_html=True)
+
+def display_patient_details(patient_data, key):
+    # Rendered from both the MRN lookup and the search results; `key` keeps their widget IDs apart, and the
+    # MRN makes the form start from the stored values when another patient is opened
+    key = f"{key}_{patient_data['MRN Number']}"
     st.markdown('<div class="form-container">', unsafe_allow_html=True)
     st.subheader(f"Patient Details: {patient_data['Name']}")
     
@@ -259,49 +353,49 @@ def display_patient_details(patient_data):
     st.markdown("### Basic Information")
     col1, col2 = st.columns(2)
     with col1:
-        patient_name = st.text_input("Patient Name", value=patient_data.get("Name", ""))
-        patient_age = st.number_input("Age", value=int(patient_data.get("Age", 0)), min_value=0, max_value=120)
-        patient_email = st.text_input("Email Address", value=patient_data.get("Email", ""))
+        patient_name = st.text_input("Patient Name", value=patient_data.get("Name", ""), key=f"{key}_patient_name")
+        patient_age = st.number_input("Age", value=int(patient_data.get("Age", 0)), min_value=0, max_value=120, key=f"{key}_age")
+        patient_email = st.text_input("Email Address", value=patient_data.get("Email", ""), key=f"{key}_email_address")
     with col2:
-        patient_gender = st.selectbox("Gender", ["Male", "Female", "Other"], 
-                                    index=["Male", "Female", "Other"].index(patient_data.get("Gender", "Other")))
-        patient_phone = st.text_input("Phone Number", value=patient_data.get("Phone", ""))
-        patient_occupation = st.text_input("Occupation", value=patient_data.get("Occupation", ""))
+        patient_gender = st.selectbox("Gender", list(GENDERS), 
+                                    index=list(GENDERS).index(patient_data.get("Gender", "Other")), key=f"{key}_gender")
+        patient_phone = st.text_input("Phone Number", value=patient_data.get("Phone", ""), key=f"{key}_phone_number")
+        patient_occupation = st.text_input("Occupation", value=patient_data.get("Occupation", ""), key=f"{key}_occupation")
 
     # Medical Information
     st.markdown("### Medical Information")
     col1, col2 = st.columns(2)
     with col1:
-        weight = st.number_input("Weight (kg)", value=float(patient_data.get("Weight", 0.0)), min_value=0.0)
-        weight_changes = st.text_area("Weight Changes", value=patient_data.get("Weight Changes", ""))
-        specific_diet = st.text_area("Specific Diet", value=patient_data.get("Specific Diet", ""))
+        weight = st.number_input("Weight (kg)", value=float(patient_data.get("Weight", 0.0)), min_value=0.0, key=f"{key}_weight_kg")
+        weight_changes = st.text_area("Weight Changes", value=patient_data.get("Weight Changes", ""), key=f"{key}_weight_changes")
+        specific_diet = st.text_area("Specific Diet", value=patient_data.get("Specific Diet", ""), key=f"{key}_specific_diet")
     with col2:
         food_intolerances = st.text_area("Food Intolerances/Allergies", 
-                                        value=patient_data.get("Food Intolerances/Allergies", ""))
-        on_medications = st.text_area("Current Medications", value=patient_data.get("On Medications", ""))
+                                        value=patient_data.get("Food Intolerances/Allergies", ""), key=f"{key}_food_intolerances_allergies")
+        on_medications = st.text_area("Current Medications", value=patient_data.get("On Medications", ""), key=f"{key}_current_medications")
         other_medical_history = st.text_area("Other Medical History", 
-                                           value=patient_data.get("Other Medical History", ""))
+                                           value=patient_data.get("Other Medical History", ""), key=f"{key}_other_medical_history")
 
     # Health Information
     st.markdown("### Health Information")
     col1, col2 = st.columns(2)
     with col1:
         other_health_issues = st.text_area("Other Health Issues", 
-                                         value=patient_data.get("Other Health Issues", ""))
+                                         value=patient_data.get("Other Health Issues", ""), key=f"{key}_other_health_issues")
         physical_activity_type = st.text_input("Physical Activity Type", 
-                                             value=patient_data.get("Physical Activity Type", ""))
+                                             value=patient_data.get("Physical Activity Type", ""), key=f"{key}_physical_activity_type")
         physical_activity_duration = st.number_input("Physical Activity Duration (minutes/day)", 
                                                    value=int(patient_data.get("Physical Activity Duration (minutes/day)", 0)),
-                                                   min_value=0)
+                                                   min_value=0, key=f"{key}_physical_activity_duration_minutes_day")
     with col2:
-        diet_type = st.text_input("Diet Type", value=patient_data.get("Diet Type", ""))
+        diet_type = st.text_input("Diet Type", value=patient_data.get("Diet Type", ""), key=f"{key}_diet_type")
         dietary_restrictions = st.text_area("Dietary Restrictions", 
-                                          value=patient_data.get("Dietary Restrictions", ""))
+                                          value=patient_data.get("Dietary Restrictions", ""), key=f"{key}_dietary_restrictions")
         preferred_cuisine = st.multiselect("Preferred Cuisine", 
-                                         ["Indian", "Continental", "Chinese", "Italian", "Mexican", "Other"],
-                                         default=patient_data.get("Preferred Cuisine", []))
+                                         list(CUISINES),
+                                         default=patient_data.get("Preferred Cuisine", []), key=f"{key}_preferred_cuisine")
 
-    if st.button("💾 Update Patient Data"):
+    if st.button("💾 Update Patient Data", key=f"{key}_update_patient_data"):
         updated_data = {
             "Name": patient_name,
             "Age": patient_age,
@@ -342,7 +436,7 @@ def display_new_patient_form():
             patient_name = st.text_input("Patient Name")
             patient_age = st.number_input("Age", min_value=0, max_value=120)
         with col2:
-            patient_gender = st.selectbox("Gender", ["Male", "Female", "Other"])
+            patient_gender = st.selectbox("Gender", list(GENDERS))
             patient_email = st.text_input("Email Address")
             patient_phone = st.text_input("Phone Number")
         
@@ -371,7 +465,7 @@ def display_new_patient_form():
             diet_type = st.text_input("Diet Type")
             dietary_restrictions = st.text_area("Dietary Restrictions")
             preferred_cuisine = st.multiselect("Preferred Cuisine", 
-                                             ["Indian", "Continental", "Chinese", "Italian", "Mexican", "Other"])
+                                             list(CUISINES))
 
         col1, col2 = st.columns(2)
         with col1:
@@ -398,11 +492,15 @@ def display_new_patient_form():
                         "Dietary Restrictions": dietary_restrictions,
                         "Preferred Cuisine": preferred_cuisine
                     }
-                    save_patient_data(new_data)
-                    st.success("New patient data saved successfully!")
-                    st.session_state.create_new_patient = False
-                    time.sleep(2)
-                    st.rerun()
+                    try:
+                        save_patient_data(new_data)
+                    except DuplicateKeyError:
+                        st.warning("A patient with this MRN Number already exists")
+                    else:
+                        st.success("New patient data saved successfully!")
+                        st.session_state.create_new_patient = False
+                        time.sleep(2)
+                        st.rerun()
                 else:
                     st.warning("Please enter an MRN Number")
         
@@ -0,0 +1,134 @@
+import math
+import os
+import re
+
+try:
+    import tiktoken
+except ImportError:  # fall back to a character estimate below
+    tiktoken = None
+
+# Tokens of scraped content per map call, per target model. The rest of the context window is left for
+# the instructions, the patient profile and the completion.
+CHUNK_TOKEN_BUDGETS = {
+    "llama3-8b-8192": 3000,
+    "llama-3.1-8b-instant": 6000,
+    "gpt-4o-mini": 8000,
+}
+DEFAULT_CHUNK_TOKENS = 2000
+# Overrides the per-model budget when set
+CHUNK_TOKENS = int(os.getenv("CHUNK_TOKENS", "0"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "0"))
+# What split_content() used to cut on; kept to report how many calls the token-aware chunker saves
+LEGACY_CHUNK_CHARS = 2000
+
+_HEADING_RE = re.compile(r"^#{1,6}\s")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None:
+        try:
+            # Llama 3's tokenizer is tiktoken-based; cl100k_base counts are close enough for budgeting
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except Exception:
+            _encoding = False
+    return _encoding
+
+
+def count_tokens(text):
+    encoding = _get_encoding()
+    if encoding:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def token_budget(model):
+    return CHUNK_TOKENS or CHUNK_TOKEN_BUDGETS.get(model, DEFAULT_CHUNK_TOKENS)
+
+
+def _hard_split(text, max_tokens):
+    encoding = _get_encoding()
+    if encoding:
+        ids = encoding.encode(text, disallowed_special=())
+        return [encoding.decode(ids[i:i + max_tokens]) for i in range(0, len(ids), max_tokens)]
+    step = max_tokens * 4
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+def _blocks(content, max_tokens):
+    """
+    Yield (text, tokens, is_heading) units no bigger than max_tokens: markdown paragraphs, falling back
+    to sentences and finally raw token windows for oversized paragraphs.
+    """
+    for paragraph in _PARAGRAPH_RE.split(content):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph)
+        if tokens <= max_tokens:
+            yield paragraph, tokens, bool(_HEADING_RE.match(paragraph))
+            continue
+        for sentence in _SENTENCE_RE.split(paragraph):
+            tokens = count_tokens(sentence)
+            if tokens <= max_tokens:
+                yield sentence, tokens, False
+            else:
+                for piece in _hard_split(sentence, max_tokens):
+                    yield piece, count_tokens(piece), False
+
+
+def chunk_text(content, model="llama3-8b-8192", max_tokens=None, overlap_tokens=CHUNK_OVERLAP_TOKENS):
+    """
+    Pack markdown into chunks of at most `max_tokens` (default: the model's budget), cutting only on
+    paragraph/heading boundaries where possible. A heading stays with the text it introduces, and once
+    a chunk is half full a heading starts a new one. With `overlap_tokens`, trailing paragraphs of a
+    chunk are repeated at the start of the next one.
+    """
+    max_tokens = max_tokens or token_budget(model)
+    overlap_tokens = min(overlap_tokens, max_tokens // 2)
+
+    chunks = []
+    current, current_tokens = [], 0
+
+    def flush():
+        nonlocal current, current_tokens
+        # Keep trailing headings with the content they introduce (unless the chunk is nothing but headings)
+        split = len(current)
+        while split and current[split - 1][2]:
+            split -= 1
+        split = split or len(current)
+        emitted, carried = current[:split], current[split:]
+        chunks.append("\n\n".join(text for text, _, _ in emitted))
+
+        overlap, overlap_size = [], 0
+        for block in reversed(emitted):
+            if overlap_size + block[1] > overlap_tokens:
+                break
+            overlap.insert(0, block)
+            overlap_size += block[1]
+        current = overlap + carried
+        current_tokens = overlap_size + sum(block[1] for block in carried)
+        return carried
+
+    for block in _blocks(content, max_tokens):
+        text, tokens, is_heading = block
+        starts_section = is_heading and current_tokens >= max_tokens // 2
+        if current and (current_tokens + tokens > max_tokens or starts_section):
+            carried = flush()
+            if current_tokens + tokens > max_tokens:
+                # No room for the overlap; a carried heading is small enough to stay regardless
+                current, current_tokens = carried, sum(block[1] for block in carried)
+        current.append(block)
+        current_tokens += tokens
+
+    if current:
+        chunks.append("\n\n".join(text for text, _, _ in current))
+    return chunks
+
+
+def legacy_chunk_count(content):
+    return math.ceil(len(content) / LEGACY_CHUNK_CHARS)
@@ -0,0 +1,78 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# Bounded pool for the blocking SDKs we can't await directly (Tavily, requests, pymongo, PDF generation).
+# Keeping it bounded means a burst of slow queries queues here instead of spawning unbounded threads.
+BLOCKING_IO_WORKERS = int(os.getenv("BLOCKING_IO_WORKERS", "16"))
+
+blocking_executor = ThreadPoolExecutor(max_workers=BLOCKING_IO_WORKERS, thread_name_prefix="blocking-io")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """
+    Run a blocking call on the shared worker pool so it doesn't stall the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(blocking_executor, partial(func, *args, **kwargs))
+
+
+async def bounded_gather(coroutines, limit):
+    """
+    Like asyncio.gather (results keep the input order) but with at most `limit` coroutines in flight.
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(coro):
+        async with semaphore:
+            return await coro
+
+    return await asyncio.gather(*(run(coro) for coro in coroutines))
+
+
+class TokenBucketLimiter:
+    """
+    Async token-bucket limiter for provider quotas expressed as requests and tokens per minute.
+    Both buckets start full and refill continuously; a limit of 0 disables that bucket.
+    """
+
+    def __init__(self, rpm, tpm):
+        self.rpm = rpm
+        self.tpm = tpm
+        self._requests = float(rpm)
+        self._tokens = float(tpm)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated
+        self._updated = now
+        if self.rpm:
+            self._requests = min(self.rpm, self._requests + elapsed * self.rpm / 60)
+        if self.tpm:
+            self._tokens = min(self.tpm, self._tokens + elapsed * self.tpm / 60)
+
+    async def acquire(self, tokens=0):
+        # A single request bigger than the whole per-minute budget still has to go through eventually
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        # Holding the lock while sleeping keeps waiters FIFO
+        async with self._lock:
+            while True:
+                self._refill()
+                requests_ok = not self.rpm or self._requests >= 1
+                tokens_ok = not self.tpm or self._tokens >= tokens
+                if requests_ok and tokens_ok:
+                    if self.rpm:
+                        self._requests -= 1
+                    if self.tpm:
+                        self._tokens -= tokens
+                    return
+                wait = 0.0
+                if not requests_ok:
+                    wait = max(wait, (1 - self._requests) * 60 / self.rpm)
+                if not tokens_ok:
+                    wait = max(wait, (tokens - self._tokens) * 60 / self.tpm)
+                await asyncio.sleep(wait)
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import re
+
+from chunking import count_tokens
+from textutils import normalize_text
+
+# Paragraphs whose text is mostly link anchors are navigation menus, related-article lists and the like
+MAX_LINK_DENSITY = float(os.getenv("CLEAN_MAX_LINK_DENSITY", "0.5"))
+# Estimated Jaccard similarity above which a paragraph counts as a near-duplicate of one already kept
+NEAR_DUP_THRESHOLD = float(os.getenv("CLEAN_NEAR_DUP_THRESHOLD", "0.8"))
+SHINGLE_SIZE = 5
+MINHASH_BANDS = 8
+MINHASH_ROWS = 4
+# Footer phrases only condemn short paragraphs; a long paragraph quoting one is probably content
+BOILERPLATE_MAX_CHARS = 400
+
+_LINK_RE = re.compile(r"!?\[([^\]]*)\]\([^)]*\)")
+_BARE_URL_RE = re.compile(r"https?://\S+")
+_PARAGRAPH_RE = re.compile(r"\n\s*\n")
+_HEADING_RE = re.compile(r"^#{1,6}\s")
+# A paragraph made only of these labels (one per line, or separated by "|") is a menu, button row or banner.
+# Anchored to the whole label so text that merely mentions "cookies" or "log insulin" is kept.
+_BOILERPLATE_LABEL_RE = re.compile(
+    r"^\W*(?:home|menu|search|print|email|close|next|previous|contact(?: us)?|about(?: us)?"
+    r"|log ?(?:in|out)|sign (?:in|up|out)|register|subscribe|newsletter|advertisement|skip to (?:main )?content"
+    r"|back to top|related articles|you may also like|follow us(?: on \w+)?|share(?: on \w+| this(?: page| article)?)?"
+    r"|accept(?: all)?(?: cookies)?|manage preferences|privacy policy|cookie (?:policy|settings|preferences)"
+    r"|terms (?:of use|and conditions|of service))\W*$",
+    re.IGNORECASE,
+)
+_LABEL_SEPARATOR_RE = re.compile(r"\n|\s\|\s")
+# Phrases that only appear in footers and consent banners
+_BOILERPLATE_PHRASE_RE = re.compile(
+    r"\ball rights reserved\b|©|\bcopyright \d{4}\b|\b(?:we|this (?:web)?site) uses? cookies\b"
+    r"|\b(?:subscribe to|sign up for) our newsletter\b",
+    re.IGNORECASE,
+)
+
+_MASKS = [
+    int.from_bytes(hashlib.blake2b(str(i).encode(), digest_size=8).digest(), "big")
+    for i in range(MINHASH_BANDS * MINHASH_ROWS)
+]
+
+
+def _link_density(paragraph):
+    link_chars = sum(len(match.group(1)) for match in _LINK_RE.finditer(paragraph))
+    link_chars += sum(len(match.group(0)) for match in _BARE_URL_RE.finditer(paragraph))
+    # Measure against the visible text (anchors, not the URLs behind them)
+    visible = _LINK_RE.sub(lambda m: m.group(1), paragraph)
+    return link_chars / max(len(visible.strip()), 1)
+
+
+def is_boilerplate(paragraph):
+    if _HEADING_RE.match(paragraph):
+        return False
+    visible = normalize_text(_LINK_RE.sub(lambda m: m.group(1), paragraph))
+    if not visible:
+        # Images, separators, empty link lists
+        return True
+    if _link_density(paragraph) > MAX_LINK_DENSITY:
+        return True
+    if len(paragraph) <= BOILERPLATE_MAX_CHARS and _BOILERPLATE_PHRASE_RE.search(paragraph):
+        return True
+    # Short lines alone are not enough: "- Fatigue" or "Type 2 diabetes" are content, "Log in | Subscribe" is not
+    labels = [label for label in _LABEL_SEPARATOR_RE.split(_LINK_RE.sub(lambda m: m.group(1), paragraph)) if label.strip()]
+    return all(_BOILERPLATE_LABEL_RE.match(label.strip()) for label in labels)
+
+
+def _minhash(text):
+    words = text.split()
+    if len(words) < SHINGLE_SIZE:
+        return None
+    shingles = {
+        int.from_bytes(hashlib.blake2b(" ".join(words[i:i + SHINGLE_SIZE]).encode(), digest_size=8).digest(), "big")
+        for i in range(len(words) - SHINGLE_SIZE + 1)
+    }
+    return tuple(min(shingle ^ mask for shingle in shingles) for mask in _MASKS)
+
+
+def _similarity(a, b):
+    return sum(x == y for x, y in zip(a, b)) / len(a)
+
+
+class _NearDuplicateIndex:
+    """
+    MinHash + LSH banding over kept paragraphs.
+    """
+
+    def __init__(self):
+        self._buckets = {}
+        self._signatures = []
+
+    def _bands(self, signature):
+        for band in range(MINHASH_BANDS):
+            yield band, signature[band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS]
+
+    def is_duplicate(self, signature):
+        candidates = set()
+        for key in self._bands(signature):
+            candidates.update(self._buckets.get(key, ()))
+        return any(_similarity(signature, self._signatures[i]) >= NEAR_DUP_THRESHOLD for i in candidates)
+
+    def add(self, signature):
+        index = len(self._signatures)
+        self._signatures.append(signature)
+        for key in self._bands(signature):
+            self._buckets.setdefault(key, []).append(index)
+
+
+def clean_pages(pages):
+    """
+    Strip boilerplate from crawled markdown pages and drop paragraphs that repeat, exactly or nearly,
+    something already seen in this or an earlier page. Returns (cleaned_pages, report); cleaned_pages
+    lines up with `pages`, with "" for a page that had nothing left.
+    """
+    seen_hashes = set()
+    near_duplicates = _NearDuplicateIndex()
+    report = {"boilerplate": 0, "duplicates": 0, "near_duplicates": 0}
+    cleaned_pages = []
+
+    for page in pages:
+        kept = []
+        for paragraph in _PARAGRAPH_RE.split(page):
+            paragraph = paragraph.strip()
+            if not paragraph:
+                continue
+            if is_boilerplate(paragraph):
+                report["boilerplate"] += 1
+                continue
+
+            normalized = normalize_text(paragraph)
+            digest = hashlib.sha1(normalized.encode("utf-8")).digest()
+            # Headings are short and legitimately repeat across pages ("## Symptoms"); keep them
+            if not _HEADING_RE.match(paragraph):
+                if digest in seen_hashes:
+                    report["duplicates"] += 1
+                    continue
+                signature = _minhash(normalized)
+                if signature is not None:
+                    if near_duplicates.is_duplicate(signature):
+                        report["near_duplicates"] += 1
+                        continue
+                    near_duplicates.add(signature)
+            seen_hashes.add(digest)
+            kept.append(paragraph)
+
+        cleaned_pages.append("\n\n".join(kept))
+
+    report["bytes_before"] = sum(len(page.encode("utf-8")) for page in pages)
+    report["bytes_after"] = sum(len(page.encode("utf-8")) for page in cleaned_pages)
+    report["tokens_before"] = sum(count_tokens(page) for page in pages)
+    report["tokens_after"] = sum(count_tokens(page) for page in cleaned_pages)
+    return cleaned_pages, report
+
+
+def format_report(report):
+    saved = report["tokens_before"] - report["tokens_after"]
+    percent = 100 * saved / report["tokens_before"] if report["tokens_before"] else 0.0
+    return (
+        f"Cleaning: {report['bytes_before']} -> {report['bytes_after']} bytes, "
+        f"{report['tokens_before']} -> {report['tokens_after']} tokens ({percent:.0f}% saved); dropped "
+        f"{report['boilerplate']} boilerplate, {report['duplicates']} duplicate and "
+        f"{report['near_duplicates']} near-duplicate paragraphs"
+    )
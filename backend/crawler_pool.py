@@ -0,0 +1,127 @@
+import asyncio
+import os
+from contextlib import asynccontextmanager
+
+from crawl4ai import AsyncWebCrawler
+
+CRAWLER_POOL_SIZE = int(os.getenv("CRAWLER_POOL_SIZE", "3"))
+# Browsers slowly leak memory across pages; replace each one after this many crawls
+CRAWLER_MAX_USES = int(os.getenv("CRAWLER_MAX_USES", "50"))
+
+
+class _Slot:
+    def __init__(self, crawler):
+        self.crawler = crawler
+        self.uses = 0
+        self.failed = False
+        self.retired = False
+
+
+class CrawlerPool:
+    """
+    Long-lived pool of started AsyncWebCrawler instances shared by every request.
+
+    A crawler is recycled once it has served `max_uses` pages, when its last crawl raised, or when its
+    browser is found disconnected on checkout. After close() the pool can't be used again: crawlers
+    still checked out are closed as they are released.
+    """
+
+    def __init__(self, size=CRAWLER_POOL_SIZE, max_uses=CRAWLER_MAX_USES):
+        self.size = size
+        self.max_uses = max_uses
+        self._idle = asyncio.Queue()
+        self._slots = set()  # Every slot, idle or checked out
+        self._started = False
+        self._closed = False
+        self._start_lock = asyncio.Lock()
+
+    async def _launch(self):
+        crawler = AsyncWebCrawler(verbose=True)
+        await crawler.__aenter__()
+        return _Slot(crawler)
+
+    async def _retire(self, slot):
+        if slot.retired:
+            return
+        slot.retired = True
+        try:
+            await slot.crawler.__aexit__(None, None, None)
+        except Exception as e:
+            print(f"Error closing crawler: {e}")
+
+    def _healthy(self, slot):
+        if slot.failed or slot.uses >= self.max_uses:
+            return False
+        strategy = getattr(slot.crawler, "crawler_strategy", None)
+        # The attribute moved between crawl4ai releases; skip the check if we can't find the browser
+        browser = getattr(strategy, "browser", None) or getattr(getattr(strategy, "browser_manager", None), "browser", None)
+        return browser is None or browser.is_connected()
+
+    async def start(self):
+        async with self._start_lock:
+            if self._closed:
+                raise RuntimeError("CrawlerPool is closed")
+            if self._started:
+                return
+            slots = await asyncio.gather(*(self._launch() for _ in range(self.size)))
+            self._slots.update(slots)
+            for slot in slots:
+                self._idle.put_nowait(slot)
+            self._started = True
+
+    async def close(self):
+        async with self._start_lock:
+            self._closed = True
+            retiring = []
+            while not self._idle.empty():
+                slot = self._idle.get_nowait()
+                if slot is not None:
+                    self._slots.discard(slot)
+                    retiring.append(self._retire(slot))
+            # Wakes whoever is waiting for a crawler; each waiter passes it on to the next
+            self._idle.put_nowait(None)
+            await asyncio.gather(*retiring)
+
+    async def _checkout(self):
+        if not self._started:
+            await self.start()
+        slot = await self._idle.get()
+        if slot is None:
+            self._idle.put_nowait(None)
+            raise RuntimeError("CrawlerPool is closed")
+        return slot
+
+    async def _release(self, slot):
+        slot.uses += 1
+        if self._closed:
+            self._slots.discard(slot)
+            await self._retire(slot)
+        else:
+            self._idle.put_nowait(slot)
+
+    @asynccontextmanager
+    async def acquire(self):
+        slot = await self._checkout()
+        try:
+            if not self._healthy(slot):
+                await self._retire(slot)
+                try:
+                    replacement = await self._launch()
+                except Exception:
+                    # Put the dead slot back flagged so the next checkout tries again
+                    slot.failed = True
+                    raise
+                self._slots.discard(slot)
+                self._slots.add(replacement)
+                slot = replacement
+            yield slot
+        finally:
+            await self._release(slot)
+
+    async def arun(self, url):
+        async with self.acquire() as slot:
+            try:
+                return await slot.crawler.arun(url=url)
+            except Exception:
+                slot.failed = True
+                raise
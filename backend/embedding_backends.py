@@ -0,0 +1,107 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from concurrency import run_blocking
+
+# "openai" (remote) or "local" (ONNX model on CPU; no GPU or network needed at runtime)
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "openai")
+# A directory with model.onnx and tokenizer.json, e.g. an ONNX export of sentence-transformers/all-MiniLM-L6-v2
+LOCAL_EMBEDDING_MODEL_DIR = os.getenv("LOCAL_EMBEDDING_MODEL_DIR", "./models/all-MiniLM-L6-v2")
+LOCAL_EMBEDDING_MODEL_FILE = os.getenv("LOCAL_EMBEDDING_MODEL_FILE", "model.onnx")
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", "32"))
+LOCAL_EMBEDDING_MAX_TOKENS = int(os.getenv("LOCAL_EMBEDDING_MAX_TOKENS", "256"))
+# Batches run in parallel on this many threads; the CPU cores are split between them
+LOCAL_EMBEDDING_WORKERS = int(os.getenv("LOCAL_EMBEDDING_WORKERS", "2"))
+
+
+def vector_db_dir(backend):
+    """
+    The vector store for `backend`. Vectors from different models can't share a collection, so each
+    backend has its own store (reindex.py builds the local one from hybrid_db); VECTOR_DB_DIR overrides it.
+    """
+    return os.getenv("VECTOR_DB_DIR") or ("./hybrid_db" if backend == "openai" else "./hybrid_db_local")
+
+
+VECTOR_DB_DIR = vector_db_dir(EMBEDDING_BACKEND)
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    Sentence embeddings from a local ONNX model (mean pooled, unit length) with onnxruntime on CPU.
+
+    Texts are sorted by length into batches so little work goes into padding, and batches run in
+    parallel on a small thread pool.
+    """
+
+    def __init__(self, model_dir=LOCAL_EMBEDDING_MODEL_DIR, model_file=LOCAL_EMBEDDING_MODEL_FILE,
+                 batch_size=LOCAL_EMBEDDING_BATCH_SIZE, max_tokens=LOCAL_EMBEDDING_MAX_TOKENS,
+                 workers=LOCAL_EMBEDDING_WORKERS):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model = f"onnx:{os.path.basename(os.path.normpath(model_dir))}/{model_file}"
+        self.batch_size = batch_size
+
+        self._tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self._tokenizer.enable_truncation(max_length=max_tokens)
+        self._tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = max(1, (os.cpu_count() or 1) // max(1, workers))
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self._session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self._input_names = {model_input.name for model_input in self._session.get_inputs()}
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="embedding")
+
+    def _embed_batch(self, texts):
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self._input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+        output = self._session.run(None, feeds)[0]
+        if output.ndim == 3:
+            # Token embeddings: mean over the real (unpadded) tokens
+            weights = attention_mask[..., None].astype(np.float32)
+            output = (output * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+        output = output / np.clip(np.linalg.norm(output, axis=1, keepdims=True), 1e-12, None)
+        return output.tolist()
+
+    def embed_documents(self, texts):
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        batches = [order[start:start + self.batch_size] for start in range(0, len(order), self.batch_size)]
+        vectors = [None] * len(texts)
+        batch_vectors = self._executor.map(lambda batch: self._embed_batch([texts[i] for i in batch]), batches)
+        for batch, embedded in zip(batches, batch_vectors):
+            for i, vector in zip(batch, embedded):
+                vectors[i] = vector
+        return vectors
+
+    def embed_query(self, text):
+        return self._embed_batch([text])[0]
+
+    async def aembed_documents(self, texts):
+        return await run_blocking(self.embed_documents, texts)
+
+    async def aembed_query(self, text):
+        return await run_blocking(self.embed_query, text)
+
+
+def make_embeddings(backend=EMBEDDING_BACKEND):
+    """
+    The embedding model for `backend`, without the cache (wrap it in CachedEmbeddings).
+    """
+    if backend == "local":
+        return OnnxEmbeddings()
+    if backend == "openai":
+        from langchain.embeddings import OpenAIEmbeddings
+        return OpenAIEmbeddings()
+    raise ValueError(f"Unknown embedding backend {backend!r}; expected 'openai' or 'local'")
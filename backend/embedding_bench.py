@@ -0,0 +1,109 @@
+"""
+Compare embedding backends (OpenAI and the local CPU model) on documents sampled from hybrid_db:
+
+- query latency: one embed_query call per query, p50/p95
+- corpus throughput: documents embedded per second in batches
+- retrieval quality: recall@k of exact cosine search over the sample, with queries generated from the
+  sampled documents (see retrieval_bench.py)
+
+No cache is involved, so every call reaches the model. `--backends local` runs with no network
+(the store is only read); the OpenAI backend needs OPENAI_API_KEY.
+
+Usage: python embedding_bench.py --docs 2000 --queries 200 --backends local openai
+"""
+import argparse
+import random
+import statistics
+import time
+
+import numpy as np
+from langchain.vectorstores import Chroma
+
+from embedding_backends import make_embeddings
+from hybrid_retrieval import BM25Index
+from retrieval_bench import keyword_query, sentence_query
+
+
+def sample_corpus(db, count, seed=13):
+    data = Chroma(persist_directory=db).get(include=["documents"])
+    pairs = [(doc_id, text) for doc_id, text in zip(data["ids"], data["documents"]) if text]
+    random.Random(seed).shuffle(pairs)
+    return pairs[:count]
+
+
+def sample_queries(corpus, count, seed=13):
+    rng = random.Random(seed)
+    index = BM25Index()
+    index.add([doc_id for doc_id, _ in corpus], [text for _, text in corpus])
+    queries = []
+    for position, (_, text) in enumerate(corpus):
+        if len(queries) >= count:
+            break
+        style = "keywords" if len(queries) % 2 == 0 else "sentence"
+        query = keyword_query(text, index, rng) if style == "keywords" else sentence_query(text, rng)
+        if query:
+            queries.append((query, position, style))
+    return queries
+
+
+def bench(backend, corpus, queries, k):
+    embeddings = make_embeddings(backend)
+    texts = [text for _, text in corpus]
+
+    start = time.perf_counter()
+    matrix = np.asarray(embeddings.embed_documents(texts), dtype=np.float32)
+    corpus_seconds = time.perf_counter() - start
+    matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+
+    latencies = []
+    recalls = {}
+    for query, position, style in queries:
+        start = time.perf_counter()
+        vector = np.asarray(embeddings.embed_query(query), dtype=np.float32)
+        latencies.append((time.perf_counter() - start) * 1000)
+        top = np.argsort(-(matrix @ vector))[:k]
+        recalls.setdefault(style, []).append(1.0 if position in top else 0.0)
+    latencies.sort()
+    return {
+        "backend": backend,
+        "model": getattr(embeddings, "model", type(embeddings).__name__),
+        "dim": matrix.shape[1],
+        "docs_per_sec": len(texts) / corpus_seconds,
+        "query_p50_ms": statistics.median(latencies),
+        "query_p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "recall": {style: statistics.mean(values) for style, values in recalls.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and retrieval quality of the embedding backends")
+    parser.add_argument("--db", default="./hybrid_db", help="Store to sample documents from (read only)")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--backends", nargs="+", default=["local", "openai"], choices=["local", "openai"])
+    args = parser.parse_args()
+
+    corpus = sample_corpus(args.db, args.docs)
+    queries = sample_queries(corpus, args.queries)
+    print(f"{len(corpus)} documents, {len(queries)} queries")
+
+    results = []
+    for backend in args.backends:
+        try:
+            results.append(bench(backend, corpus, queries, args.k))
+        except Exception as e:
+            print(f"Skipping {backend}: {e}")
+
+    styles = sorted({style for _, _, style in queries})
+    header = "".join(f"{f'recall@{args.k} ' + style:>22}" for style in styles)
+    print(f"\n{'backend':<10}{'dim':>6}{'docs/s':>10}{'query p50 ms':>14}{'query p95 ms':>14}{header}")
+    for result in results:
+        recalls = "".join(f"{result['recall'].get(style, 0.0):>22.3f}" for style in styles)
+        print(f"{result['backend']:<10}{result['dim']:>6}{result['docs_per_sec']:>10.1f}"
+              f"{result['query_p50_ms']:>14.1f}{result['query_p95_ms']:>14.1f}{recalls}")
+        print(f"  ({result['model']})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,256 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from concurrency import run_blocking
+from metrics import cache_requests, timed
+
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+# Vectors kept on disk per model (the vector file grows on demand up to this many rows) and in memory
+EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+EMBEDDING_CACHE_MEMORY_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MEMORY_ENTRIES", "10000"))
+
+# SQLite's default limit on bound parameters is 999
+_SQL_BATCH = 500
+# Smallest step the vector file grows by; it doubles after that, up to max_entries rows
+_GROW_ROWS = 4096
+
+
+def embedding_model_name(embeddings):
+    return getattr(embeddings, "model", None) or getattr(embeddings, "model_name", None) or type(embeddings).__name__
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embeddings wrapper that remembers every vector it has computed, keyed by model name and text hash.
+
+    L1 is an in-memory LRU; L2 is a float32 memory-mapped array on disk with an SQLite index mapping
+    keys to rows, so it survives restarts and is shared by query-time retrieval and bulk indexing.
+    Only misses reach the wrapped model, in one batched call. When L2 is full the least recently used
+    rows are overwritten. Processes can share a cache directory: SQLite's database lock also guards the
+    vector file, so readers never see a row while another process rewrites it.
+    """
+
+    def __init__(self, underlying, directory=EMBEDDING_CACHE_DIR, max_entries=EMBEDDING_CACHE_MAX_ENTRIES,
+                 memory_entries=EMBEDDING_CACHE_MEMORY_ENTRIES):
+        self.underlying = underlying
+        self.model = embedding_model_name(underlying)
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory = OrderedDict()  # key -> vector
+        self._lock = threading.Lock()
+
+        # One subdirectory per model, so a model change never reads vectors of the wrong size
+        self.directory = os.path.join(directory, hashlib.sha256(self.model.encode("utf-8")).hexdigest()[:16])
+        os.makedirs(self.directory, exist_ok=True)
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        # Autocommit, with explicit transactions; a rollback journal rather than WAL, because a reader's
+        # shared lock is what keeps writers out of the vector file while it copies rows
+        self._db = sqlite3.connect(
+            os.path.join(self.directory, "index.sqlite"), timeout=30, isolation_level=None, check_same_thread=False
+        )
+        self._db.execute("PRAGMA journal_mode=DELETE")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS vectors (
+                key TEXT PRIMARY KEY,
+                slot INTEGER NOT NULL UNIQUE,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS vectors_last_access ON vectors (last_access)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        self._dim = None
+        self._vectors = None
+
+    def _key(self, text):
+        return hashlib.sha256(f"{self.model}\0{text}".encode("utf-8")).hexdigest()
+
+    def _load(self):
+        """
+        Pick up the vector size and file length, which another process may have changed. Caller holds
+        the lock and is inside a transaction.
+        """
+        meta = dict(self._db.execute("SELECT name, value FROM meta").fetchall())
+        if "dim" not in meta or int(meta.get("capacity", 0)) != self.max_entries:
+            self._dim = self._vectors = None
+            return
+        self._dim = int(meta["dim"])
+        self._map()
+
+    def _map(self):
+        """
+        Map the vector file at its current length, if that changed since it was last mapped.
+        """
+        size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        rows = size // (self._dim * 4)
+        if self._vectors is not None and self._vectors.shape == (rows, self._dim):
+            return
+        # An empty file can't be mapped
+        self._vectors = None
+        if rows:
+            self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+", shape=(rows, self._dim))
+
+    def _grow(self, rows_needed):
+        """
+        Extend the vector file to hold rows_needed rows, doubling so growth stays rare.
+        """
+        rows = 0 if self._vectors is None else self._vectors.shape[0]
+        if rows_needed <= rows:
+            return
+        rows = min(self.max_entries, max(rows_needed, 2 * rows, _GROW_ROWS))
+        # Unmap first: some platforms can't resize a mapped file
+        self._vectors = None
+        with open(self._vectors_path, "ab") as f:
+            f.truncate(rows * self._dim * 4)
+        self._map()
+
+    def _reset(self, dim):
+        """
+        Start over for a new vector size or capacity. Caller holds the write lock.
+        """
+        self._db.execute("DELETE FROM vectors")
+        self._db.executemany(
+            "INSERT OR REPLACE INTO meta VALUES (?, ?)", [("dim", str(dim)), ("capacity", str(self.max_entries))]
+        )
+        self._dim, self._vectors = dim, None
+        open(self._vectors_path, "wb").close()
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _get(self, keys):
+        found = {}
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+            remaining = [key for key in keys if key not in found]
+            if not remaining:
+                return found
+            # The shared lock held until COMMIT keeps other processes from rewriting the rows being read
+            self._db.execute("BEGIN")
+            try:
+                self._load()
+                rows = []
+                if self._vectors is not None:
+                    for start in range(0, len(remaining), _SQL_BATCH):
+                        batch = remaining[start:start + _SQL_BATCH]
+                        rows.extend(self._db.execute(
+                            f"SELECT key, slot FROM vectors WHERE key IN ({','.join('?' * len(batch))})", batch
+                        ).fetchall())
+                vectors = [(key, self._vectors[slot].tolist()) for key, slot in rows]
+            finally:
+                self._db.execute("COMMIT")
+            if rows:
+                now = time.time()
+                self._db.execute("BEGIN IMMEDIATE")
+                self._db.executemany("UPDATE vectors SET last_access = ? WHERE key = ?", [(now, key) for key, _ in rows])
+                self._db.execute("COMMIT")
+            for key, vector in vectors:
+                self._remember(key, vector)
+                found[key] = vector
+        return found
+
+    def _put(self, vectors):
+        """
+        Store {key: vector}; overwrites least recently used rows once the file is full.
+        """
+        if not vectors:
+            return
+        items = list(vectors.items())[-self.max_entries:]
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+            # Slots are allocated, written and indexed under one exclusive lock, so concurrent writers
+            # in other processes can't pick the same slot and readers wait until the rows are complete
+            self._db.execute("BEGIN EXCLUSIVE")
+            try:
+                self._store(items)
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+
+    def _store(self, items):
+        self._load()
+        dim = len(items[0][1])
+        if self._dim != dim:
+            self._reset(dim)
+        existing = set()
+        for start in range(0, len(items), _SQL_BATCH):
+            batch = [key for key, _ in items[start:start + _SQL_BATCH]]
+            existing.update(row[0] for row in self._db.execute(
+                f"SELECT key FROM vectors WHERE key IN ({','.join('?' * len(batch))})", batch
+            ))
+        items = [(key, vector) for key, vector in items if key not in existing]
+        if not items:
+            return
+
+        count = self._db.execute("SELECT COUNT(*) FROM vectors").fetchone()[0]
+        fresh = min(len(items), self.max_entries - count)
+        slots = list(range(count, count + fresh))
+        if len(items) > fresh:
+            evicted = self._db.execute(
+                "SELECT key, slot FROM vectors ORDER BY last_access LIMIT ?", (len(items) - fresh,)
+            ).fetchall()
+            self._db.executemany("DELETE FROM vectors WHERE key = ?", [(key,) for key, _ in evicted])
+            slots.extend(slot for _, slot in evicted)
+
+        self._grow(max(slots) + 1)
+        for (_, vector), slot in zip(items, slots):
+            self._vectors[slot] = vector
+        # Vectors reach the file before the index points at them
+        self._vectors.flush()
+        now = time.time()
+        self._db.executemany(
+            "INSERT OR REPLACE INTO vectors VALUES (?, ?, ?)",
+            [(key, slot, now) for (key, _), slot in zip(items, slots)],
+        )
+
+    def embed_documents(self, texts):
+        keys = [self._key(text) for text in texts]
+        found = self._get(list(dict.fromkeys(keys)))
+        missing = {}
+        for text, key in zip(texts, keys):
+            if key not in found:
+                missing.setdefault(key, text)
+        cache_requests.inc(len(keys) - sum(1 for key in keys if key in missing), cache="embedding", result="hit")
+        cache_requests.inc(sum(1 for key in keys if key in missing), cache="embedding", result="miss")
+        if missing:
+            with timed("embedding"):
+                computed = self.underlying.embed_documents(list(missing.values()))
+            new = dict(zip(missing, computed))
+            self._put(new)
+            found.update(new)
+        return [found[key] for key in keys]
+
+    def embed_query(self, text):
+        key = self._key(text)
+        vector = self._get([key]).get(key)
+        cache_requests.inc(cache="embedding", result="hit" if vector is not None else "miss")
+        if vector is None:
+            with timed("embedding"):
+                vector = self.underlying.embed_query(text)
+            self._put({key: vector})
+        return vector
+
+    # Cache lookups touch SQLite and the vector file, so async callers go through the worker pool
+    async def aembed_documents(self, texts):
+        return await run_blocking(self.embed_documents, texts)
+
+    async def aembed_query(self, text):
+        return await run_blocking(self.embed_query, text)
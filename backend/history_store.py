@@ -0,0 +1,70 @@
+import os
+import time
+from collections import OrderedDict, deque
+
+# Retention: turns kept per session and number of sessions kept in memory (least recently used go first)
+HISTORY_MAX_TURNS = int(os.getenv("HISTORY_MAX_TURNS", "200"))
+HISTORY_MAX_SESSIONS = int(os.getenv("HISTORY_MAX_SESSIONS", "1000"))
+HISTORY_PAGE_SIZE = int(os.getenv("HISTORY_PAGE_SIZE", "50"))
+
+DEFAULT_SESSION = "default"
+
+
+class HistoryStore:
+    """
+    Session-keyed chat history with a retention cap.
+
+    Every turn gets a per-session sequence number (`seq`) which doubles as the pagination cursor, so
+    clients can fetch only what they haven't seen yet. A session can also be bound to a patient MRN so
+    follow-up queries don't have to repeat it.
+    """
+
+    def __init__(self, max_turns=HISTORY_MAX_TURNS, max_sessions=HISTORY_MAX_SESSIONS):
+        self.max_turns = max_turns
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+
+    def _session(self, session_id):
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = {"turns": deque(maxlen=self.max_turns), "next_seq": 1, "patient_mrn": None}
+            self._sessions[session_id] = session
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        else:
+            self._sessions.move_to_end(session_id)
+        session["last_active"] = time.time()
+        return session
+
+    def append(self, session_id, role, content):
+        session = self._session(session_id)
+        turn = {"seq": session["next_seq"], "role": role, "content": content}
+        session["next_seq"] += 1
+        session["turns"].append(turn)
+        return turn
+
+    def bind_patient(self, session_id, mrn):
+        self._session(session_id)["patient_mrn"] = mrn
+
+    def patient_mrn(self, session_id):
+        session = self._sessions.get(session_id)
+        return session["patient_mrn"] if session else None
+
+    def turns(self, session_id):
+        session = self._sessions.get(session_id)
+        return list(session["turns"]) if session else []
+
+    def page(self, session_id, cursor=0, limit=HISTORY_PAGE_SIZE):
+        """
+        Turns with seq > cursor, oldest first. `next_cursor` is None once the client is caught up.
+        """
+        session = self._sessions.get(session_id)
+        if not session:
+            return {"history": [], "next_cursor": None}
+        turns = [turn for turn in session["turns"] if turn["seq"] > cursor]
+        page = turns[:limit]
+        next_cursor = page[-1]["seq"] if len(turns) > limit else None
+        return {"history": page, "next_cursor": next_cursor}
+
+    def clear(self, session_id):
+        self._sessions.pop(session_id, None)
@@ -0,0 +1,187 @@
+import asyncio
+import hashlib
+import math
+import os
+import threading
+from collections import Counter
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from concurrency import run_blocking
+from metrics import retrieval_path, timed
+from textutils import terms
+
+# Reciprocal rank fusion constant; 60 is the value from the original RRF paper
+RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Short queries whose every term occurs together in at least this many documents (a food or drug name)
+# are answered from the keyword index alone, without an embedding call
+EXACT_MAX_TERMS = int(os.getenv("HYBRID_EXACT_MAX_TERMS", "4"))
+EXACT_MIN_HITS = int(os.getenv("HYBRID_EXACT_MIN_HITS", "3"))
+# How often the keyword index reconciles itself with writers it isn't told about (e.g. bulk indexing)
+BM25_SYNC_INTERVAL = float(os.getenv("BM25_SYNC_INTERVAL", "300"))
+BM25_SYNC_PAGE = 1000
+
+
+def content_key(text):
+    # Documents are matched by content: dense results don't always carry the Chroma id
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class BM25Index:
+    """
+    In-memory inverted index with Okapi BM25 scoring over the documents of a vector store.
+
+    Writers that go through the app (scrape ingestion) update it directly; sync() reconciles it with
+    the Chroma collection for everything else.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._postings = {}  # term -> {doc_id: term frequency}
+        self._docs = {}  # doc_id -> (text, metadata, length)
+        self._total_length = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._docs)
+
+    def add(self, ids, texts, metadatas=None):
+        metadatas = metadatas or [{}] * len(ids)
+        with self._lock:
+            for doc_id, text, metadata in zip(ids, texts, metadatas):
+                self._remove(doc_id)
+                doc_terms = terms(text)
+                for term, tf in Counter(doc_terms).items():
+                    self._postings.setdefault(term, {})[doc_id] = tf
+                self._docs[doc_id] = (text, metadata or {}, len(doc_terms))
+                self._total_length += len(doc_terms)
+
+    def document_frequency(self, term):
+        with self._lock:
+            return len(self._postings.get(term, ()))
+
+    def remove(self, ids):
+        with self._lock:
+            for doc_id in ids:
+                self._remove(doc_id)
+
+    def _remove(self, doc_id):
+        entry = self._docs.pop(doc_id, None)
+        if entry is None:
+            return
+        text, _, length = entry
+        self._total_length -= length
+        for term in set(terms(text)):
+            postings = self._postings.get(term)
+            if postings is not None:
+                postings.pop(doc_id, None)
+                if not postings:
+                    del self._postings[term]
+
+    def search(self, query, k=10):
+        """
+        Top `k` (Document, score) pairs plus the number of documents containing every query term.
+        """
+        query_terms = list(dict.fromkeys(terms(query)))
+        with self._lock:
+            n = len(self._docs)
+            if not n or not query_terms:
+                return [], 0
+            avg_length = self._total_length / n
+            scores = Counter()
+            matched = Counter()
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+                for doc_id, tf in postings.items():
+                    norm = self.k1 * (1 - self.b + self.b * self._docs[doc_id][2] / avg_length)
+                    scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+                    matched[doc_id] += 1
+            all_terms = sum(1 for count in matched.values() if count == len(query_terms))
+            top = scores.most_common(k)
+            results = [
+                (Document(page_content=self._docs[doc_id][0], metadata=dict(self._docs[doc_id][1]), id=doc_id), score)
+                for doc_id, score in top
+            ]
+        return results, all_terms
+
+    def sync(self, vectorstore):
+        """
+        Make the index match the vector store: add documents it is missing, drop deleted ones.
+        """
+        stored_ids = set(vectorstore.get(include=[])["ids"])
+        with self._lock:
+            known = set(self._docs)
+        missing = list(stored_ids - known)
+        self.remove(known - stored_ids)
+        for start in range(0, len(missing), BM25_SYNC_PAGE):
+            page = vectorstore.get(ids=missing[start:start + BM25_SYNC_PAGE], include=["documents", "metadatas"])
+            self.add(page["ids"], page["documents"], page["metadatas"])
+        return len(missing), len(known - stored_ids)
+
+
+async def keep_in_sync(index, vectorstore, interval=BM25_SYNC_INTERVAL):
+    """
+    Background task: reconcile the keyword index with the vector store every `interval` seconds.
+    """
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            added, removed = await run_blocking(index.sync, vectorstore)
+            if added or removed:
+                print(f"Keyword index sync: +{added} -{removed} documents ({len(index)} total)")
+        except Exception as e:
+            print(f"Error syncing keyword index: {e}")
+
+
+def reciprocal_rank_fusion(result_lists, k=10, rrf_k=RRF_K):
+    scores = Counter()
+    documents = {}
+    for results in result_lists:
+        for rank, document in enumerate(results, start=1):
+            key = content_key(document.page_content)
+            scores[key] += 1 / (rrf_k + rank)
+            documents.setdefault(key, document)
+    return [documents[key] for key, _ in scores.most_common(k)]
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    BM25 + dense retrieval merged by reciprocal rank fusion. Exact-term queries skip the dense side
+    (and its embedding call) when the keyword index alone has enough documents containing them.
+    """
+
+    vector_retriever: BaseRetriever
+    keyword_index: Any
+    k: int = 10
+
+    def _keyword(self, query):
+        with timed("rag_keyword"):
+            results, all_terms = self.keyword_index.search(query, self.k)
+        exact = len(terms(query)) <= EXACT_MAX_TERMS and all_terms >= EXACT_MIN_HITS
+        return [document for document, _ in results], exact
+
+    def _get_relevant_documents(self, query, *, run_manager: CallbackManagerForRetrieverRun):
+        keyword, exact = self._keyword(query)
+        if exact:
+            retrieval_path.inc(path="keyword_only")
+            return keyword
+        retrieval_path.inc(path="hybrid")
+        dense = self.vector_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return reciprocal_rank_fusion([keyword, dense], self.k)
+
+    async def _aget_relevant_documents(self, query, *, run_manager: AsyncCallbackManagerForRetrieverRun):
+        # BM25 scoring is CPU work under the index lock; keep it off the event loop
+        keyword, exact = await run_blocking(self._keyword, query)
+        if exact:
+            retrieval_path.inc(path="keyword_only")
+            return keyword
+        retrieval_path.inc(path="hybrid")
+        dense = await self.vector_retriever.ainvoke(query, config={"callbacks": run_manager.get_child()})
+        return reciprocal_rank_fusion([keyword, dense], self.k)
@@ -0,0 +1,254 @@
+"""
+Build or update the vector store (hybrid_db, or the store of the --backend used) from a corpus directory
+of markdown, text and PDF files.
+
+Files are hashed, read and split into token-sized chunks by a pool of worker processes; chunks are
+embedded in batches on a few threads (through the embedding cache, so unchanged chunks of an edited
+file are not re-embedded) and upserted in batches. A file is recorded in the checkpoint only once all
+of its chunks are stored, so an interrupted run resumes where it stopped; files whose hash matches the
+checkpoint are skipped, and chunks of files removed from the corpus are deleted. Memory stays bounded:
+only a few files per worker are in flight and at most two batches per embedding thread are queued.
+
+Run it with the server stopped: both write to the same store and embedding cache. The server's keyword
+index picks up the new documents at startup.
+
+Usage: python index_corpus.py ./corpus --workers 8 --batch-size 256
+"""
+import argparse
+import hashlib
+import os
+import sqlite3
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from langchain.vectorstores import Chroma
+from PyPDF2 import PdfReader
+
+from chunking import chunk_text, count_tokens
+from embedding_backends import EMBEDDING_BACKEND, make_embeddings, vector_db_dir
+from embedding_cache import CachedEmbeddings
+from ingestion import INGEST_CHUNK_TOKENS
+
+CORPUS_SUFFIXES = (".md", ".markdown", ".txt", ".pdf")
+ORIGIN = "corpus"
+PROGRESS_SECONDS = 10
+
+
+def corpus_files(root):
+    """
+    (absolute path, path relative to root) of every indexable file, in a stable order.
+    """
+    files = []
+    for directory, _, names in os.walk(root):
+        for name in names:
+            if name.lower().endswith(CORPUS_SUFFIXES):
+                path = os.path.join(directory, name)
+                files.append((path, os.path.relpath(path, root).replace(os.sep, "/")))
+    return sorted(files, key=lambda item: item[1])
+
+
+def file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def read_text(path):
+    if path.lower().endswith(".pdf"):
+        return "\n\n".join(page.extract_text() or "" for page in PdfReader(path).pages)
+    with open(path, encoding="utf-8", errors="replace") as f:
+        return f.read()
+
+
+def prepare(path, relpath, known_hash, chunk_tokens):
+    """
+    Worker process: hash the file and, unless it is unchanged, read and split it.
+    Returns (relpath, hash, chunks or None when unchanged, tokens).
+    """
+    digest = file_hash(path)
+    if digest == known_hash:
+        return relpath, digest, None, 0
+    chunks = [chunk for chunk in chunk_text(read_text(path), max_tokens=chunk_tokens, overlap_tokens=0) if chunk.strip()]
+    return relpath, digest, chunks, sum(count_tokens(chunk) for chunk in chunks)
+
+
+def chunk_id(relpath, index):
+    return hashlib.sha256(f"{relpath}\0{index}".encode("utf-8")).hexdigest()
+
+
+class IndexCheckpoint:
+    """
+    Files fully stored in the vector store, with the hash they had at the time.
+    """
+
+    def __init__(self, path):
+        self._db = sqlite3.connect(path)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, hash TEXT NOT NULL, chunks INTEGER NOT NULL, "
+            "indexed_at REAL NOT NULL)"
+        )
+        self._db.commit()
+
+    def known(self):
+        return dict(self._db.execute("SELECT path, hash FROM files").fetchall())
+
+    def done(self, relpath, digest, chunks):
+        self._db.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", (relpath, digest, chunks, time.time()))
+        self._db.commit()
+
+    def forget(self, relpath):
+        self._db.execute("DELETE FROM files WHERE path = ?", (relpath,))
+        self._db.commit()
+
+    def clear(self):
+        self._db.execute("DELETE FROM files")
+        self._db.commit()
+
+
+class Progress:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.files = self.unchanged = self.failed = self.chunks = self.tokens = 0
+        self._next_report = self.start + PROGRESS_SECONDS
+
+    def maybe_report(self):
+        if time.perf_counter() >= self._next_report:
+            self._next_report += PROGRESS_SECONDS
+            print(self.summary())
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        elapsed_or_one = elapsed or 1.0
+        return (f"{self.files} documents indexed ({self.files / elapsed_or_one:.1f} docs/s), {self.chunks} chunks, "
+                f"{self.tokens} tokens ({self.tokens / elapsed_or_one:.0f} tokens/s), {self.unchanged} unchanged, "
+                f"{self.failed} failed, {elapsed:.1f}s")
+
+
+def index_corpus(root, store, embeddings, checkpoint, workers, batch_size, embed_workers, chunk_tokens):
+    files = corpus_files(root)
+    known = checkpoint.known()
+    collection = store._collection
+    progress = Progress()
+
+    removed = set(known) - {relpath for _, relpath in files}
+    for relpath in sorted(removed):
+        collection.delete(where={"source": relpath})
+        checkpoint.forget(relpath)
+    if removed:
+        print(f"Removed the chunks of {len(removed)} files no longer in the corpus")
+
+    remaining = {}  # relpath -> [hash, chunks not yet stored, total chunks, tokens]
+    buffer = []  # (id, text, metadata)
+
+    def store_batch(batch):
+        texts = [text for _, text, _ in batch]
+        collection.upsert(
+            ids=[doc_id for doc_id, _, _ in batch],
+            embeddings=embeddings.embed_documents(texts),
+            documents=texts,
+            metadatas=[metadata for _, _, metadata in batch],
+        )
+        return batch
+
+    def stored(batch):
+        for _, _, metadata in batch:
+            state = remaining[metadata["source"]]
+            state[1] -= 1
+            if not state[1]:
+                file_done(metadata["source"])
+
+    def file_done(relpath):
+        digest, _, total, tokens = remaining.pop(relpath)
+        checkpoint.done(relpath, digest, total)
+        progress.files += 1
+        progress.chunks += total
+        progress.tokens += tokens
+
+    with ProcessPoolExecutor(max_workers=workers) as pool, ThreadPoolExecutor(max_workers=embed_workers) as embedder:
+        queued = iter(files)
+        preparing = {}  # future -> relpath
+        embedding = set()
+
+        def submit_files():
+            while len(preparing) < workers * 2:
+                item = next(queued, None)
+                if item is None:
+                    return
+                path, relpath = item
+                preparing[pool.submit(prepare, path, relpath, known.get(relpath), chunk_tokens)] = relpath
+
+        def drain_embedding(limit):
+            while len(embedding) > limit:
+                finished, _ = wait(embedding, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    embedding.discard(future)
+                    stored(future.result())
+
+        submit_files()
+        while preparing:
+            finished, _ = wait(preparing, return_when=FIRST_COMPLETED)
+            for future in finished:
+                relpath = preparing.pop(future)
+                try:
+                    _, digest, chunks, tokens = future.result()
+                except Exception as e:
+                    progress.failed += 1
+                    print(f"Error preparing {relpath}: {e}")
+                    continue
+                if chunks is None:
+                    progress.unchanged += 1
+                    continue
+                # Whatever an earlier version (or an interrupted run) stored for this file goes first
+                collection.delete(where={"source": relpath})
+                remaining[relpath] = [digest, len(chunks), len(chunks), tokens]
+                if not chunks:
+                    file_done(relpath)
+                for index, chunk in enumerate(chunks):
+                    buffer.append((chunk_id(relpath, index), chunk, {
+                        "source": relpath, "origin": ORIGIN, "content_hash": digest, "chunk": index,
+                    }))
+                while len(buffer) >= batch_size:
+                    batch, buffer[:] = buffer[:batch_size], buffer[batch_size:]
+                    drain_embedding(embed_workers * 2 - 1)
+                    embedding.add(embedder.submit(store_batch, batch))
+            submit_files()
+            progress.maybe_report()
+
+        if buffer:
+            embedding.add(embedder.submit(store_batch, list(buffer)))
+        drain_embedding(0)
+
+    print(progress.summary())
+    return progress
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index a corpus of markdown, text and PDF files into the vector store")
+    parser.add_argument("corpus", help="Directory to index (recursively)")
+    parser.add_argument("--db", help="Vector store (default: the one --backend uses)")
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, choices=["openai", "local"])
+    parser.add_argument("--checkpoint", help="Checkpoint file (default <db>.checkpoint.sqlite)")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and re-index every file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Processes reading and splitting files")
+    parser.add_argument("--embed-workers", type=int, default=4, help="Embedding batches in flight")
+    parser.add_argument("--batch-size", type=int, default=256, help="Chunks per embedding call and upsert")
+    parser.add_argument("--chunk-tokens", type=int, default=INGEST_CHUNK_TOKENS)
+    args = parser.parse_args()
+    args.db = args.db or vector_db_dir(args.backend)
+
+    if not os.path.isdir(args.corpus):
+        parser.error(f"{args.corpus} is not a directory")
+    checkpoint = IndexCheckpoint(args.checkpoint or f"{os.path.normpath(args.db)}.checkpoint.sqlite")
+    if args.restart:
+        checkpoint.clear()
+    store = Chroma(persist_directory=args.db, embedding_function=None)
+    embeddings = CachedEmbeddings(make_embeddings(args.backend))
+    print(f"Indexing {args.corpus} into {args.db} with the {args.backend} backend ({embeddings.model})")
+    index_corpus(args.corpus, store, embeddings, checkpoint, args.workers, args.batch_size, args.embed_workers,
+                 args.chunk_tokens)
+
+
+if __name__ == "__main__":
+    main()
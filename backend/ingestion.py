@@ -0,0 +1,182 @@
+import asyncio
+import hashlib
+import os
+import sqlite3
+import time
+
+from langchain_core.documents import Document
+
+from chunking import chunk_text
+from concurrency import run_blocking
+from metrics import ingest_chunks, timed
+from page_cache import normalize_url
+from textutils import normalize_text
+
+# Chunks embedded per vector-store call, and pages allowed to wait for ingestion (extra pages are dropped)
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100"))
+# Retrieval-sized chunks, much smaller than the summarisation chunks
+INGEST_CHUNK_TOKENS = int(os.getenv("INGEST_CHUNK_TOKENS", "400"))
+# Ingested pages older than this are ignored by recall(), so stale topics go back to a fresh crawl
+INGEST_MAX_AGE = float(os.getenv("INGEST_MAX_AGE", str(7 * 24 * 60 * 60)))
+# A query is answered from ingested pages when at least INGEST_MIN_HITS of the top INGEST_RECALL_K
+# chunks score INGEST_MIN_RELEVANCE or better
+INGEST_RECALL_K = int(os.getenv("INGEST_RECALL_K", "6"))
+INGEST_MIN_HITS = int(os.getenv("INGEST_MIN_HITS", "3"))
+INGEST_MIN_RELEVANCE = float(os.getenv("INGEST_MIN_RELEVANCE", "0.75"))
+
+# Which pages contain which ingested chunks. Chunk ids are content hashes, so pages with the same text
+# share chunks, and a chunk may only be deleted once no page contains it any more.
+INGEST_REFS_PATH = os.getenv("INGEST_REFS_PATH", "./ingest_refs.sqlite")
+
+ORIGIN = "webscrape"
+
+
+def content_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+class ScrapeIngestor:
+    """
+    Feeds cleaned scraped pages into the persisted vector store in the background.
+
+    Pages are chunked, deduplicated by content hash (which is also the document id) and only new
+    chunks are embedded, in batches; chunks already stored get their metadata (source, fetch time)
+    refreshed instead. Chunks a re-crawled URL no longer contains are removed unless another page
+    still contains them, as recorded in the SQLite table at `refs_path`. Every chunk carries its
+    source URL and fetch time, which recall() uses to serve repeat topics without searching and
+    crawling again. `keyword_index`, if given, is updated alongside the store.
+    """
+
+    def __init__(self, vectorstore, keyword_index=None, refs_path=INGEST_REFS_PATH, batch_size=INGEST_BATCH_SIZE,
+                 queue_size=INGEST_QUEUE_SIZE):
+        self.vectorstore = vectorstore
+        self.keyword_index = keyword_index
+        self.batch_size = batch_size
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        self._worker = None
+        # Only the worker writes, one batch at a time, but on whichever pool thread runs it
+        self._refs = sqlite3.connect(refs_path, check_same_thread=False)
+        self._refs.execute(
+            "CREATE TABLE IF NOT EXISTS refs (chunk_id TEXT NOT NULL, source TEXT NOT NULL, PRIMARY KEY (chunk_id, source))"
+        )
+        self._refs.execute("CREATE INDEX IF NOT EXISTS refs_source ON refs (source)")
+        self._refs.commit()
+
+    async def start(self):
+        if self._worker is None:
+            self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    def submit(self, query, pages):
+        """
+        Queue (url, markdown) pages for ingestion; never blocks the request.
+        """
+        for url, markdown in pages:
+            try:
+                self._queue.put_nowait((url, markdown, query))
+            except asyncio.QueueFull:
+                ingest_chunks.inc(result="page_dropped")
+
+    async def _run(self):
+        while True:
+            items = [await self._queue.get()]
+            while not self._queue.empty() and len(items) < self.batch_size:
+                items.append(self._queue.get_nowait())
+            try:
+                with timed("ingest"):
+                    await run_blocking(self._ingest, items)
+            except Exception as e:
+                print(f"Error ingesting scraped pages: {e}")
+
+    def _ingest(self, items):
+        now = time.time()
+        documents = {}  # id -> (text, metadata); first page to contain a chunk owns it
+        ids_by_url = {}
+        for url, markdown, query in items:
+            source = normalize_url(url)
+            ids_by_url.setdefault(source, set())
+            for chunk in chunk_text(markdown, max_tokens=INGEST_CHUNK_TOKENS, overlap_tokens=0):
+                chunk_id = content_hash(chunk)
+                ids_by_url[source].add(chunk_id)
+                if chunk_id not in documents:
+                    documents[chunk_id] = (chunk, {
+                        "source": source, "origin": ORIGIN, "fetched_at": now,
+                        "content_hash": chunk_id, "query": query,
+                    })
+
+        with self._refs:
+            # Chunks a re-crawled page no longer contains are stale, unless another page still has them
+            dropped = set()
+            for source, current_ids in ids_by_url.items():
+                previous = {row[0] for row in self._refs.execute("SELECT chunk_id FROM refs WHERE source = ?", (source,))}
+                # Chunks ingested before references were recorded only know the page that first stored them
+                previous.update(self.vectorstore.get(where={"source": source}, include=[])["ids"])
+                self._refs.executemany(
+                    "DELETE FROM refs WHERE chunk_id = ? AND source = ?", [(chunk_id, source) for chunk_id in previous - current_ids]
+                )
+                self._refs.executemany(
+                    "INSERT OR IGNORE INTO refs VALUES (?, ?)", [(chunk_id, source) for chunk_id in current_ids]
+                )
+                dropped.update(previous - current_ids)
+            stale = [
+                chunk_id for chunk_id in dropped
+                if self._refs.execute("SELECT 1 FROM refs WHERE chunk_id = ? LIMIT 1", (chunk_id,)).fetchone() is None
+            ]
+            if stale:
+                self.vectorstore.delete(ids=stale)
+                if self.keyword_index is not None:
+                    self.keyword_index.remove(stale)
+                ingest_chunks.inc(len(stale), result="stale_removed")
+
+            existing = set(self.vectorstore.get(ids=list(documents), include=[])["ids"]) if documents else set()
+            # Already embedded: refresh the metadata, so recall() keeps treating the chunk as fresh. The text
+            # is unchanged (ids are content hashes), so the embedding cache answers the re-embedding.
+            refreshed = [chunk_id for chunk_id in documents if chunk_id in existing]
+            for start in range(0, len(refreshed), self.batch_size):
+                batch = refreshed[start:start + self.batch_size]
+                self.vectorstore.update_documents(
+                    batch, [Document(page_content=documents[chunk_id][0], metadata=documents[chunk_id][1]) for chunk_id in batch]
+                )
+            ingest_chunks.inc(len(refreshed), result="refreshed")
+
+            new_ids = [chunk_id for chunk_id in documents if chunk_id not in existing]
+            for start in range(0, len(new_ids), self.batch_size):
+                batch = new_ids[start:start + self.batch_size]
+                texts = [documents[chunk_id][0] for chunk_id in batch]
+                metadatas = [documents[chunk_id][1] for chunk_id in batch]
+                self.vectorstore.add_texts(texts, metadatas=metadatas, ids=batch)
+                if self.keyword_index is not None:
+                    self.keyword_index.add(batch, texts, metadatas)
+                ingest_chunks.inc(len(batch), result="added")
+
+    def _recall(self, query):
+        cutoff = time.time() - INGEST_MAX_AGE
+        results = self.vectorstore.similarity_search_with_relevance_scores(
+            query, k=INGEST_RECALL_K, filter={"$and": [{"origin": ORIGIN}, {"fetched_at": {"$gte": cutoff}}]},
+        )
+        hits = [document for document, score in results if score >= INGEST_MIN_RELEVANCE]
+        if len(hits) < INGEST_MIN_HITS:
+            return None
+        sources = list(dict.fromkeys(document.metadata["source"] for document in hits))
+        return "\n\n".join(document.page_content for document in hits), sources
+
+    async def recall(self, query):
+        """
+        (content, source urls) from fresh ingested pages relevant to `query`, or None when the store
+        doesn't cover the topic well enough and the caller should search and crawl.
+        """
+        with timed("ingest_recall"):
+            try:
+                return await run_blocking(self._recall, query)
+            except Exception as e:
+                print(f"Error recalling ingested pages: {e}")
+                return None
@@ -0,0 +1,98 @@
+import json
+import math
+import os
+from collections import Counter, OrderedDict, namedtuple
+
+from textutils import features, normalize_text, l2_normalize, dot
+
+INTENTS = ("off_topic", "small_talk", "medical", "diet_plan", "rag")
+
+INTENT_EXAMPLES_PATH = os.getenv(
+    "INTENT_EXAMPLES_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "intents.jsonl")
+)
+# Below either threshold the local verdict is considered unsure and the LLM fallback decides.
+INTENT_MIN_SCORE = float(os.getenv("INTENT_MIN_SCORE", "0.15"))
+INTENT_MIN_MARGIN = float(os.getenv("INTENT_MIN_MARGIN", "0.05"))
+INTENT_MEMO_SIZE = int(os.getenv("INTENT_MEMO_SIZE", "4096"))
+
+Verdict = namedtuple("Verdict", ["intent", "confidence", "source"])
+
+
+def load_examples(path=INTENT_EXAMPLES_PATH):
+    examples = []
+    with open(path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record["intent"] not in INTENTS:
+                raise ValueError(f"Unknown intent {record['intent']!r} in {path}")
+            examples.append((record["text"], record["intent"]))
+    return examples
+
+
+class IntentRouter:
+    """
+    Local TF-IDF nearest-centroid classifier over the labeled examples in intents.jsonl.
+
+    `route()` returns a Verdict; when the local classifier is unsure it defers to `fallback`
+    (an async callable returning one of INTENTS). Verdicts are memoised per normalised query.
+    """
+
+    def __init__(self, examples=None, fallback=None, min_score=INTENT_MIN_SCORE,
+                 min_margin=INTENT_MIN_MARGIN, memo_size=INTENT_MEMO_SIZE):
+        self.fallback = fallback
+        self.min_score = min_score
+        self.min_margin = min_margin
+        self.memo_size = memo_size
+        self._memo = OrderedDict()
+        self._fit(examples if examples is not None else load_examples())
+
+    def _fit(self, examples):
+        docs = [(features(text), intent) for text, intent in examples]
+        doc_freq = Counter()
+        for feats, _ in docs:
+            doc_freq.update(feats.keys())
+        n_docs = len(docs)
+        self.idf = {f: math.log((1 + n_docs) / (1 + df)) + 1.0 for f, df in doc_freq.items()}
+
+        sums = {intent: Counter() for intent in INTENTS}
+        for feats, intent in docs:
+            for f, v in l2_normalize(self._weigh(feats)).items():
+                sums[intent][f] += v
+        self.centroids = {intent: l2_normalize(vec) for intent, vec in sums.items() if vec}
+
+    def _weigh(self, feats):
+        # Features never seen in training carry no signal for any centroid, so drop them.
+        return {f: (1 + math.log(tf)) * self.idf[f] for f, tf in feats.items() if f in self.idf}
+
+    def classify(self, query):
+        """
+        Pure local classification: returns (intent, score, margin).
+        """
+        vec = l2_normalize(self._weigh(features(query)))
+        if not vec:
+            return None, 0.0, 0.0
+        scores = sorted(((dot(vec, c), intent) for intent, c in self.centroids.items()), reverse=True)
+        (best, intent), (runner_up, _) = scores[0], scores[1]
+        return intent, best, best - runner_up
+
+    async def route(self, query):
+        key = normalize_text(query)
+        if key in self._memo:
+            self._memo.move_to_end(key)
+            return self._memo[key]
+
+        intent, score, margin = self.classify(query)
+        if intent is not None and score >= self.min_score and margin >= self.min_margin:
+            verdict = Verdict(intent, score, "local")
+        elif self.fallback is not None:
+            verdict = Verdict(await self.fallback(query), score, "llm")
+        else:
+            verdict = Verdict(intent or "off_topic", score, "local")
+
+        self._memo[key] = verdict
+        if len(self._memo) > self.memo_size:
+            self._memo.popitem(last=False)
+        return verdict
@@ -0,0 +1,53 @@
+"""
+Fire N concurrent /search queries at a running backend and compare the wall-clock time with the
+sum of the individual latencies. With a non-blocking handler the wall time should sit close to the
+slowest single request; if the event loop is being blocked it approaches the sum instead.
+
+Usage: python load_test.py --concurrency 8 --query "symptoms of diabetes"
+"""
+import argparse
+import asyncio
+import time
+
+import httpx
+
+
+async def timed_search(client, base_url, query):
+    start = time.perf_counter()
+    response = await client.get(f"{base_url}/search", params={"query": query})
+    return response.status_code, time.perf_counter() - start
+
+
+async def run_load_test(base_url, queries, timeout):
+    async with httpx.AsyncClient(timeout=timeout) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(*(timed_search(client, base_url, q) for q in queries))
+        wall = time.perf_counter() - start
+    return results, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent load test for the /search endpoint")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--query", action="append", help="Query to send (repeat to mix several queries)")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args()
+
+    base_queries = args.query or ["What are the nutritional contents in chicken?"]
+    queries = [base_queries[i % len(base_queries)] for i in range(args.concurrency)]
+
+    results, wall = asyncio.run(run_load_test(args.base_url, queries, args.timeout))
+
+    latencies = [latency for _, latency in results]
+    for i, (status, latency) in enumerate(results):
+        print(f"request {i:>3}: status={status} latency={latency:.2f}s")
+
+    slowest = max(latencies)
+    total = sum(latencies)
+    print(f"\nwall clock: {wall:.2f}s | slowest: {slowest:.2f}s | sum of latencies: {total:.2f}s")
+    print(f"wall / slowest = {wall / slowest:.2f} (≈1.0 means fully concurrent, ≈{len(queries)} means serialised)")
+
+
+if __name__ == "__main__":
+    main()
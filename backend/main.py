@@ -4,18 +4,34 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional, List, Dict
 from langchain.vectorstores import Chroma
-from langchain.embeddings import OpenAIEmbeddings
 from langchain_community.chat_models import ChatOpenAI
 from langchain.chains import RetrievalQA
 from langchain.retrievers import ContextualCompressionRetriever
 from langchain.retrievers.document_compressors import FlashrankRerank
-from groq import Groq  # Import Groq client
+from groq import AsyncGroq  # Import async Groq client so LLM calls don't block the event loop
 from dotenv import load_dotenv
 import asyncio
-from webscrap import get_query_urls, web_scrap_avail_links, get_patient_by_mrn, llm_infer, diet_plan_call  # Import web scraping functions
+from webscrap import get_query_urls, web_scrap_avail_links, patient_cache, collection, llm_infer, diet_plan_call, complete, crawler_pool, http_client  # Import web scraping functions
 from fastapi.responses import JSONResponse
-from fastapi.responses import JSONResponse, FileResponse
-from pdf_gen import summarize_chat_history, write_pdf 
+from fastapi.responses import JSONResponse, FileResponse, StreamingResponse, PlainTextResponse
+from starlette.background import BackgroundTask
+from langchain_core.callbacks import AsyncCallbackHandler
+import json
+import time
+from contextlib import asynccontextmanager
+from pdf_gen import summarize_chat_history, write_pdf, new_summary_pdf, summary_pdf_path, remove_file
+from concurrency import run_blocking
+from patient_db import ensure_indexes
+from pymongo.errors import PyMongoError
+from intent_router import IntentRouter
+from response_cache import ResponseCache, record_version
+from history_store import HistoryStore, DEFAULT_SESSION, HISTORY_PAGE_SIZE
+from metrics import timed, record_tokens, record_cache, render_metrics, stage_seconds, stage_errors, content_source
+from ingestion import ScrapeIngestor
+from hybrid_retrieval import BM25Index, HybridRetriever, keep_in_sync
+from embedding_cache import CachedEmbeddings
+from embedding_backends import make_embeddings, VECTOR_DB_DIR
+from chunking import count_tokens
 
 
 # Load environment variables
@@ -23,7 +39,27 @@ load_dotenv()
 os.environ['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
 os.environ['GROQ_API_KEY'] = os.getenv('GROQ_API_KEY')  # Ensure your API key is loaded
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    # Warm the shared browser pool before the first request and shut it down cleanly on exit
+    await crawler_pool.start()
+    # MRN lookups must hit the unique index rather than scan the collection
+    try:
+        await run_blocking(ensure_indexes, collection)
+    except PyMongoError as e:
+        print(f"Could not ensure patient indexes: {e}")
+    patient_cache.start()
+    await run_blocking(keyword_index.sync, vectorstore)
+    keyword_sync = asyncio.create_task(keep_in_sync(keyword_index, vectorstore))
+    await scrape_ingestor.start()
+    yield
+    await scrape_ingestor.close()
+    keyword_sync.cancel()
+    patient_cache.stop()
+    await crawler_pool.close()
+    await http_client.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # CORS setup
 app.add_middleware(
@@ -34,19 +70,40 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize embeddings and vector store
-embeddings = OpenAIEmbeddings()
-vectorstore = Chroma(persist_directory="./hybrid_db", embedding_function=embeddings)
+# Initialize embeddings and vector store; repeated queries and re-ingested chunks come from the embedding cache
+# EMBEDDING_BACKEND picks OpenAI or the local CPU model; each has its own store (see reindex.py)
+embeddings = CachedEmbeddings(make_embeddings())
+vectorstore = Chroma(persist_directory=VECTOR_DB_DIR, embedding_function=embeddings)
+# Local BM25 over the same documents; filled from the store at startup and kept in sync with it
+keyword_index = BM25Index()
+# Scraped pages are embedded into the same store so repeat topics can skip search and crawl
+scrape_ingestor = ScrapeIngestor(
+    vectorstore, keyword_index=keyword_index, refs_path=f"{os.path.normpath(VECTOR_DB_DIR)}.ingest_refs.sqlite"
+)
 
 # Initialize language model and Groq client
-llm = ChatOpenAI(model_name="gpt-4o-mini")
-groq_client = Groq(api_key=os.environ.get("GROQ_API_KEY"))
+# streaming=True lets /search/stream forward RAG tokens; non-streaming callers still get the full answer
+llm = ChatOpenAI(model_name="gpt-4o-mini", streaming=True)
+groq_client = AsyncGroq(api_key=os.environ.get("GROQ_API_KEY"))
+
+class TimedFlashrankRerank(FlashrankRerank):
+    """
+    FlashrankRerank that records its latency as the "rerank" stage.
+    """
+
+    def compress_documents(self, documents, query, callbacks=None):
+        with timed("rerank"):
+            return super().compress_documents(documents, query, callbacks)
 
 # Initialize Flash Reranker and retriever
-compressor = FlashrankRerank()
+compressor = TimedFlashrankRerank()
 retriever = ContextualCompressionRetriever(
     base_compressor=compressor,
-    base_retriever=vectorstore.as_retriever(search_kwargs={"k": 10})
+    base_retriever=HybridRetriever(
+        vector_retriever=vectorstore.as_retriever(search_kwargs={"k": 10}),
+        keyword_index=keyword_index,
+        k=10,
+    )
 )
 
 # Create RetrievalQA chain with the new retriever
@@ -61,16 +118,16 @@ qa_chain = RetrievalQA.from_chain_type(
 greetings = ["hey", "hi", "hello", "greetings", "howdy"]
 farewells = ["bye", "goodbye", "see you", "take care", "thank you", "thanks"]
 
-# Initialize a global list to hold chat history and cache for responses
-chat_history: List[Dict[str, str]] = []
-response_cache: Dict[str, str] = {}
+# Keyword lists used to pick a branch when the intent router defers to the LLM
+medical_keywords = ["diagnosis", "symptom", "disease", "treatment", "medicine", "medical condition", "patient"]
+diet_plan = ["diet plan"]
 
+# Session-scoped chat history and cache for responses
+chat_history = HistoryStore()
+response_cache = ResponseCache()
 
-def check_query (query):
-    client = Groq(
-        api_key=os.getenv("GROQ_API_KEY")
-    )
-        
+
+async def check_query (query):
     prompt = [
         {
             "role": "user",
@@ -78,13 +135,32 @@ def check_query (query):
         },
     ]
     
-    chat_completion = client.chat.completions.create(
-    messages=prompt,
-    model="llama3-8b-8192",
-    )
+    with timed("check_query"):
+        chat_completion = await groq_client.chat.completions.create(
+        messages=prompt,
+        model="llama3-8b-8192",
+        )
+    if chat_completion.usage:
+        record_tokens("check_query", "llama3-8b-8192", chat_completion.usage.prompt_tokens, chat_completion.usage.completion_tokens)
 
     return chat_completion.choices[0].message.content.strip()
 
+async def classify_with_llm(query):
+    """
+    Fallback for the local intent router: LLM guardrail first, then the keyword scans.
+    """
+    query_lower = query.lower()
+    if await check_query(query_lower) != "True":
+        return "off_topic"
+    if any(keyword in query_lower for keyword in medical_keywords):
+        return "medical"
+    if any(keyword in query_lower for keyword in diet_plan):
+        return "diet_plan"
+    return "rag"
+
+# Local CPU intent router; only low-confidence queries pay for the LLM round trip
+intent_router = IntentRouter(fallback=classify_with_llm)
+
 def create_prompt(query):
     return f"""
     Provide concise nutritional information about the following food: {query}. 
@@ -93,198 +169,363 @@ def create_prompt(query):
     If the food is not related to diet or nutrition, respond with 'I'm not allowed to respond to that :) Hope you understand >_< '.
     """
 @app.post("/summarize-chat")
-async def handle_summarize():
+async def handle_summarize(session_id: str = DEFAULT_SESSION):
+    # Each request renders into its own files, so concurrent sessions never see each other's summary
+    pdf_path = await run_blocking(new_summary_pdf)
+    summary_path = pdf_path[:-len(".pdf")] + ".txt"
     try:
-        summarize_chat_history(chat_history)
-        print("done")
-        write_pdf()
-        pdf_filename = "final_output.pdf"  # Assuming this is the PDF filename
-        print("done")
-        return JSONResponse(content={"message": "Summary generated successfully", "pdf_filename": pdf_filename}, status_code=200)
+        with timed("pdf_summary"):
+            await run_blocking(summarize_chat_history, chat_history.turns(session_id), summary_path)
+        with timed("pdf_render"):
+            await run_blocking(write_pdf, summary_path, pdf_path)
     except Exception as e:
+        remove_file(pdf_path)
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        remove_file(summary_path)
+    pdf_filename = os.path.basename(pdf_path)
+    return JSONResponse(content={"message": "Summary generated successfully", "pdf_filename": pdf_filename}, status_code=200)
 
 # Add new route for getting the PDF
 @app.get("/get-pdf/{pdf_filename}")
 async def get_pdf(pdf_filename: str):
-    try:
-        print("before get")
-        pdf_path = pdf_filename  # Use the provided filename
-        if os.path.exists(pdf_path):
-            return FileResponse(
-                pdf_path,
-                media_type="application/pdf",
-                filename="chat_summary.pdf"
-            )
-        else:
-            raise HTTPException(status_code=404, detail="PDF not found")
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    pdf_path = summary_pdf_path(pdf_filename)
+    if pdf_path is None:
+        raise HTTPException(status_code=404, detail="PDF not found")
+    # One download per summary: the file is deleted once it has been sent
+    return FileResponse(
+        pdf_path,
+        media_type="application/pdf",
+        filename="chat_summary.pdf",
+        background=BackgroundTask(remove_file, pdf_path),
+    )
 
 @app.get("/chat-history")
-async def get_chat_history():
-    return {"history": chat_history}
+async def get_chat_history(session_id: str = DEFAULT_SESSION, cursor: int = 0, limit: int = HISTORY_PAGE_SIZE):
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    return chat_history.page(session_id, cursor, limit)
+
+@app.get("/cache-stats")
+async def get_cache_stats():
+    return response_cache.stats()
+
+@app.get("/metrics")
+async def get_metrics():
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+class TokenStreamHandler(AsyncCallbackHandler):
+    """
+    Forwards tokens generated inside qa_chain as "token" events.
+    """
+
+    def __init__(self, emit):
+        self.emit = emit
+
+    async def on_llm_new_token(self, token, **kwargs):
+        if token:
+            await self.emit("token", {"text": token})
+
+class StageMetricsHandler(AsyncCallbackHandler):
+    """
+    Times the vector-store retrieval and the answer generation inside qa_chain and counts the
+    generation's tokens. Reranking is timed by TimedFlashrankRerank.
+    """
+
+    def __init__(self):
+        self._runs = {}
+
+    async def on_retriever_start(self, serialized, query, *, run_id, name=None, **kwargs):
+        # The compression retriever wraps the vector-store one; only the inner search is "retrieval"
+        if name == "VectorStoreRetriever":
+            self._runs[run_id] = (time.perf_counter(), 0)
+
+    async def on_retriever_end(self, documents, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run:
+            stage_seconds.observe(time.perf_counter() - run[0], stage="rag_retrieval")
+
+    async def on_retriever_error(self, error, *, run_id, **kwargs):
+        if self._runs.pop(run_id, None):
+            stage_errors.inc(stage="rag_retrieval")
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        prompt_tokens = sum(count_tokens(str(message.content)) for batch in messages for message in batch)
+        self._runs[run_id] = (time.perf_counter(), prompt_tokens)
+
+    async def on_llm_end(self, response, *, run_id, **kwargs):
+        run = self._runs.pop(run_id, None)
+        if run:
+            stage_seconds.observe(time.perf_counter() - run[0], stage="rag_generation")
+            completion_tokens = sum(count_tokens(g.text) for gens in response.generations for g in gens)
+            record_tokens("rag_generation", llm.model_name, run[1], completion_tokens)
+
+    async def on_llm_error(self, error, *, run_id, **kwargs):
+        if self._runs.pop(run_id, None):
+            stage_errors.inc(stage="rag_generation")
+
+rag_metrics = StageMetricsHandler()
+
+async def discard_event(event, data):
+    pass
 
 @app.get("/search")
-async def search(query: str):
+async def search(query: str, session_id: str = DEFAULT_SESSION, mrn: Optional[str] = None):
     if not query:
         raise HTTPException(status_code=400, detail="No question provided")
+    if mrn:
+        chat_history.bind_patient(session_id, mrn)
+    with timed("search"):
+        return await run_search(query, session_id, mrn=mrn)
+
+@app.get("/search/stream")
+async def search_stream(query: str, session_id: str = DEFAULT_SESSION, mrn: Optional[str] = None):
+    """
+    Server-Sent Events variant of /search: progress events as stages complete, "token" events from
+    the final generation, then a "done" event carrying the same payload /search would return.
+    """
+    if not query:
+        raise HTTPException(status_code=400, detail="No question provided")
+    if mrn:
+        chat_history.bind_patient(session_id, mrn)
+
+    queue = asyncio.Queue()
+
+    async def emit(event, data):
+        await queue.put((event, data))
+
+    async def produce():
+        try:
+            with timed("search"):
+                result = await run_search(query, session_id, emit, mrn=mrn)
+            await emit("done", result)
+        except Exception as e:
+            await emit("error", {"detail": str(e)})
+        finally:
+            await queue.put(None)
+
+    async def event_stream():
+        task = asyncio.create_task(produce())
+        try:
+            while (item := await queue.get()) is not None:
+                event, data = item
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+        finally:
+            # Client went away: stop the pipeline instead of finishing work nobody will read
+            task.cancel()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+async def gather_content(query, intent, emit):
+    """
+    Web content for a personalised answer. Topics already covered by pages ingested for earlier
+    queries are recalled from the vector store; otherwise we search and crawl, and queue the pages
+    for ingestion. Returns (content, source urls); content is None when nothing usable was found.
+    """
+    recalled = await scrape_ingestor.recall(query)
+    if recalled:
+        content, sources = recalled
+        content_source.inc(intent=intent, source="rag")
+        await emit("urls", {"urls": sources, "recalled": True})
+        return content, sources
+
+    content_source.inc(intent=intent, source="web")
+    available_urls = await get_query_urls(query)
+    await emit("urls", {"urls": available_urls})
+    if not available_urls:
+        return None, available_urls
+
+    pages = await web_scrap_avail_links(available_urls)
+    webscraped_content = "\n".join(page for _, page in pages)
+    await emit("crawl", {"pages": len(pages), "characters": len(webscraped_content)})
+    if not pages:
+        return None, available_urls
+
+    # Embedded in the background so the next query on this topic can skip the crawl
+    scrape_ingestor.submit(query, pages)
+    return webscraped_content, available_urls
+
+async def run_search(query, session_id=DEFAULT_SESSION, emit=None, mrn=None):
+    emit = emit or discard_event
+    streaming = emit is not discard_event
+
+    # Turns added by this request; returned instead of the whole log
+    delta = []
+
+    def remember(role, content):
+        delta.append(chat_history.append(session_id, role, content))
 
     query_lower = query.lower()
 
     # Check if the query is a greeting or farewell
-    if query_lower in greetings:
+    with timed("greeting_check"):
+        is_greeting = query_lower in greetings
+        is_farewell = query_lower in farewells
+
+    if is_greeting:
         response_message = "Hello! How can I assist you today?"
-        chat_history.append({'role': 'user', 'content': query})
-        chat_history.append({'role': 'assistant', 'content': response_message})
-        return {"message": response_message, "webscraping": False}
+        remember('user', query)
+        remember('assistant', response_message)
+        return {"message": response_message, "webscraping": False, "history": delta}
 
-    if query_lower in farewells:
+    if is_farewell:
         response_message = "You're welcome! Have a great day!"
-        chat_history.append({'role': 'user', 'content': query})
-        chat_history.append({'role': 'assistant', 'content': response_message})
-        return {"message": response_message, "webscraping": False}
+        remember('user', query)
+        remember('assistant', response_message)
+        return {"message": response_message, "webscraping": False, "history": delta}
 
-    # Define valid keywords for queries
-    valid_keywords = ["nutrition", "diet", "medical diagnosis", "symptom", "treatment"]
+    # Route the query locally (off-topic, small talk, medical, diet plan or RAG)
+    with timed("intent_route"):
+        verdict = await intent_router.route(query)
+    intent = verdict.intent
+    await emit("classification", {"intent": intent, "source": verdict.source})
 
-    # Check if the query contains valid keywords; if not, respond with an error message.
-    if check_query(query_lower) != "True":
+    if intent == "small_talk":
+        response_message = "Hello! How can I assist you today?"
+        if any(farewell in query_lower for farewell in farewells):
+            response_message = "You're welcome! Have a great day!"
+        remember('user', query)
+        remember('assistant', response_message)
+        return {"message": response_message, "webscraping": False, "history": delta}
+
+    # Off-topic queries get a polite refusal
+    if intent == "off_topic":
         response_message = "Please ask me questions from nutritional content, diet plan, medical diagnosis."
-        chat_history.append({'role': 'user', 'content': query})
-        chat_history.append({'role': 'assistant', 'content': response_message})
-        return {"message": response_message}
-
-    # Check cache for repeated questions
-    if query in response_cache:
-        cached_response = response_cache[query]
-        chat_history.append({'role': 'user', 'content': query})
-        chat_history.append({'role': 'assistant', 'content': cached_response})
+        remember('user', query)
+        remember('assistant', response_message)
+        return {"message": response_message, "history": delta}
+
+    # Personalised branches are cached per patient record; RAG answers are shared by everyone
+    patient_data = None
+    cache_scope = (intent,)
+    if intent in ("medical", "diet_plan"):
+        # Patient MRN (Medical Record Number) travels with the request or is remembered by the session
+        patient_mrn = mrn or chat_history.patient_mrn(session_id)
+
+        # Get patient data using the MRN
+        with timed("patient_lookup"):
+            patient_data = await patient_cache.get(patient_mrn) if patient_mrn else None
+        cache_scope = (intent, patient_mrn, record_version(patient_data))
+
+    # Check cache for repeated (or paraphrased) questions
+    with timed("cache_lookup"):
+        cached_response = response_cache.get(query, cache_scope)
+    record_cache("response", cached_response is not None)
+    await emit("cache", {"hit": cached_response is not None})
+    if cached_response is not None:
+        remember('user', query)
+        remember('assistant', cached_response)
         
         return {
             "message": cached_response,
-            "history": chat_history,
+            "history": delta,
             "cachedResponse": True  # Indicate that this was a cached response
         }
 
-    medical_keywords = ["diagnosis", "symptom", "disease", "treatment", "medicine", "medical condition", "patient"]
-    diet_plan = ["diet plan"]
-
-    if any(keyword in query_lower for keyword in medical_keywords):
-        chat_history.append({'role': 'user', 'content': query})
+    if intent == "medical":
+        remember('user', query)
 
-        # Get available URLs for web scraping
-        available_urls = get_query_urls(query)
-        if not available_urls:
+        # Web content from earlier ingested pages, or a fresh search and crawl
+        webscraped_content, available_urls = await gather_content(query, intent, emit)
+        if not webscraped_content:
             response_message = "Sorry, I couldn't find relevant information for your medical query."
-            chat_history.append({'role': 'assistant', 'content': response_message})
-            return {"message": response_message, "webscraping": False}
-
-        # Perform web scraping on available links
-        await web_scrap_avail_links(available_urls)
-
-        # Read the scraped content from file
-        with open("scrapped.txt", "r", encoding="utf-8") as file:
-            webscraped_content = file.read()
-
-        # Read patient MRN (Medical Record Number) from file
-        with open("mrn_number.txt", 'r') as mrn:
-            patient_mrn = mrn.read()
-
-        # Get patient data using the MRN
-        patient_data = get_patient_by_mrn(patient_mrn)
+            remember('assistant', response_message)
+            return {"message": response_message, "webscraping": False, "history": delta}
 
         # Perform LLM inference using the patient data, web-scraped content, and query
-        final_response = llm_infer(patient_data, webscraped_content, query)
+        final_response = await llm_infer(patient_data, webscraped_content, query, emit if streaming else None)
 
         # Cache the final response for future queries
-        response_cache[query] = final_response
+        response_cache.put(query, cache_scope, final_response)
 
         # Append the final response to the chat history
-        chat_history.append({'role': 'assistant', 'content': final_response})
+        remember('assistant', final_response)
 
         # Return the final response
         return {
             "message": final_response,
             "webscraping": True,
-            "history": chat_history,
+            "history": delta,
             "cachedResponse": False  # Indicate that this was not a cached response
         }
 
     
-    if any(keyword in query_lower for keyword in diet_plan):
-            chat_history.append({'role': 'user', 'content': query})
-            available_urls = get_query_urls(query)
-            if not available_urls:
+    if intent == "diet_plan":
+            remember('user', query)
+            webscraped_content, available_urls = await gather_content(query, intent, emit)
+            if not webscraped_content:
                 response_message = "Sorry, I couldn't find relevant information for your medical query."
-                chat_history.append({'role': 'assistant', 'content': response_message})
-                return {"message": response_message}
-
-            # Perform web scraping and generate response
-            await web_scrap_avail_links(available_urls)
-            with open("mrn_number.txt", 'r') as mrn:
-                patient_mrn = mrn.read()
-                
-            with open("scrapped.txt", "r", encoding="utf-8") as file:
-                webscraped_content = file.read()
-                
-            patient_data = get_patient_by_mrn(patient_mrn)
+                remember('assistant', response_message)
+                return {"message": response_message, "history": delta}
             
-            final_response = diet_plan_call(patient_data, webscraped_content, query)
+            final_response = await diet_plan_call(patient_data, webscraped_content, query, emit if streaming else None)
             
             # Cache the final response for future queries
-            response_cache[query] = final_response
+            response_cache.put(query, cache_scope, final_response)
             
-            chat_history.append({'role': 'assistant', 'content': final_response})
+            remember('assistant', final_response)
 
             return {
                 "message": final_response,
                 "sources": available_urls,
-                "history": chat_history,
+                "history": delta,
                 "cachedResponse": False  # Indicate that this was not a cached response 
             }
 
     
     # If not a medical or diet plan query, proceed with RAG search 
-    result = qa_chain({"query": query})
+    callbacks = [rag_metrics] + ([TokenStreamHandler(emit)] if streaming else [])
+    with timed("rag_chain"):
+        result = await qa_chain.ainvoke({"query": query}, config={"callbacks": callbacks})
 
     
     if result['result'] == "I don't know.":
+        # Tell streaming clients to drop the "I don't know." tokens before the fallback answer arrives
+        await emit("reset", {})
         prompt = create_prompt(query)
-        
-        groq_response = groq_client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
+
+        async def emit_formatted(event, data):
+            await emit(event, {"text": data["text"].replace("*", "\n")})
+
+        groq_response = await complete(
+            [{"role": "user", "content": prompt}],
             model="llama-3.1-8b-instant",
+            emit=emit_formatted if streaming else None,
+            stage="groq_fallback",
         )
         
-        formatted_response = groq_response.choices[0].message.content.replace("*", "\n")
+        formatted_response = groq_response.replace("*", "\n")
         
         # Cache the Groq model's formatted response for future queries 
-        response_cache[query] = formatted_response
+        response_cache.put(query, cache_scope, formatted_response)
         
         
-        chat_history.append({'role': 'user', 'content': query})
+        remember('user', query)
         
-        chat_history.append({'role': 'assistant', 'content': formatted_response})
+        remember('assistant', formatted_response)
 
         
         return {
             "message": formatted_response,
             "ragRetrieval": True,
-            "history": chat_history,
+            "history": delta,
             "cachedResponse": False  # Indicate that this was not a cached response 
         }
 
     
-    chat_history.append({'role': 'user', 'content': query})
+    remember('user', query)
     
-    chat_history.append({'role': 'assistant', 'content': result['result']})
+    remember('assistant', result['result'])
 
     
     return {
          "message": result['result'],
          "sources": [doc.page_content for doc in result['source_documents']],
-         "history": chat_history,
+         "history": delta,
          "ragRetrieval": True,
          "cachedResponse": False  # Indicate that this was not a cached response 
      }
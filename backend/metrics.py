@@ -0,0 +1,173 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+
+# In-process metrics rendered in the Prometheus text format by the /metrics endpoint in main.py.
+# Recording is a lock plus a dict update, cheap enough to leave on for every request.
+
+# Seconds; spans cache lookups (sub-millisecond) through multi-call LLM pipelines (tens of seconds)
+STAGE_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(labels.get(name, "") for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_samples(items))
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_samples(self, items):
+        for key, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {_format_number(value)}"
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, with a trailing slot for +Inf, then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = state[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            state[1] += value
+
+    def _render_samples(self, items):
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", _format_number(bound))])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {_format_number(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+stage_seconds = REGISTRY.register(
+    Histogram("nutrino_stage_seconds", "Latency of each /search pipeline stage in seconds.", ["stage"])
+)
+stage_errors = REGISTRY.register(
+    Counter("nutrino_stage_errors_total", "Pipeline stages that raised.", ["stage"])
+)
+llm_tokens = REGISTRY.register(
+    Counter("nutrino_llm_tokens_total", "LLM tokens sent (in) and generated (out).", ["stage", "model", "direction"])
+)
+cache_requests = REGISTRY.register(
+    Counter("nutrino_cache_requests_total", "Cache lookups by cache and result (hit ratio = hit / all).",
+            ["cache", "result"])
+)
+
+ingest_chunks = REGISTRY.register(
+    Counter("nutrino_ingest_chunks_total", "Scraped chunks offered to the vector store, by outcome.", ["result"])
+)
+content_source = REGISTRY.register(
+    Counter("nutrino_content_source_total",
+            "Medical/diet-plan queries answered from ingested pages (rag) or a fresh search and crawl (web).",
+            ["intent", "source"])
+)
+
+retrieval_path = REGISTRY.register(
+    Counter("nutrino_retrieval_path_total", "RAG retrievals answered by the keyword index alone or by hybrid fusion.",
+            ["path"])
+)
+
+
+@contextmanager
+def timed(stage):
+    """
+    Record the latency of the enclosed block under `stage`, and count it as an error if it raises.
+    Usable around awaits; cancellation (client went away) is not an error.
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    except asyncio.CancelledError:
+        raise
+    except BaseException:
+        stage_errors.inc(stage=stage)
+        raise
+    finally:
+        stage_seconds.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_tokens(stage, model, tokens_in, tokens_out):
+    llm_tokens.inc(tokens_in, stage=stage, model=model, direction="in")
+    llm_tokens.inc(tokens_out, stage=stage, model=model, direction="out")
+
+
+def record_cache(cache, hit):
+    cache_requests.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def render_metrics():
+    return REGISTRY.render()
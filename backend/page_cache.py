@@ -0,0 +1,192 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from concurrency import run_blocking
+
+# Relative to this module by default, so the cache lands in the same place whatever the working directory
+PAGE_CACHE_DIR = os.getenv("PAGE_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "page_cache"))
+PAGE_CACHE_TTL = float(os.getenv("PAGE_CACHE_TTL", str(24 * 60 * 60)))
+PAGE_CACHE_MAX_BYTES = int(os.getenv("PAGE_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+
+_TRACKING_PREFIXES = ("utm_",)
+_TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref_src"}
+
+
+def normalize_url(url):
+    """
+    Canonical cache key for a URL: lowercase scheme/host, no default port, fragment or tracking
+    parameters, sorted query string and no trailing slash.
+    """
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if parts.port and not ((scheme == "http" and parts.port == 80) or (scheme == "https" and parts.port == 443)):
+        host = f"{host}:{parts.port}"
+    query = sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not (key.lower().startswith(_TRACKING_PREFIXES) or key.lower() in _TRACKING_PARAMS)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
+
+
+class PageCache:
+    """
+    Content-addressed on-disk cache of crawled markdown.
+
+    Pages are stored once per distinct content as zlib-compressed blobs; an SQLite index maps
+    normalised URLs to blobs along with the fetch metadata needed for conditional revalidation.
+    Least recently used entries are evicted once the blobs exceed `max_bytes`.
+    """
+
+    def __init__(self, directory=PAGE_CACHE_DIR, ttl=PAGE_CACHE_TTL, max_bytes=PAGE_CACHE_MAX_BYTES):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._connection = None
+
+    @property
+    def _db(self):
+        """
+        The SQLite index, opened on first use so building a cache (e.g. at import) writes nothing to
+        disk. Caller holds the lock.
+        """
+        if self._connection is None:
+            os.makedirs(os.path.join(self.directory, "blobs"), exist_ok=True)
+            db = sqlite3.connect(os.path.join(self.directory, "index.sqlite"), check_same_thread=False)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(
+                """
+                CREATE TABLE IF NOT EXISTS pages (
+                    url TEXT PRIMARY KEY,
+                    content_hash TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS pages_last_access ON pages (last_access)")
+            db.execute("CREATE INDEX IF NOT EXISTS pages_content_hash ON pages (content_hash)")
+            db.commit()
+            self._connection = db
+        return self._connection
+
+    def _blob_path(self, content_hash):
+        return os.path.join(self.directory, "blobs", content_hash[:2], f"{content_hash}.z")
+
+    def _lookup(self, url):
+        key = normalize_url(url)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT content_hash, etag, last_modified, fetched_at FROM pages WHERE url = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._db.execute("UPDATE pages SET last_access = ? WHERE url = ?", (time.time(), key))
+            self._db.commit()
+        content_hash, etag, last_modified, fetched_at = row
+        try:
+            with open(self._blob_path(content_hash), "rb") as blob:
+                markdown = zlib.decompress(blob.read()).decode("utf-8")
+        except (OSError, zlib.error):
+            self._delete(key)
+            return None
+        return {
+            "markdown": markdown,
+            "etag": etag,
+            "last_modified": last_modified,
+            "fetched_at": fetched_at,
+            "fresh": time.time() - fetched_at < self.ttl,
+        }
+
+    def _store(self, url, markdown, etag=None, last_modified=None):
+        key = normalize_url(url)
+        data = markdown.encode("utf-8")
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(content_hash)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            compressed = zlib.compress(data, 6)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as blob:
+                blob.write(compressed)
+            os.replace(tmp_path, path)
+        size = os.path.getsize(path)
+        now = time.time()
+        with self._lock:
+            previous = self._db.execute("SELECT content_hash FROM pages WHERE url = ?", (key,)).fetchone()
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, content_hash, size, etag, last_modified, now, now),
+            )
+            self._db.commit()
+            if previous and previous[0] != content_hash:
+                self._drop_blob_if_unused(previous[0])
+        self._evict()
+
+    def _touch(self, url):
+        with self._lock:
+            now = time.time()
+            self._db.execute(
+                "UPDATE pages SET fetched_at = ?, last_access = ? WHERE url = ?", (now, now, normalize_url(url))
+            )
+            self._db.commit()
+
+    def _delete(self, key):
+        with self._lock:
+            row = self._db.execute("SELECT content_hash FROM pages WHERE url = ?", (key,)).fetchone()
+            self._db.execute("DELETE FROM pages WHERE url = ?", (key,))
+            self._db.commit()
+            if row:
+                self._drop_blob_if_unused(row[0])
+
+    def _drop_blob_if_unused(self, content_hash):
+        """
+        Remove a blob no URL points at any more; returns the bytes freed. Caller holds the lock.
+        """
+        if self._db.execute("SELECT 1 FROM pages WHERE content_hash = ? LIMIT 1", (content_hash,)).fetchone():
+            return 0
+        path = self._blob_path(content_hash)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+            return size
+        except OSError:
+            return 0
+
+    def _total_bytes(self):
+        return self._db.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT DISTINCT content_hash, size FROM pages)"
+        ).fetchone()[0]
+
+    def _evict(self):
+        with self._lock:
+            total = self._total_bytes()
+            if total <= self.max_bytes:
+                return
+            rows = self._db.execute("SELECT url, content_hash FROM pages ORDER BY last_access").fetchall()
+            for url, content_hash in rows:
+                if total <= self.max_bytes:
+                    break
+                self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+                total -= self._drop_blob_if_unused(content_hash)
+            self._db.commit()
+
+    # The event loop never touches SQLite or the blob files directly
+    async def lookup(self, url):
+        return await run_blocking(self._lookup, url)
+
+    async def store(self, url, markdown, etag=None, last_modified=None):
+        await run_blocking(self._store, url, markdown, etag, last_modified)
+
+    async def touch(self, url):
+        await run_blocking(self._touch, url)
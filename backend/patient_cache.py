@@ -0,0 +1,150 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from concurrency import run_blocking
+from metrics import record_cache
+
+PATIENT_CACHE_MAX_ENTRIES = int(os.getenv("PATIENT_CACHE_MAX_ENTRIES", "1024"))
+PATIENT_CACHE_TTL = float(os.getenv("PATIENT_CACHE_TTL", "300"))
+# Used when the deployment doesn't support change streams (standalone mongod)
+PATIENT_CACHE_POLL_INTERVAL = float(os.getenv("PATIENT_CACHE_POLL_INTERVAL", "5"))
+
+# Written by the records app (app.py) on every insert/update
+LAST_UPDATED_FIELD = "Last Updated"
+
+# Error codes Mongo returns when change streams aren't available on this deployment
+_CHANGE_STREAM_UNSUPPORTED = {40573, 136, 40324}
+
+
+class PatientCache:
+    """
+    Bounded TTL cache of patient profiles in front of `loader` (a blocking MRN -> document lookup).
+
+    Lookups are awaited off the event loop and concurrent misses for the same MRN share one query.
+    Entries are invalidated as soon as the records app writes the patient, via a change stream on
+    `collection` or, where change streams are unsupported, by polling the "Last Updated" field.
+    """
+
+    def __init__(self, collection, loader, max_entries=PATIENT_CACHE_MAX_ENTRIES, ttl=PATIENT_CACHE_TTL,
+                 poll_interval=PATIENT_CACHE_POLL_INTERVAL):
+        self.collection = collection
+        self.loader = loader
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.poll_interval = poll_interval
+        self._entries = OrderedDict()  # mrn -> (patient, expires_at)
+        self._ids = {}  # document _id -> mrn, so deletes (which only carry the _id) can be matched
+        self._inflight = {}
+        self._lock = threading.Lock()
+        # Bumped on every invalidation; a load that straddles one is not cached
+        self._epoch = 0
+        self._stop = threading.Event()
+        self._watcher = None
+        self._stream = None
+
+    async def get(self, mrn):
+        with self._lock:
+            entry = self._entries.get(mrn)
+            if entry is not None and entry[1] > time.monotonic():
+                self._entries.move_to_end(mrn)
+                record_cache("patient", True)
+                return entry[0]
+
+        record_cache("patient", False)
+        future = self._inflight.get(mrn)
+        if future is None:
+            future = asyncio.ensure_future(self._load(mrn))
+            self._inflight[mrn] = future
+            future.add_done_callback(lambda _: self._inflight.pop(mrn, None))
+        return await asyncio.shield(future)
+
+    async def _load(self, mrn):
+        epoch = self._epoch
+        patient = await run_blocking(self.loader, mrn)
+        with self._lock:
+            if epoch == self._epoch:
+                self._entries[mrn] = (patient, time.monotonic() + self.ttl)
+                self._entries.move_to_end(mrn)
+                if patient is not None:
+                    self._ids[str(patient["_id"])] = mrn
+                while len(self._entries) > self.max_entries:
+                    evicted, (evicted_patient, _) = self._entries.popitem(last=False)
+                    if evicted_patient is not None:
+                        self._ids.pop(str(evicted_patient["_id"]), None)
+        return patient
+
+    def invalidate(self, mrn=None, document_id=None):
+        with self._lock:
+            self._epoch += 1
+            if mrn is None and document_id is not None:
+                mrn = self._ids.get(str(document_id))
+            entry = self._entries.pop(mrn, None)
+            if entry is not None and entry[0] is not None:
+                self._ids.pop(str(entry[0]["_id"]), None)
+
+    def start(self):
+        if self._watcher is None:
+            self._stop.clear()
+            self._watcher = threading.Thread(target=self._watch, name="patient-cache-watcher", daemon=True)
+            self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+        stream = self._stream
+        if stream is not None:
+            try:
+                stream.close()
+            except PyMongoError:
+                pass
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.poll_interval + 1)
+            self._watcher = None
+
+    def _watch(self):
+        pipeline = [{"$match": {"operationType": {"$in": ["insert", "update", "replace", "delete"]}}}]
+        while not self._stop.is_set():
+            try:
+                with self.collection.watch(pipeline, full_document="updateLookup") as stream:
+                    self._stream = stream
+                    for change in stream:
+                        document = change.get("fullDocument") or {}
+                        self.invalidate(document.get("MRN Number"), change["documentKey"]["_id"])
+                        if self._stop.is_set():
+                            return
+            except OperationFailure as e:
+                if e.code in _CHANGE_STREAM_UNSUPPORTED or "replica set" in str(e).lower():
+                    print("Change streams unavailable, polling for patient updates instead")
+                    self._poll()
+                    return
+                print(f"Patient change stream error: {e}")
+            except PyMongoError as e:
+                if self._stop.is_set():
+                    return
+                print(f"Patient change stream error: {e}")
+            finally:
+                self._stream = None
+            # Brief pause before resuming after a dropped stream
+            self._stop.wait(1)
+
+    def _poll(self):
+        watermark = datetime.now(timezone.utc)
+        while not self._stop.wait(self.poll_interval):
+            # Re-read a small window before the watermark to tolerate clock skew between writers
+            since = watermark - timedelta(seconds=self.poll_interval)
+            try:
+                for document in self.collection.find(
+                    {LAST_UPDATED_FIELD: {"$gt": since}}, {"MRN Number": 1, LAST_UPDATED_FIELD: 1}
+                ):
+                    self.invalidate(document.get("MRN Number"), document["_id"])
+                    updated = document[LAST_UPDATED_FIELD]
+                    if updated.tzinfo is None:
+                        updated = updated.replace(tzinfo=timezone.utc)
+                    watermark = max(watermark, updated)
+            except PyMongoError as e:
+                print(f"Patient update polling error: {e}")
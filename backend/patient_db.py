@@ -0,0 +1,239 @@
+import re
+
+from pymongo import ASCENDING, UpdateOne
+
+# Fields of a patient record, as captured by the forms in app.py
+PATIENT_FIELDS = (
+    "MRN Number",
+    "Name",
+    "Age",
+    "Gender",
+    "Email",
+    "Phone",
+    "Occupation",
+    "Weight",
+    "Weight Changes",
+    "Specific Diet",
+    "Food Intolerances/Allergies",
+    "On Medications",
+    "Other Medical History",
+    "Other Health Issues",
+    "Physical Activity Type",
+    "Physical Activity Duration (minutes/day)",
+    "Diet Type",
+    "Dietary Restrictions",
+    "Preferred Cuisine",
+)
+
+GENDERS = ("Male", "Female", "Other")
+CUISINES = ("Indian", "Continental", "Chinese", "Italian", "Mexican", "Other")
+
+# Numeric fields and their bounds, matching the number inputs on the forms
+_INT_FIELDS = {"Age": (0, 120), "Physical Activity Duration (minutes/day)": (0, None)}
+_FLOAT_FIELDS = {"Weight": (0.0, None)}
+# Fields where an empty CSV cell means "not given" rather than a value
+_BLANK_MEANS_MISSING = {*_INT_FIELDS, *_FLOAT_FIELDS, "Preferred Cuisine"}
+
+# What the LLM gets to see of a patient: identifiers and contact details never leave the database
+CLINICAL_FIELDS = (
+    "Age",
+    "Gender",
+    "Weight",
+    "Weight Changes",
+    "Specific Diet",
+    "Food Intolerances/Allergies",
+    "On Medications",
+    "Other Medical History",
+    "Other Health Issues",
+    "Physical Activity Type",
+    "Physical Activity Duration (minutes/day)",
+    "Diet Type",
+    "Dietary Restrictions",
+    "Preferred Cuisine",
+)
+_PROFILE_LABELS = {"Weight": "Weight (kg)"}
+
+# Lowercased name words (plus the full name) so name search is an anchored, index-backed prefix match
+NAME_KEYS_FIELD = "Name Keys"
+# Uppercased MRN, so a partial MRN matches however it was typed when the record was created or searched
+MRN_KEY_FIELD = "MRN Key"
+
+PATIENT_SEARCH_PAGE_SIZE = 20
+
+# Projections: search results only need a summary row; the chat backend never needs the search keys
+SUMMARY_PROJECTION = {"_id": 0, "MRN Number": 1, "Name": 1, "Age": 1, "Gender": 1}
+EXISTS_PROJECTION = {"_id": 1}
+PROFILE_PROJECTION = {NAME_KEYS_FIELD: 0, MRN_KEY_FIELD: 0}
+
+
+def name_keys(name):
+    name = " ".join(str(name or "").lower().split())
+    if not name:
+        return []
+    words = name.split()
+    return sorted(set(words) | {name})
+
+
+def mrn_key(mrn):
+    return "".join(str(mrn or "").split()).upper()
+
+
+def search_keys(patient):
+    """
+    The derived search fields for the identifiers present in `patient`, to write alongside it.
+    """
+    keys = {}
+    if "MRN Number" in patient:
+        keys[MRN_KEY_FIELD] = mrn_key(patient["MRN Number"])
+    if "Name" in patient:
+        keys[NAME_KEYS_FIELD] = name_keys(patient["Name"])
+    return keys
+
+
+def _number(value, cast, bounds):
+    if isinstance(value, str):
+        value = value.strip()
+    number = cast(float(value)) if cast is int else cast(value)
+    low, high = bounds
+    if (low is not None and number < low) or (high is not None and number > high):
+        raise ValueError(f"{number} out of range")
+    return number
+
+
+def validate_patient(record):
+    """
+    Coerce a raw record (CSV row or JSON object) to the form schema. Returns (patient, errors); a
+    record with errors must not be written. Fields outside the schema are dropped, and so are blank
+    numeric and cuisine cells, so a partial row never overwrites stored values with 0 or [].
+    """
+    errors = []
+    patient = {}
+    for field in PATIENT_FIELDS:
+        value = record.get(field)
+        if value is None:
+            continue
+        if isinstance(value, str) and not value.strip() and field in _BLANK_MEANS_MISSING:
+            continue
+        try:
+            if field in _INT_FIELDS:
+                value = _number(value, int, _INT_FIELDS[field])
+            elif field in _FLOAT_FIELDS:
+                value = _number(value, float, _FLOAT_FIELDS[field])
+            elif field == "Preferred Cuisine":
+                if isinstance(value, str):
+                    value = [item.strip() for item in value.split(";") if item.strip()]
+                unknown = [item for item in value if item not in CUISINES]
+                if unknown:
+                    raise ValueError(f"unknown cuisine {unknown}")
+                value = list(value)
+            else:
+                value = str(value).strip()
+                if field == "Gender" and value and value not in GENDERS:
+                    raise ValueError(f"expected one of {GENDERS}")
+        except (TypeError, ValueError, OverflowError) as e:
+            errors.append(f"{field}: {e}")
+            continue
+        patient[field] = value
+    if not patient.get("MRN Number"):
+        errors.append("MRN Number: required")
+    return patient, errors
+
+
+def _profile_value(value):
+    if isinstance(value, (list, tuple)):
+        return ", ".join(" ".join(str(item).split()) for item in value if str(item).strip())
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return " ".join(str(value).split())
+
+
+def compact_profile(patient):
+    """
+    Terse, deterministic prompt rendering of a patient: clinical fields only, empty ones and PII
+    dropped, one "field: value" per line in sorted order so identical records give identical prompts.
+    """
+    if not patient:
+        return "No medical record on file"
+    lines = []
+    for field in sorted(CLINICAL_FIELDS):
+        value = _profile_value(patient.get(field, ""))
+        # Zero weight/duration is the form default, not a measurement
+        if value and value != "0":
+            lines.append(f"{_PROFILE_LABELS.get(field, field)}: {value}")
+    return "\n".join(lines) or "No medical record on file"
+
+
+def ensure_indexes(collection):
+    """
+    Create the indexes patient lookups rely on. Idempotent, so both apps call it on startup.
+
+    The unique MRN index is built last: it raises DuplicateKeyError while two records share an MRN
+    (see duplicate_mrns), and search still works without it.
+    """
+    collection.create_index([(MRN_KEY_FIELD, ASCENDING), ("MRN Number", ASCENDING)], name="mrn_key")
+    collection.create_index([(NAME_KEYS_FIELD, ASCENDING)], name="name_keys")
+    collection.create_index([("MRN Number", ASCENDING)], unique=True, name="mrn_unique")
+
+
+def duplicate_mrns(collection, limit=20):
+    """
+    MRNs held by more than one record, with how many records hold each; these block the unique index.
+    """
+    return [
+        (row["_id"], row["count"])
+        for row in collection.aggregate([
+            {"$group": {"_id": "$MRN Number", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+            {"$sort": {"_id": 1}},
+            {"$limit": limit},
+        ])
+    ]
+
+
+def backfill_search_keys(collection, batch_size=1000):
+    """
+    Add search keys to records written before they existed. Returns the number updated.
+    """
+    updated = 0
+    batch = []
+    missing = {"$or": [{NAME_KEYS_FIELD: {"$exists": False}}, {MRN_KEY_FIELD: {"$exists": False}}]}
+    for patient in collection.find(missing, {"Name": 1, "MRN Number": 1}):
+        keys = {NAME_KEYS_FIELD: name_keys(patient.get("Name")), MRN_KEY_FIELD: mrn_key(patient.get("MRN Number"))}
+        batch.append(UpdateOne({"_id": patient["_id"]}, {"$set": keys}))
+        if len(batch) >= batch_size:
+            updated += collection.bulk_write(batch, ordered=False).modified_count
+            batch = []
+    if batch:
+        updated += collection.bulk_write(batch, ordered=False).modified_count
+    return updated
+
+
+def search_query(text):
+    """
+    Mongo filter for a partial MRN or name, and the index to use. Anything containing a digit is treated
+    as an MRN prefix (case-insensitive), otherwise every word must prefix-match a word of the patient's name.
+    """
+    text = " ".join(text.split())
+    if any(ch.isdigit() for ch in text):
+        return {MRN_KEY_FIELD: {"$regex": f"^{re.escape(mrn_key(text))}"}}, "mrn_key"
+    words = text.lower().split()
+    clauses = [{NAME_KEYS_FIELD: {"$regex": f"^{re.escape(word)}"}} for word in words]
+    return (clauses[0] if len(clauses) == 1 else {"$and": clauses}), "name_keys"
+
+
+def search_patients(collection, text, page=0, page_size=PATIENT_SEARCH_PAGE_SIZE):
+    """
+    One page of summary rows matching `text`. Returns {"results", "has_next"}; no total count, since
+    counting a broad prefix would touch every match.
+    """
+    if not text.strip():
+        return {"results": [], "has_next": False}
+    query, index = search_query(text)
+    cursor = collection.find(query, SUMMARY_PROJECTION).hint(index)
+    # Pages are only stable under a total order: sort on the indexed key, ties broken by a unique field
+    if index == "mrn_key":
+        cursor = cursor.sort([(MRN_KEY_FIELD, ASCENDING), ("MRN Number", ASCENDING)])
+    else:
+        cursor = cursor.sort([(NAME_KEYS_FIELD, ASCENDING), ("_id", ASCENDING)])
+    rows = list(cursor.skip(page * page_size).limit(page_size + 1))
+    return {"results": rows[:page_size], "has_next": len(rows) > page_size}
@@ -0,0 +1,228 @@
+"""
+Bulk import/export of patient records in CSV or JSONL, using the same schema as the Streamlit forms.
+
+Import streams the file through validation into unordered bulk upserts keyed on MRN Number, so
+re-running a file is safe. Progress is checkpointed after every committed batch; re-running the same
+command after a failure resumes from there. Rows that fail validation or the write go to
+<file>.rejects.jsonl with the reason. Export streams the collection out with constant memory.
+
+In CSV files "Preferred Cuisine" is a ;-separated list.
+
+Usage:
+    python patient_io.py import patients.csv --batch-size 1000
+    python patient_io.py export patients.jsonl
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+from pymongo import MongoClient, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from patient_db import PATIENT_FIELDS, ensure_indexes, search_keys, validate_patient
+
+IMPORT_BATCH_SIZE = int(os.getenv("PATIENT_IMPORT_BATCH_SIZE", "1000"))
+EXPORT_BATCH_SIZE = int(os.getenv("PATIENT_EXPORT_BATCH_SIZE", "1000"))
+PROGRESS_EVERY = 10_000
+
+
+def file_format(path, explicit=None):
+    fmt = explicit or os.path.splitext(path)[1].lstrip(".").lower()
+    if fmt not in ("csv", "jsonl"):
+        sys.exit(f"Can't tell the format of {path}; pass --format csv or --format jsonl")
+    return fmt
+
+
+def read_records(path, fmt):
+    """
+    Yield (position, record) pairs; position is the 1-based row/line number used for checkpoints.
+    Malformed JSON lines come through as (position, None).
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            for position, row in enumerate(csv.DictReader(f), start=1):
+                yield position, row
+        else:
+            for position, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield position, json.loads(line)
+                except json.JSONDecodeError:
+                    yield position, None
+
+
+def upsert(patient, now):
+    # Only the fields in the row are written, so a row without a Name keeps the stored name and its search keys
+    return UpdateOne(
+        {"MRN Number": patient["MRN Number"]},
+        {
+            "$set": {**patient, **search_keys(patient), "Last Updated": now},
+            "$inc": {"Record Version": 1},
+        },
+        upsert=True,
+    )
+
+
+class Checkpoint:
+    """
+    Last committed input position, tied to the file's size and mtime so an edited file starts over.
+    """
+
+    def __init__(self, path, source):
+        self.path = path
+        stat = os.stat(source)
+        self.identity = {"source": os.path.abspath(source), "size": stat.st_size, "mtime": stat.st_mtime}
+
+    def load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return 0
+        if saved.get("identity") != self.identity:
+            return 0
+        return saved.get("position", 0)
+
+    def save(self, position):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"identity": self.identity, "position": position}, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class Throughput:
+    def __init__(self, label):
+        self.label = label
+        self.count = 0
+        self.start = time.perf_counter()
+        self._next_report = PROGRESS_EVERY
+
+    def add(self, n):
+        self.count += n
+        if self.count >= self._next_report:
+            self._next_report += PROGRESS_EVERY
+            print(self.summary())
+
+    def summary(self):
+        elapsed = time.perf_counter() - self.start
+        rate = self.count / elapsed if elapsed else 0.0
+        return f"{self.label}: {self.count} records in {elapsed:.1f}s ({rate:.0f} records/s)"
+
+
+def import_patients(collection, path, fmt, batch_size=IMPORT_BATCH_SIZE, restart=False):
+    checkpoint = Checkpoint(f"{path}.checkpoint", path)
+    if restart:
+        checkpoint.clear()
+    resume_from = checkpoint.load()
+    if resume_from:
+        print(f"Resuming after record {resume_from}")
+
+    ensure_indexes(collection)
+    progress = Throughput("Imported")
+    rejected = 0
+    batch = []
+    batch_end = resume_from
+
+    # A resumed import adds to the rejects of the run it continues; any other run starts the file over
+    with open(f"{path}.rejects.jsonl", "a" if resume_from else "w", encoding="utf-8") as rejects:
+        def reject(position, record, reasons):
+            nonlocal rejected
+            rejected += 1
+            rejects.write(json.dumps({"position": position, "record": record, "errors": reasons}, default=str) + "\n")
+
+        def flush():
+            if not batch:
+                return
+            try:
+                collection.bulk_write([upsert(patient, datetime.now(timezone.utc)) for _, patient in batch], ordered=False)
+            except BulkWriteError as e:
+                # Per-row failures (e.g. a racing insert of the same MRN); everything else in the batch was written
+                for error in e.details.get("writeErrors", []):
+                    position, patient = batch[error["index"]]
+                    reject(position, patient, [error.get("errmsg", "write failed")])
+            progress.add(len(batch))
+            checkpoint.save(batch_end)
+            batch.clear()
+
+        for position, record in read_records(path, fmt):
+            if position <= resume_from:
+                continue
+            batch_end = position
+            if record is None:
+                reject(position, None, ["malformed JSON"])
+                continue
+            if not isinstance(record, dict):
+                reject(position, record, ["expected a JSON object"])
+                continue
+            patient, errors = validate_patient(record)
+            if errors:
+                reject(position, record, errors)
+                continue
+            batch.append((position, patient))
+            if len(batch) >= batch_size:
+                flush()
+        flush()
+
+    checkpoint.clear()
+    print(progress.summary())
+    if rejected:
+        print(f"Rejected {rejected} records, see {path}.rejects.jsonl")
+
+
+def export_patients(collection, path, fmt, batch_size=EXPORT_BATCH_SIZE):
+    progress = Throughput("Exported")
+    projection = {"_id": 0, **{field: 1 for field in PATIENT_FIELDS}}
+    cursor = collection.find({}, projection, batch_size=batch_size).sort("MRN Number", 1)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            writer = csv.DictWriter(f, fieldnames=PATIENT_FIELDS)
+            writer.writeheader()
+        for patient in cursor:
+            if fmt == "csv":
+                patient["Preferred Cuisine"] = ";".join(patient.get("Preferred Cuisine") or [])
+                writer.writerow(patient)
+            else:
+                f.write(json.dumps(patient, default=str) + "\n")
+            progress.add(1)
+    os.replace(tmp_path, path)
+    print(progress.summary())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import/export of patient records")
+    subcommands = parser.add_subparsers(dest="command", required=True)
+    import_parser = subcommands.add_parser("import", help="Upsert patients from a CSV/JSONL file")
+    import_parser.add_argument("path")
+    import_parser.add_argument("--format", choices=("csv", "jsonl"))
+    import_parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    import_parser.add_argument("--restart", action="store_true", help="Ignore any checkpoint and start over")
+    export_parser = subcommands.add_parser("export", help="Write every patient to a CSV/JSONL file")
+    export_parser.add_argument("path")
+    export_parser.add_argument("--format", choices=("csv", "jsonl"))
+    export_parser.add_argument("--batch-size", type=int, default=EXPORT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    load_dotenv()
+    client = MongoClient(os.getenv("MONGO_DB_CLIENT"))
+    collection = client["medical_records_db"]["patients"]
+
+    fmt = file_format(args.path, args.format)
+    if args.command == "import":
+        import_patients(collection, args.path, fmt, batch_size=args.batch_size, restart=args.restart)
+    else:
+        export_patients(collection, args.path, fmt, batch_size=args.batch_size)
+
+
+if __name__ == "__main__":
+    main()
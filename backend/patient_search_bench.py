@@ -0,0 +1,141 @@
+"""
+Benchmark patient lookups and search on synthetic data, with and without the indexes from patient_db.
+
+Runs against a local mongod by default (a scratch database that is dropped afterwards) or against
+mongomock with --mongomock. mongomock doesn't use indexes, so its numbers only check that the queries
+work; use a real mongod for timings.
+
+Usage: python patient_search_bench.py --records 200000 --uri mongodb://localhost:27017
+"""
+import argparse
+import random
+import statistics
+import string
+import time
+
+from patient_db import (
+    PROFILE_PROJECTION, ensure_indexes, search_keys, search_patients, search_query,
+)
+
+FIRST_NAMES = ["john", "priya", "arjun", "mary", "wei", "fatima", "carlos", "aisha", "li", "olga", "kenji", "sara"]
+LAST_NAMES = ["smith", "kumar", "sharma", "garcia", "chen", "khan", "ivanova", "tanaka", "okafor", "rossi"]
+
+
+def synthetic_patients(count, seed=7):
+    rng = random.Random(seed)
+    for i in range(count):
+        name = f"{rng.choice(FIRST_NAMES).title()} {rng.choice(LAST_NAMES).title()}"
+        patient = {
+            "MRN Number": f"MRN{i:07d}",
+            "Name": name,
+            "Age": rng.randint(1, 95),
+            "Gender": rng.choice(["Male", "Female", "Other"]),
+            "Email": f"patient{i}@example.com",
+            "Phone": "".join(rng.choices(string.digits, k=10)),
+            "Weight": round(rng.uniform(3, 140), 1),
+            "Other Medical History": rng.choice(["", "Type 2 diabetes", "Hypertension", "Asthma"]),
+            "Preferred Cuisine": rng.sample(["Indian", "Continental", "Chinese", "Italian"], k=2),
+        }
+        yield {**patient, **search_keys(patient)}
+
+
+def load(collection, count, batch_size=5000):
+    batch = []
+    for patient in synthetic_patients(count):
+        batch.append(patient)
+        if len(batch) >= batch_size:
+            collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        collection.insert_many(batch, ordered=False)
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def workloads(collection, count, indexed):
+    rng = random.Random(11)
+    mrns = [f"MRN{rng.randrange(count):07d}" for _ in range(50)]
+    mrn_iter = iter(mrns * 100)
+
+    def mrn_lookup():
+        collection.find_one({"MRN Number": next(mrn_iter)}, PROFILE_PROJECTION if indexed else None)
+
+    def search(text, page=0):
+        if indexed:
+            return lambda: search_patients(collection, text, page=page)
+        # What an unindexed search looks like: case-insensitive substring regex over whole documents
+        return lambda: list(
+            collection.find({"$or": [{"MRN Number": {"$regex": text, "$options": "i"}},
+                                     {"Name": {"$regex": text, "$options": "i"}}]})
+            .skip(page * 20).limit(21)
+        )
+
+    return {
+        "find_one by MRN": mrn_lookup,
+        "search MRN prefix 'MRN00012'": search("MRN00012"),
+        "search name 'pri'": search("pri"),
+        "search name 'carlos ros' page 5": search("carlos ros", page=5),
+        "search name with no match 'zzz'": search("zzz"),
+    }
+
+
+def explain_stage(collection, text):
+    query, index = search_query(text)
+    plan = collection.find(query).hint(index).explain().get("queryPlanner", {}).get("winningPlan", {})
+    stages = []
+    while plan:
+        stages.append(plan.get("stage"))
+        plan = plan.get("inputStage")
+    return " <- ".join(filter(None, stages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark patient lookups with and without indexes")
+    parser.add_argument("--records", type=int, default=200_000)
+    parser.add_argument("--uri", default="mongodb://localhost:27017")
+    parser.add_argument("--mongomock", action="store_true", help="Use mongomock instead of a mongod")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.mongomock:
+        import mongomock
+        client = mongomock.MongoClient()
+    else:
+        from pymongo import MongoClient
+        client = MongoClient(args.uri)
+
+    db_name = "patient_search_bench"
+    client.drop_database(db_name)
+    collection = client[db_name]["patients"]
+    try:
+        start = time.perf_counter()
+        load(collection, args.records)
+        print(f"Loaded {args.records} synthetic patients in {time.perf_counter() - start:.1f}s")
+
+        print(f"\n{'workload':<36}{'unindexed p50/max ms':>24}{'indexed p50/max ms':>24}")
+        unindexed = {name: timed(func, args.repeat) for name, func in workloads(collection, args.records, False).items()}
+        start = time.perf_counter()
+        ensure_indexes(collection)
+        print(f"(index build {time.perf_counter() - start:.1f}s)")
+        indexed = {name: timed(func, args.repeat) for name, func in workloads(collection, args.records, True).items()}
+        for name in indexed:
+            before, after = unindexed[name], indexed[name]
+            print(f"{name:<36}{before[0]:>14.2f} / {before[1]:<8.2f}{after[0]:>14.2f} / {after[1]:<8.2f}")
+
+        if not args.mongomock:
+            print("\nWinning plans:")
+            for text in ("MRN00012", "carlos ros"):
+                print(f"  {text!r}: {explain_stage(collection, text)}")
+    finally:
+        client.drop_database(db_name)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,11 +3,55 @@ from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import inch
 from io import BytesIO
-
-def summarize_chat_history (chat_history):
+import os
+import tempfile
+import time
+
+TEMPLATE_PDF = os.path.join(os.path.dirname(os.path.abspath(__file__)), "template.pdf")
+# Rendered summaries wait here, one file per request, until /get-pdf sends (and deletes) them
+SUMMARY_PDF_DIR = os.getenv("SUMMARY_PDF_DIR", os.path.join(tempfile.gettempdir(), "nutrino_summaries"))
+# Summaries nobody downloaded are removed after this many seconds
+SUMMARY_PDF_TTL = float(os.getenv("SUMMARY_PDF_TTL", "3600"))
+
+
+def remove_file(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def new_summary_pdf(directory=SUMMARY_PDF_DIR, ttl=SUMMARY_PDF_TTL):
+    """
+    Reserve a unique PDF path for one summary request; expired, never-downloaded summaries are dropped.
+    """
+    os.makedirs(directory, exist_ok=True)
+    cutoff = time.time() - ttl
+    for name in os.listdir(directory):
+        path = os.path.join(directory, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                remove_file(path)
+        except OSError:
+            pass
+    fd, path = tempfile.mkstemp(prefix="chat_summary_", suffix=".pdf", dir=directory)
+    os.close(fd)
+    return path
+
+
+def summary_pdf_path(pdf_filename, directory=SUMMARY_PDF_DIR):
+    """
+    Path of a summary returned by new_summary_pdf(), or None; never resolves outside `directory`.
+    """
+    name = os.path.basename(pdf_filename)
+    path = os.path.join(directory, name)
+    if not name.startswith("chat_summary_") or not os.path.isfile(path):
+        return None
+    return path
+
+def summarize_chat_history (chat_history, summary_path):
     from groq import Groq
     from dotenv import load_dotenv
-    import os
     load_dotenv()
 
     client = Groq(
@@ -29,20 +73,20 @@ def summarize_chat_history (chat_history):
     messages=prompt,
     model="llama3-8b-8192",
     )
-    with open ("summ_chat_hist.txt", 'w') as sch:
+    with open (summary_path, 'w') as sch:
         sch.write(chat_completion.choices[0].message.content.strip())
 
 
 
 
-def write_pdf():
-
-    template_pdf = PdfReader("template.pdf")
+def write_pdf(summary_path, output_path):
+    # Paths are per request: concurrent summaries for different sessions must never share a file
+    template_pdf = PdfReader(TEMPLATE_PDF)
     template_page = template_pdf.pages[0]  # Assuming the template has only one page
 
     writer = PdfWriter()
 
-    with open("summ_chat_hist.txt", 'r', encoding='ISO-8859-1') as f:
+    with open(summary_path, 'r', encoding='ISO-8859-1') as f:
         text = f.read()
 
     def wrap_text(can, text, max_width):
@@ -110,5 +154,5 @@ def write_pdf():
 
         writer.add_page(new_template_page)
 
-    with open("final_output.pdf", 'wb') as f:
+    with open(output_path, 'wb') as f:
         writer.write(f)
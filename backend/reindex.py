@@ -0,0 +1,58 @@
+"""
+Re-embed every document of a Chroma store into a new store with another embedding backend, e.g. to
+move hybrid_db onto the local CPU model:
+
+    python reindex.py --backend local --source ./hybrid_db
+
+Ids, texts and metadata are copied unchanged. The target defaults to the store --backend uses
+(./hybrid_db_local for local, unless VECTOR_DB_DIR is set). Documents already in the target are
+skipped, so an interrupted run can be restarted. With the local backend no network is needed.
+"""
+import argparse
+import os
+import time
+
+from langchain.vectorstores import Chroma
+
+from embedding_backends import EMBEDDING_BACKEND, make_embeddings, vector_db_dir
+from embedding_cache import CachedEmbeddings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-embed a Chroma store with another embedding backend")
+    parser.add_argument("--source", default="./hybrid_db")
+    parser.add_argument("--target", help="Store to fill (default: the one --backend uses)")
+    parser.add_argument("--backend", default=EMBEDDING_BACKEND, choices=["openai", "local"])
+    parser.add_argument("--batch-size", type=int, default=256)
+    args = parser.parse_args()
+    args.target = args.target or vector_db_dir(args.backend)
+
+    if os.path.abspath(args.source) == os.path.abspath(args.target):
+        parser.error("--source and --target must be different stores")
+
+    source = Chroma(persist_directory=args.source)
+    target = Chroma(persist_directory=args.target, embedding_function=CachedEmbeddings(make_embeddings(args.backend)))
+    total = len(source.get(include=[])["ids"])
+    print(f"Re-embedding {total} documents from {args.source} into {args.target} ({args.backend})")
+
+    start = time.perf_counter()
+    copied = skipped = 0
+    for offset in range(0, total, args.batch_size):
+        page = source.get(limit=args.batch_size, offset=offset, include=["documents", "metadatas"])
+        existing = set(target.get(ids=page["ids"], include=[])["ids"])
+        rows = [row for row in zip(page["ids"], page["documents"], page["metadatas"]) if row[0] not in existing]
+        skipped += len(page["ids"]) - len(rows)
+        if rows:
+            ids, texts, metadatas = zip(*rows)
+            target.add_texts(list(texts), metadatas=list(metadatas), ids=list(ids))
+            copied += len(rows)
+        elapsed = time.perf_counter() - start
+        print(f"  {offset + len(page['ids'])}/{total}: {copied} embedded, {skipped} already present, "
+              f"{copied / elapsed if elapsed else 0.0:.1f} docs/s")
+
+    print(f"Done in {time.perf_counter() - start:.1f}s. Start the server with EMBEDDING_BACKEND={args.backend}"
+          + ("" if args.target == vector_db_dir(args.backend) else f" VECTOR_DB_DIR={args.target}"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import math
+import os
+from collections import Counter
+
+from chunking import count_tokens
+from textutils import terms
+
+# Chunks sent to the map phase per request: at most this many, and at most this many tokens in total
+# (0 disables either limit). The best-scoring chunk always goes through.
+RELEVANCE_TOP_K = int(os.getenv("RELEVANCE_TOP_K", "4"))
+RELEVANCE_TOKEN_BUDGET = int(os.getenv("RELEVANCE_TOKEN_BUDGET", "12000"))
+
+
+class BM25:
+    """
+    Okapi BM25 over pre-tokenised documents (lists of stemmed terms from textutils.terms).
+    """
+
+    def __init__(self, documents, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_freqs = [Counter(doc) for doc in documents]
+        self.lengths = [len(doc) for doc in documents]
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        doc_freqs = Counter(term for freqs in self.term_freqs for term in freqs)
+        n = len(documents)
+        # The "+ 1" variant keeps idf positive for terms that occur in most documents
+        self.idf = {term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()}
+
+    def score(self, query_terms, index):
+        freqs = self.term_freqs[index]
+        norm = self.k1 * (1 - self.b + self.b * self.lengths[index] / (self.avg_length or 1))
+        total = 0.0
+        for term in set(query_terms):
+            tf = freqs.get(term)
+            if tf:
+                total += self.idf[term] * tf * (self.k1 + 1) / (tf + norm)
+        return total
+
+    def scores(self, query_terms):
+        return [self.score(query_terms, i) for i in range(len(self.term_freqs))]
+
+
+def select_chunks(chunks, query, top_k=RELEVANCE_TOP_K, token_budget=RELEVANCE_TOKEN_BUDGET):
+    """
+    Keep the chunks most relevant to `query` (BM25), within `top_k` and `token_budget`, in their
+    original order so the map phase still reads the pages front to back.
+    """
+    if len(chunks) <= 1:
+        return chunks
+    scores = BM25([terms(chunk) for chunk in chunks]).scores(terms(query))
+    # Rank by score; ties (including "nothing matched") fall back to page order
+    ranked = sorted(range(len(chunks)), key=lambda i: (-scores[i], i))
+    if scores[ranked[0]] > 0:
+        ranked = [i for i in ranked if scores[i] > 0]
+
+    selected = []
+    used_tokens = 0
+    for i in ranked:
+        if top_k and len(selected) >= top_k:
+            break
+        tokens = count_tokens(chunks[i])
+        if selected and token_budget and used_tokens + tokens > token_budget:
+            continue
+        selected.append(i)
+        used_tokens += tokens
+
+    skipped = len(chunks) - len(selected)
+    print(f"Relevance filter: summarising {len(selected)} of {len(chunks)} chunks "
+          f"({used_tokens} tokens), {skipped} LLM calls skipped")
+    return [chunks[i] for i in sorted(selected)]
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+from textutils import canonical_query, exact_terms, features, l2_normalize, dot
+
+# Minimum cosine similarity between canonical queries for a semantic hit. Kept high: a near miss serves
+# an answer to a different clinical question, while a miss only costs a pipeline run.
+RESPONSE_CACHE_THRESHOLD = float(os.getenv("RESPONSE_CACHE_THRESHOLD", "0.92"))
+RESPONSE_CACHE_TTL = float(os.getenv("RESPONSE_CACHE_TTL", str(6 * 60 * 60)))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "2048"))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv("RESPONSE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+
+
+def record_version(record):
+    """
+    Stable fingerprint of a patient record, so cached answers die with the data they were built from.
+    """
+    if not record:
+        return "none"
+    payload = json.dumps(record, sort_keys=True, default=str).encode("utf-8")
+    return hashlib.sha1(payload).hexdigest()[:16]
+
+
+def embed_query(text):
+    return l2_normalize(features(text))
+
+
+class ResponseCache:
+    """
+    Bounded LRU/TTL cache of final answers.
+
+    Entries live under a scope (e.g. intent + patient MRN + record version) so personalised answers are
+    never served to another patient. Lookups try the canonical query first and then fall back to the most
+    similar cached query in the same scope above `threshold` whose numbers, codes and negations
+    (textutils.exact_terms) are the same: "type 1" never answers "type 2", nor "avoid" "eat".
+    """
+
+    def __init__(self, embed=embed_query, threshold=RESPONSE_CACHE_THRESHOLD, ttl=RESPONSE_CACHE_TTL,
+                 max_entries=RESPONSE_CACHE_MAX_ENTRIES, max_bytes=RESPONSE_CACHE_MAX_BYTES):
+        self.embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # (scope, canonical) -> entry dict
+        self._scopes = {}  # scope -> set of canonical queries
+        self._bytes = 0
+        self._stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    def get(self, query, scope):
+        canonical = canonical_query(query)
+        key = (scope, canonical)
+        entry = self._entries.get(key)
+        if entry is not None and self._expired(key, entry):
+            entry = None
+
+        if entry is None:
+            key, entry = self._nearest(scope, canonical)
+            if entry is not None:
+                self._stats["semantic_hits"] += 1
+
+        if entry is None:
+            self._stats["misses"] += 1
+            return None
+
+        self._stats["hits"] += 1
+        self._entries.move_to_end(key)
+        return entry["response"]
+
+    def put(self, query, scope, response):
+        canonical = canonical_query(query)
+        key = (scope, canonical)
+        if key in self._entries:
+            self._remove(key)
+
+        entry = {
+            "response": response,
+            "vector": self.embed(canonical),
+            "exact": exact_terms(canonical),
+            "expires_at": time.monotonic() + self.ttl,
+            "size": len(response.encode("utf-8")) + len(canonical) * 2 + 256,
+        }
+        self._entries[key] = entry
+        self._scopes.setdefault(scope, set()).add(canonical)
+        self._bytes += entry["size"]
+
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            self._remove(next(iter(self._entries)))
+            self._stats["evictions"] += 1
+
+    def invalidate_scope(self, scope):
+        for canonical in list(self._scopes.get(scope, ())):
+            self._remove((scope, canonical))
+
+    def stats(self):
+        lookups = self._stats["hits"] + self._stats["misses"]
+        return {
+            **self._stats,
+            "hit_ratio": self._stats["hits"] / lookups if lookups else 0.0,
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+        }
+
+    def _nearest(self, scope, canonical):
+        if not canonical:
+            return None, None
+        vector = self.embed(canonical)
+        exact = exact_terms(canonical)
+        best_key, best_entry, best_score = None, None, self.threshold
+        for other in list(self._scopes.get(scope, ())):
+            key = (scope, other)
+            entry = self._entries[key]
+            if entry["exact"] != exact or self._expired(key, entry):
+                continue
+            score = dot(vector, entry["vector"])
+            if score >= best_score:
+                best_key, best_entry, best_score = key, entry, score
+        return best_key, best_entry
+
+    def _expired(self, key, entry):
+        if entry["expires_at"] > time.monotonic():
+            return False
+        self._remove(key)
+        self._stats["expirations"] += 1
+        return True
+
+    def _remove(self, key):
+        entry = self._entries.pop(key)
+        self._bytes -= entry["size"]
+        scope, canonical = key
+        members = self._scopes.get(scope)
+        if members is not None:
+            members.discard(canonical)
+            if not members:
+                del self._scopes[scope]
@@ -0,0 +1,134 @@
+"""
+Benchmark qa_chain retrieval on hybrid_db: dense only (the old retriever), BM25 only and hybrid
+(BM25 + dense fused by reciprocal rank fusion, with the keyword-only short-circuit).
+
+Reports recall@k and latency per retriever. Queries come from a labelled JSONL file
+({"query": ..., "relevant": [document ids]}) or are generated from sampled documents, each with its
+own document as the single relevant answer:
+- keywords: the two rarest terms of the document, like a food or drug name lookup
+- sentence: one sentence of the document, like a paraphrase-free natural question
+
+Dense and hybrid retrieval embed queries with the EMBEDDING_BACKEND model; with the OpenAI backend
+that needs OPENAI_API_KEY and the network.
+The store is only read.
+
+Usage: python retrieval_bench.py --queries 200 --k 10
+       python retrieval_bench.py --labelled queries.jsonl
+"""
+import argparse
+import json
+import random
+import re
+import statistics
+import time
+
+from langchain.vectorstores import Chroma
+
+from embedding_backends import VECTOR_DB_DIR, make_embeddings
+from hybrid_retrieval import BM25Index, HybridRetriever, content_key
+from metrics import retrieval_path
+from textutils import terms, tokenize
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def keyword_query(text, index, rng):
+    words = [word for word in dict.fromkeys(tokenize(text)) if terms(word) and len(word) > 3]
+    if len(words) < 2:
+        return None
+    # Rarest first; ties broken randomly so repeated documents don't give identical queries
+    words.sort(key=lambda word: (index.document_frequency(terms(word)[0]), rng.random()))
+    return " ".join(words[:2])
+
+
+def sentence_query(text, rng):
+    sentences = [s for s in _SENTENCE_RE.split(text) if 6 <= len(s.split()) <= 25]
+    return rng.choice(sentences) if sentences else None
+
+
+def generated_queries(store, index, count, seed=13):
+    rng = random.Random(seed)
+    data = store.get(include=["documents"])
+    pairs = list(zip(data["ids"], data["documents"]))
+    rng.shuffle(pairs)
+    queries = []
+    for doc_id, text in pairs:
+        if len(queries) >= count:
+            break
+        style = "keywords" if len(queries) % 2 == 0 else "sentence"
+        query = keyword_query(text, index, rng) if style == "keywords" else sentence_query(text, rng)
+        if query:
+            queries.append({"query": query, "relevant": [doc_id], "style": style})
+    return queries
+
+
+def labelled_queries(path):
+    with open(path, encoding="utf-8") as f:
+        return [dict(json.loads(line), style="labelled") for line in f if line.strip()]
+
+
+def run(name, retrieve, queries, relevant_keys, k):
+    latencies = []
+    hits = {}
+    for query in queries:
+        start = time.perf_counter()
+        documents = retrieve(query["query"])[:k]
+        latencies.append((time.perf_counter() - start) * 1000)
+        found = {content_key(document.page_content) for document in documents}
+        wanted = relevant_keys[query["query"]]
+        recall = len(found & wanted) / len(wanted) if wanted else 0.0
+        hits.setdefault(query["style"], []).append(recall)
+    latencies.sort()
+    return {
+        "retriever": name,
+        "recall": {style: statistics.mean(values) for style, values in hits.items()},
+        "p50_ms": statistics.median(latencies),
+        "p95_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of dense, BM25 and hybrid retrieval")
+    parser.add_argument("--db", default=VECTOR_DB_DIR)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=100, help="Generated queries (ignored with --labelled)")
+    parser.add_argument("--labelled", help="JSONL with query and relevant document ids")
+    args = parser.parse_args()
+
+    store = Chroma(persist_directory=args.db, embedding_function=make_embeddings())
+    index = BM25Index()
+    start = time.perf_counter()
+    index.sync(store)
+    print(f"Built keyword index over {len(index)} documents in {time.perf_counter() - start:.1f}s")
+
+    queries = labelled_queries(args.labelled) if args.labelled else generated_queries(store, index, args.queries)
+    if not queries:
+        print("No queries to run")
+        return
+    # Match by content, since dense results don't always carry the document id
+    relevant_keys = {}
+    for query in queries:
+        documents = store.get(ids=query["relevant"], include=["documents"])["documents"]
+        relevant_keys[query["query"]] = {content_key(text) for text in documents}
+
+    dense = store.as_retriever(search_kwargs={"k": args.k})
+    hybrid = HybridRetriever(vector_retriever=dense, keyword_index=index, k=args.k)
+    results = [
+        run("dense", dense.invoke, queries, relevant_keys, args.k),
+        run("bm25", lambda q: [document for document, _ in index.search(q, args.k)[0]], queries, relevant_keys, args.k),
+        run("hybrid", hybrid.invoke, queries, relevant_keys, args.k),
+    ]
+
+    styles = sorted({query["style"] for query in queries})
+    header = "".join(f"{f'recall@{args.k} ' + style:>22}" for style in styles)
+    print(f"\n{len(queries)} queries\n{'retriever':<10}{header}{'p50 ms':>10}{'p95 ms':>10}")
+    for result in results:
+        recalls = "".join(f"{result['recall'].get(style, 0.0):>22.3f}" for style in styles)
+        print(f"{result['retriever']:<10}{recalls}{result['p50_ms']:>10.1f}{result['p95_ms']:>10.1f}")
+    paths = {key[0]: value for key, value in retrieval_path._values.items()}
+    print(f"\nHybrid paths: {paths.get('keyword_only', 0)} keyword only (no embedding call), "
+          f"{paths.get('hybrid', 0)} fused")
+
+
+if __name__ == "__main__":
+    main()
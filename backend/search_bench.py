@@ -0,0 +1,496 @@
+"""
+Offline benchmark of the /search pipeline with local stand-ins for every external service.
+
+- A stub LLM server speaks the OpenAI and Groq chat-completion APIs (streaming and not) plus
+  OpenAI embeddings. Latency is time-to-first-token plus completion tokens / token rate.
+- A fake Tavily returns URLs from a generated health-site corpus served over local HTTP, including
+  a dead link so URL validation has something to reject.
+- Pages are crawled by the real crawl4ai pool (default) or, with --http-crawler, by a plain HTTP fetch.
+- Patients live in mongomock, or in a local mongod with --mongo-uri.
+
+main.app is driven in-process over ASGI through every branch (greeting, off-topic, medical, diet
+plan, RAG hit and the RAG "I don't know." fallback), with its lifespan (crawler pool, indexes,
+patient cache watcher, keyword index, ingestor) started and stopped around the run. The response cache is off unless --with-cache,
+so repeated queries measure the pipeline rather than the cache. Results (p50/p95/p99 latency and
+throughput per branch) are printed and saved as JSON; --compare prints the change against an
+earlier results file.
+
+Everything runs in a scratch working directory, so the real hybrid_db and page cache are untouched.
+The first run still needs the network once for the tiktoken encodings and the Flashrank model.
+
+Usage: python search_bench.py --requests 50 --concurrency 8 --compare bench_results/<earlier>.json
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import math
+import os
+import random
+import re
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+import httpx
+import uvicorn
+from asgi_lifespan import LifespanManager
+from fastapi import FastAPI, Request
+from fastapi.responses import HTMLResponse, JSONResponse, StreamingResponse
+from pymongo.errors import OperationFailure
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Branch name -> query that should take it
+SCENARIOS = {
+    "greeting": "hello",
+    "off_topic": "write a python function to reverse a linked list",
+    "medical": "What are the symptoms and treatment of type 2 diabetes?",
+    "diet_plan": "Create a diet plan for a patient with hypertension",
+    "rag_hit": "What are the nutritional contents in chicken?",
+    "rag_fallback": "What are the nutritional contents in durian?",
+}
+# The stub RAG model answers "I don't know." for questions mentioning these
+IDK_TERMS = ("durian",)
+
+SITE_TOPICS = {
+    "diabetes": [
+        "Type 2 diabetes is a chronic condition in which the body does not use insulin properly, so blood sugar stays high.",
+        "Common symptoms include increased thirst, frequent urination, fatigue, blurred vision and slow-healing sores.",
+        "Treatment combines metformin or other medication with regular activity, weight management and blood sugar monitoring.",
+        "A diet rich in fibre, whole grains, legumes and non-starchy vegetables helps keep glucose levels stable.",
+        "Sugary drinks and refined carbohydrates cause rapid glucose spikes and should be limited.",
+    ],
+    "hypertension": [
+        "Hypertension means the force of blood against artery walls is consistently too high, raising the risk of stroke.",
+        "Most people have no symptoms, which is why regular blood pressure checks matter.",
+        "The DASH diet emphasises fruit, vegetables, low-fat dairy and whole grains while cutting sodium.",
+        "Keeping sodium below 2,300 mg a day, and ideally 1,500 mg, lowers blood pressure within weeks.",
+        "Potassium-rich foods such as bananas, beans and leafy greens help balance the effects of sodium.",
+    ],
+    "nutrition": [
+        "Chicken breast provides about 31 g of protein per 100 g with little fat, making it a lean protein source.",
+        "Balanced meals pair a lean protein with vegetables and a portion of whole grains.",
+        "Adults should aim for at least five portions of fruit and vegetables every day.",
+        "Water is the best drink for hydration; sweetened beverages add calories without nutrients.",
+    ],
+}
+BOILERPLATE = (
+    '<nav><a href="/">Home</a> <a href="/a-z">Health A-Z</a> <a href="/login">Log in</a></nav>',
+    "<p>We use cookies to improve your experience. Accept all or manage preferences.</p>",
+    "<footer><p>© 2024 Example Health. All rights reserved. Privacy policy.</p></footer>",
+)
+PAGES_PER_TOPIC = 3
+
+RAG_DOCUMENTS = [
+    "Chicken breast nutritional contents: 165 kcal, 31 g protein, 3.6 g fat and 0 g carbohydrate per 100 g.",
+    "Brown rice nutritional contents: 112 kcal, 2.3 g protein, 0.8 g fat and 24 g carbohydrate per 100 g.",
+    "Spinach nutritional contents: 23 kcal, 2.9 g protein, rich in iron, folate and vitamin K.",
+    "Lentils nutritional contents: 116 kcal, 9 g protein and 8 g fibre per 100 g cooked.",
+]
+
+EMBEDDING_DIM = 1536
+_WORDS = ("balanced diet fibre protein vegetables whole grains hydration sodium potassium glucose insulin "
+          "blood pressure portion meal plan breakfast lunch dinner snack exercise monitoring").split()
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def site_page(topic, n):
+    paragraphs = SITE_TOPICS[topic]
+    # Rotate so pages of a topic overlap partially, like real search results do
+    body = "".join(f"<p>{paragraphs[(n + i) % len(paragraphs)]}</p>" for i in range(len(paragraphs)))
+    return (f"<html><head><title>{topic} {n}</title></head><body>{BOILERPLATE[0]}{BOILERPLATE[1]}"
+            f"<h1>{topic.title()} guide part {n}</h1>{body}{BOILERPLATE[2]}</body></html>")
+
+
+def stub_answer(messages, completion_tokens):
+    prompt = " ".join(str(message.get("content", "")) for message in messages)
+    lowered = prompt.lower()
+    if "check if the query is related to medical" in lowered:
+        return "True"
+    if "don't know" in lowered and any(term in lowered for term in IDK_TERMS):
+        # The RetrievalQA "stuff" prompt tells the model to say it doesn't know
+        return "I don't know."
+    rng = random.Random(hashlib.sha1(prompt.encode("utf-8")).hexdigest())
+    return " ".join(rng.choice(_WORDS) for _ in range(completion_tokens))
+
+
+def stub_embedding(item):
+    """
+    Deterministic hashed bag-of-tokens vector, so lexically similar texts land near each other.
+    """
+    if isinstance(item, str):
+        features = item.lower().split()
+    else:
+        features = [str(token) for token in item]
+    vector = [0.0] * EMBEDDING_DIM
+    for feature in features:
+        vector[int(hashlib.md5(feature.encode()).hexdigest(), 16) % EMBEDDING_DIM] += 1.0
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
+
+
+def build_stub_app(latency, tokens_per_sec, completion_tokens):
+    app = FastAPI()
+
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model = body.get("model", "stub")
+        words = stub_answer(body.get("messages", []), completion_tokens).split(" ")
+        prompt_tokens = sum(len(str(m.get("content", ""))) // 4 for m in body.get("messages", []))
+        created = int(time.time())
+        completion_id = f"chatcmpl-{hashlib.sha1(os.urandom(8)).hexdigest()[:12]}"
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency + len(words) / tokens_per_sec)
+            return JSONResponse({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                             "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(words),
+                          "total_tokens": prompt_tokens + len(words)},
+            })
+
+        async def stream():
+            def chunk(delta, finish_reason=None):
+                payload = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                           "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+                return f"data: {json.dumps(payload)}\n\n"
+
+            await asyncio.sleep(latency)
+            yield chunk({"role": "assistant", "content": ""})
+            for i, word in enumerate(words):
+                yield chunk({"content": word if i == 0 else f" {word}"})
+                await asyncio.sleep(1 / tokens_per_sec)
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    # Groq's SDK posts under /openai/v1, OpenAI's under /v1
+    app.post("/v1/chat/completions")(chat_completions)
+    app.post("/openai/v1/chat/completions")(chat_completions)
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body["input"]
+        if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        return JSONResponse({
+            "object": "list", "model": body.get("model", "stub"),
+            "data": [{"object": "embedding", "index": i, "embedding": stub_embedding(item)} for i, item in enumerate(inputs)],
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        })
+
+    @app.get("/site/{topic}/{n}")
+    async def site(topic: str, n: int):
+        if topic not in SITE_TOPICS or not 0 <= n < PAGES_PER_TOPIC:
+            return HTMLResponse("<html><body>Not found</body></html>", status_code=404)
+        return HTMLResponse(site_page(topic, n))
+
+    return app
+
+
+class StubServer:
+    def __init__(self, app):
+        self.port = free_port()
+        self.base_url = f"http://127.0.0.1:{self.port}"
+        self._server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=self.port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc):
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+
+class FakeTavily:
+    """
+    Stand-in for TavilyClient.search: corpus pages whose topic appears in the query, plus a dead link.
+    """
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+
+    def search(self, query):
+        lowered = query.lower()
+        topics = [topic for topic in SITE_TOPICS if topic in lowered] or ["nutrition"]
+        urls = [f"{self.base_url}/site/missing/0"]
+        urls += [f"{self.base_url}/site/{topic}/{n}" for topic in topics for n in range(PAGES_PER_TOPIC)]
+        return {"query": query, "results": [{"url": url, "title": url, "content": ""} for url in urls]}
+
+
+class _Page:
+    def __init__(self, markdown, headers):
+        self.markdown = markdown
+        self.response_headers = headers
+
+
+def html_to_markdown(html):
+    html = re.sub(r"<(script|style|head)\b.*?</\1>", "", html, flags=re.S | re.I)
+    html = re.sub(r'<a [^>]*href="([^"]*)"[^>]*>(.*?)</a>', r"[\2](\1)", html, flags=re.S | re.I)
+    html = re.sub(r"<h([1-6])[^>]*>(.*?)</h\1>", lambda m: "\n\n" + "#" * int(m.group(1)) + " " + m.group(2) + "\n\n", html, flags=re.S)
+    html = re.sub(r"</?(p|nav|footer|div|br)[^>]*>", "\n\n", html, flags=re.I)
+    text = re.sub(r"<[^>]+>", "", html)
+    return re.sub(r"\n{3,}", "\n\n", text).strip()
+
+
+class HttpCrawlerPool:
+    """
+    Browser-free stand-in for CrawlerPool: fetches the page and converts it to markdown.
+    """
+
+    def __init__(self):
+        self._client = httpx.AsyncClient(timeout=10)
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def arun(self, url):
+        response = await self._client.get(url)
+        response.raise_for_status()
+        return _Page(html_to_markdown(response.text), dict(response.headers))
+
+
+def percentile(samples, q):
+    ordered = sorted(samples)
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(q / 100 * len(ordered)) - 1))]
+
+
+def observed_branch(body):
+    message = body.get("message", "")
+    if body.get("cachedResponse"):
+        return "cached"
+    if message.startswith(("Hello!", "You're welcome")):
+        return "greeting"
+    if message.startswith("Please ask me"):
+        return "off_topic"
+    if message.startswith("Sorry"):
+        return "no_results"
+    if body.get("webscraping"):
+        return "medical"
+    if body.get("ragRetrieval"):
+        # RAG hits carry their source documents; the Groq fallback answer has none
+        return "rag_hit" if "sources" in body else "rag_fallback"
+    if "sources" in body:
+        return "diet_plan"
+    return "unknown"
+
+
+async def run_scenario(client, name, query, mrns, requests, concurrency, warmup):
+    semaphore = asyncio.Semaphore(concurrency)
+    branches = {}
+    errors = 0
+    latencies = []
+
+    async def one(i, record):
+        nonlocal errors
+        params = {"query": query, "session_id": f"bench-{name}-{i}"}
+        if mrns:
+            params["mrn"] = mrns[i % len(mrns)]
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await client.get("/search", params=params)
+                response.raise_for_status()
+                body = response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                errors += record
+                print(f"{name}: request {i} failed: {e}")
+                return
+            elapsed = time.perf_counter() - start
+        if record:
+            latencies.append(elapsed)
+            branch = observed_branch(body)
+            branches[branch] = branches.get(branch, 0) + 1
+
+    await asyncio.gather(*(one(i, False) for i in range(warmup)))
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i, True) for i in range(requests)))
+    wall = time.perf_counter() - start
+
+    return {
+        "query": query,
+        "requests": requests,
+        "errors": errors,
+        "branches": branches,
+        "p50": percentile(latencies, 50),
+        "p95": percentile(latencies, 95),
+        "p99": percentile(latencies, 99),
+        "mean": sum(latencies) / len(latencies) if latencies else None,
+        "throughput_rps": len(latencies) / wall if wall else None,
+    }
+
+
+def prepare_environment(args, stub_url, workdir):
+    os.environ.update({
+        "OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": f"{stub_url}/v1", "OPENAI_API_BASE": f"{stub_url}/v1",
+        "GROQ_API_KEY": "bench", "GROQ_BASE_URL": stub_url,
+        "TAVILY_API_KEY": "bench",
+        "MONGO_DB_CLIENT": args.mongo_uri or "mongodb://127.0.0.1:1",
+        "PAGE_CACHE_DIR": os.path.join(workdir, "page_cache"),
+    })
+    if not args.with_cache:
+        os.environ["RESPONSE_CACHE_TTL"] = "0"
+    if not args.keep_rate_limits:
+        # The stub has no quota; 0 disables the client-side limiter
+        os.environ["GROQ_RPM"] = "0"
+        os.environ["GROQ_TPM"] = "0"
+    # main.py opens Chroma at ./hybrid_db; run from the scratch directory so the real store is untouched
+    os.chdir(workdir)
+    sys.path.insert(0, BACKEND_DIR)
+
+
+def wire_fakes(args, stub_url):
+    import main
+    import webscrap
+    from patient_db import ensure_indexes
+    from patient_search_bench import synthetic_patients
+
+    webscrap.tavily_client = FakeTavily(stub_url)
+    if args.http_crawler:
+        # main imported the pool for its lifespan; both must see the stand-in
+        webscrap.crawler_pool = main.crawler_pool = HttpCrawlerPool()
+
+    if args.mongo_uri:
+        from pymongo import MongoClient
+        client = MongoClient(args.mongo_uri)
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+    client.drop_database("search_bench")
+    collection = client["search_bench"]["patients"]
+    if not args.mongo_uri:
+        # mongomock has no change streams; answer like a standalone mongod so the patient cache polls
+        def watch(*_args, **_kwargs):
+            raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+        collection.watch = watch
+    collection.insert_many(list(synthetic_patients(args.patients)))
+    ensure_indexes(collection)
+    webscrap.collection = main.collection = collection
+    webscrap.patient_cache.collection = collection
+
+    main.vectorstore.add_texts(RAG_DOCUMENTS)
+    return main, webscrap, client
+
+
+async def drive(args, main, webscrap):
+    mrns = [f"MRN{i:07d}" for i in range(min(args.patients, 50))]
+    results = {}
+    # httpx.ASGITransport only sends requests; the lifespan events are sent by LifespanManager
+    async with LifespanManager(main.app, startup_timeout=args.timeout, shutdown_timeout=60):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+            for name in args.scenario or SCENARIOS:
+                print(f"Running {name} ...")
+                personalised = name in ("medical", "diet_plan")
+                results[name] = await run_scenario(
+                    client, name, SCENARIOS[name], mrns if personalised else None,
+                    args.requests, args.concurrency, args.warmup,
+                )
+    return results
+
+
+def print_results(results, baseline=None):
+    header = f"{'branch':<14}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'req/s':>9}{'errors':>8}  branches taken"
+    print("\n" + header)
+    for name, r in results.items():
+        fmt = lambda v: f"{v:>9.3f}" if v is not None else f"{'-':>9}"
+        line = f"{name:<14}{fmt(r['p50'])}{fmt(r['p95'])}{fmt(r['p99'])}{fmt(r['throughput_rps'])}{r['errors']:>8}  {r['branches']}"
+        if baseline and name in baseline.get("scenarios", {}):
+            before = baseline["scenarios"][name]
+            deltas = []
+            for key in ("p50", "p95"):
+                if before.get(key) and r.get(key):
+                    deltas.append(f"{key} {100 * (r[key] - before[key]) / before[key]:+.0f}%")
+            line += f"  vs {baseline.get('commit', '?')}: {', '.join(deltas)}"
+        print(line)
+        if name not in r["branches"]:
+            print(f"  warning: {name} query did not take the {name} branch")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline /search benchmark with local fakes for external services")
+    parser.add_argument("--requests", type=int, default=30, help="Measured requests per branch")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--scenario", action="append", choices=list(SCENARIOS), help="Run only these branches")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Stub time to first token, seconds")
+    parser.add_argument("--llm-tokens-per-sec", type=float, default=400.0)
+    parser.add_argument("--completion-tokens", type=int, default=120)
+    parser.add_argument("--patients", type=int, default=1000)
+    parser.add_argument("--mongo-uri", help="Use a local mongod instead of mongomock")
+    parser.add_argument("--http-crawler", action="store_true", help="Fetch corpus pages over HTTP instead of crawl4ai")
+    parser.add_argument("--with-cache", action="store_true", help="Leave the response cache on")
+    parser.add_argument("--keep-rate-limits", action="store_true", help="Keep the Groq RPM/TPM limiter")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--output", help="Results file (default bench_results/search-<commit>-<time>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    commit = git_commit()
+    output = os.path.abspath(args.output or os.path.join(
+        BACKEND_DIR, "bench_results", f"search-{commit}-{datetime.now():%Y%m%d-%H%M%S}.json"
+    ))
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    workdir = tempfile.mkdtemp(prefix="search_bench_")
+    stub_app = build_stub_app(args.llm_latency, args.llm_tokens_per_sec, args.completion_tokens)
+    try:
+        with StubServer(stub_app) as stub:
+            prepare_environment(args, stub.base_url, workdir)
+            app_module, webscrap, mongo = wire_fakes(args, stub.base_url)
+            try:
+                results = asyncio.run(drive(args, app_module, webscrap))
+            finally:
+                mongo.drop_database("search_bench")
+    finally:
+        os.chdir(BACKEND_DIR)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print_results(results, baseline)
+    report = {
+        "commit": commit,
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+        "scenarios": results,
+    }
+    os.makedirs(os.path.dirname(output), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+import types
+
+import pytest
+
+# The backend modules import each other as top-level modules (they run from backend/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Modules create their API clients and on-disk stores at import: give them dummy keys (nothing here
+# calls the real services) and keep every store out of the working tree
+_SCRATCH = tempfile.mkdtemp(prefix="nutrino_tests_")
+atexit.register(shutil.rmtree, _SCRATCH, True)
+for name, value in {
+    "GROQ_API_KEY": "test",
+    "TAVILY_API_KEY": "test",
+    "OPENAI_API_KEY": "test",
+    "MONGO_DB_CLIENT": "mongodb://127.0.0.1:1",
+    "VECTOR_DB_DIR": os.path.join(_SCRATCH, "hybrid_db"),
+    "EMBEDDING_CACHE_DIR": os.path.join(_SCRATCH, "embedding_cache"),
+    "PAGE_CACHE_DIR": os.path.join(_SCRATCH, "page_cache"),
+    "SUMMARY_PDF_DIR": os.path.join(_SCRATCH, "summaries"),
+}.items():
+    os.environ.setdefault(name, value)
+
+
+@pytest.fixture
+def mongo_collection():
+    """
+    A mongomock collection. mongomock's bulk_write rejects the operation objects of current pymongo
+    releases, so bulk writes are replayed one operation at a time.
+    """
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient()["test"]["patients"]
+
+    def bulk_write(requests, ordered=True):
+        modified = 0
+        for request in requests:
+            modified += collection.update_one(request._filter, request._doc, upsert=bool(request._upsert)).modified_count
+        return types.SimpleNamespace(modified_count=modified)
+
+    collection.bulk_write = bulk_write
+    return collection
+
+
+@pytest.fixture(scope="session")
+def main_module():
+    """
+    main.py, imported without running its lifespan (no browsers, Mongo or background tasks). Skipped
+    where its reranker model can't be loaded: Flashrank downloads it on first use.
+    """
+    for module in ("fastapi", "httpx", "langchain_community", "flashrank", "crawl4ai", "groq", "tavily", "dotenv"):
+        pytest.importorskip(module)
+    try:
+        import main
+    except OSError as e:
+        pytest.skip(f"main.py could not load its models: {e}")
+    return main
@@ -0,0 +1,95 @@
+import pytest
+
+import chunking
+from chunking import chunk_text, count_tokens, legacy_chunk_count
+
+
+class WordEncoding:
+    """One token per whitespace-separated word, so budgets are easy to reason about."""
+
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+    def decode(self, ids):
+        return " ".join(ids)
+
+
+@pytest.fixture
+def words(monkeypatch):
+    monkeypatch.setattr(chunking, "_encoding", WordEncoding())
+
+
+@pytest.fixture
+def no_tiktoken(monkeypatch):
+    monkeypatch.setattr(chunking, "tiktoken", None)
+    monkeypatch.setattr(chunking, "_encoding", None)
+
+
+def paragraph(word, n):
+    return " ".join([word] * n)
+
+
+def test_chunks_respect_the_budget_and_cut_on_paragraphs(words):
+    content = "\n\n".join(paragraph(f"p{i}", 40) for i in range(5))
+    chunks = chunk_text(content, max_tokens=100, overlap_tokens=0)
+
+    assert [count_tokens(chunk) for chunk in chunks] == [80, 80, 40]
+    # No paragraph is split across chunks
+    for chunk in chunks:
+        for part in chunk.split("\n\n"):
+            assert len(set(part.split())) == 1
+
+
+def test_heading_stays_with_the_text_it_introduces(words):
+    content = "\n\n".join([paragraph("a", 60), "# Symptoms", paragraph("b", 30)])
+    chunks = chunk_text(content, max_tokens=80, overlap_tokens=0)
+
+    assert chunks[0] == paragraph("a", 60)
+    assert chunks[1].startswith("# Symptoms\n\n")
+
+
+def test_overlap_repeats_trailing_paragraphs(words):
+    content = "\n\n".join(paragraph(f"p{i}", 20) for i in range(6))
+    chunks = chunk_text(content, max_tokens=60, overlap_tokens=20)
+
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.split("\n\n")[0] == previous.split("\n\n")[-1]
+    assert all(count_tokens(chunk) <= 60 for chunk in chunks)
+
+
+def test_oversized_paragraphs_fall_back_to_sentences_then_token_windows(words):
+    sentences = " ".join(f"{paragraph('s', 9)} end{i}." for i in range(6))
+    chunks = chunk_text(sentences, max_tokens=25, overlap_tokens=0)
+    assert all(count_tokens(chunk) <= 25 for chunk in chunks)
+    assert "".join(chunks).count("end") == 6
+
+    run_on = paragraph("w", 70)
+    chunks = chunk_text(run_on, max_tokens=25, overlap_tokens=0)
+    assert [count_tokens(chunk) for chunk in chunks] == [25, 25, 20]
+
+
+def test_short_content_is_one_chunk(words):
+    assert chunk_text("Spinach is rich in iron.", max_tokens=100) == ["Spinach is rich in iron."]
+    assert chunk_text("", max_tokens=100) == []
+
+
+def test_character_estimate_without_tiktoken(no_tiktoken):
+    assert count_tokens("x" * 400) == 101
+
+    content = "\n\n".join(paragraph("word", 100) for i in range(10))  # ~125 estimated tokens each
+    chunks = chunk_text(content, max_tokens=300, overlap_tokens=0)
+    assert len(chunks) == 5
+    assert all(count_tokens(chunk) <= 300 for chunk in chunks)
+
+    # Hard splits fall back to character windows of 4 characters per token
+    assert [len(piece) for piece in chunking._hard_split("y" * 1000, 100)] == [400, 400, 200]
+
+
+def test_default_budget_follows_the_model(words):
+    assert chunking.token_budget("llama3-8b-8192") == chunking.CHUNK_TOKEN_BUDGETS["llama3-8b-8192"]
+    assert chunking.token_budget("unknown-model") == chunking.DEFAULT_CHUNK_TOKENS
+
+
+def test_legacy_chunk_count():
+    assert legacy_chunk_count("x" * 4001) == 3
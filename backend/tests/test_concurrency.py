@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+from concurrency import TokenBucketLimiter, bounded_gather, run_blocking
+
+
+def test_bounded_gather_keeps_order_and_limit():
+    running = 0
+    peak = 0
+
+    async def work(i):
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.01 * (5 - i))
+        running -= 1
+        return i
+
+    results = asyncio.run(bounded_gather([work(i) for i in range(5)], limit=2))
+    assert results == [0, 1, 2, 3, 4]
+    assert peak == 2
+
+
+def test_run_blocking_returns_the_result():
+    assert asyncio.run(run_blocking(sum, [1, 2, 3])) == 6
+
+
+def test_limiter_waits_for_tokens_to_refill():
+    # 1000 tokens per second; the first call drains the full bucket
+    limiter = TokenBucketLimiter(rpm=0, tpm=60000)
+
+    async def run():
+        await limiter.acquire(60000)
+        start = time.monotonic()
+        await limiter.acquire(200)
+        return time.monotonic() - start
+
+    assert 0.15 <= asyncio.run(run()) < 1.0
+
+
+def test_limiter_caps_requests_per_minute():
+    limiter = TokenBucketLimiter(rpm=600, tpm=0)  # 10 requests per second
+
+    async def run():
+        for _ in range(600):
+            await limiter.acquire()
+        start = time.monotonic()
+        await limiter.acquire()
+        return time.monotonic() - start
+
+    assert 0.05 <= asyncio.run(run()) < 0.5
+
+
+def test_disabled_limiter_never_waits():
+    limiter = TokenBucketLimiter(rpm=0, tpm=0)
+
+    async def run():
+        start = time.monotonic()
+        for _ in range(1000):
+            await limiter.acquire(10_000)
+        return time.monotonic() - start
+
+    assert asyncio.run(run()) < 0.5
@@ -0,0 +1,62 @@
+from content_cleaning import clean_pages, is_boilerplate
+
+
+SYMPTOM_PAGE = """# Diabetes
+
+## Type 2 diabetes
+
+Common symptoms include:
+
+- Fatigue
+- Thirst
+
+Blurred vision
+
+1. Frequent urination
+2. Slow-healing sores"""
+
+
+def test_symptom_lists_and_headings_survive_cleaning():
+    (cleaned,), report = clean_pages([SYMPTOM_PAGE])
+
+    for kept in ("## Type 2 diabetes", "- Fatigue", "- Thirst", "Blurred vision", "1. Frequent urination"):
+        assert kept in cleaned
+    assert report["boilerplate"] == 0
+
+
+def test_plain_heading_and_short_lines_are_content():
+    assert not is_boilerplate("Type 2 diabetes")
+    assert not is_boilerplate("Blurred vision")
+    assert not is_boilerplate("- Fatigue\n- Thirst")
+
+
+def test_mentions_of_boilerplate_words_in_content_are_kept():
+    assert not is_boilerplate("Swap cookies and pastries for fruit or unsalted nuts.")
+    assert not is_boilerplate("Remember to log insulin doses alongside your meals.")
+    assert not is_boilerplate("Subscribers to a meal kit often eat more vegetables.")
+
+
+def test_menus_banners_and_footers_are_dropped():
+    assert is_boilerplate("Log in | Subscribe")
+    assert is_boilerplate("Home\nContact us\nPrivacy policy")
+    assert is_boilerplate("Skip to main content")
+    assert is_boilerplate("We use cookies to improve your experience. Accept all or manage preferences.")
+    assert is_boilerplate("© 2024 Example Health. All rights reserved.")
+    assert is_boilerplate("[Home](/) [Health A-Z](/a-z) [Log in](/login)")
+    assert is_boilerplate("![logo](/logo.png)")
+
+
+def test_exact_and_near_duplicates_across_pages_are_dropped():
+    paragraph = ("People with diabetes should check their blood glucose regularly and keep a record "
+                 "of the readings to share with their care team at every visit.")
+    near = paragraph.replace("visit.", "appointment.")
+    pages = [f"{paragraph}\n\nEat plenty of fibre.", f"## Monitoring\n\n{paragraph}", f"## Monitoring\n\n{near}"]
+
+    cleaned, report = clean_pages(pages)
+
+    assert cleaned[0] == f"{paragraph}\n\nEat plenty of fibre."
+    # Repeated headings are kept; only the paragraphs go
+    assert cleaned[1] == cleaned[2] == "## Monitoring"
+    assert report["duplicates"] == 1
+    assert report["near_duplicates"] == 1
+    assert report["tokens_after"] < report["tokens_before"]
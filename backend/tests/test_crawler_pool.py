@@ -0,0 +1,115 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("crawl4ai")
+
+import crawler_pool
+from crawler_pool import CrawlerPool
+
+
+class FakeCrawler:
+    instances = []
+
+    def __init__(self, verbose=False):
+        self.open = False
+        self.crawled = []
+        FakeCrawler.instances.append(self)
+
+    async def __aenter__(self):
+        self.open = True
+        return self
+
+    async def __aexit__(self, *exc_info):
+        assert self.open, "crawler closed twice"
+        self.open = False
+
+    async def arun(self, url):
+        await asyncio.sleep(0)
+        if url == "fail":
+            raise RuntimeError("browser crashed")
+        self.crawled.append(url)
+        return url
+
+
+@pytest.fixture(autouse=True)
+def fake_crawler(monkeypatch):
+    FakeCrawler.instances = []
+    monkeypatch.setattr(crawler_pool, "AsyncWebCrawler", FakeCrawler)
+
+
+def open_crawlers():
+    return [crawler for crawler in FakeCrawler.instances if crawler.open]
+
+
+def test_crawlers_are_reused_and_recycled_after_max_uses():
+    async def scenario():
+        pool = CrawlerPool(size=1, max_uses=2)
+        for url in ("a", "b", "c"):
+            await pool.arun(url)
+        await pool.close()
+
+    asyncio.run(scenario())
+
+    assert [crawler.crawled for crawler in FakeCrawler.instances] == [["a", "b"], ["c"]]
+    assert open_crawlers() == []
+
+
+def test_failed_crawl_replaces_the_crawler():
+    async def scenario():
+        pool = CrawlerPool(size=1)
+        with pytest.raises(RuntimeError):
+            await pool.arun("fail")
+        await pool.arun("a")
+        await pool.close()
+
+    asyncio.run(scenario())
+
+    assert len(FakeCrawler.instances) == 2
+    assert FakeCrawler.instances[1].crawled == ["a"]
+    assert open_crawlers() == []
+
+
+def test_close_retires_checked_out_crawlers_on_release():
+    async def scenario():
+        pool = CrawlerPool(size=2)
+        async with pool.acquire() as slot:
+            await pool.close()
+            # Still usable by the request that holds it
+            assert slot.crawler.open
+        assert open_crawlers() == []
+        with pytest.raises(RuntimeError):
+            await pool.arun("a")
+        return pool
+
+    pool = asyncio.run(scenario())
+
+    assert len(FakeCrawler.instances) == 2
+    assert pool._slots == set()
+
+
+def test_close_wakes_waiting_requests():
+    async def scenario():
+        pool = CrawlerPool(size=1)
+        async with pool.acquire():
+            waiters = [asyncio.ensure_future(pool.arun(url)) for url in ("a", "b")]
+            await asyncio.sleep(0)
+            await pool.close()
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    results = asyncio.run(scenario())
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert open_crawlers() == []
+
+
+def test_pool_never_grows_past_its_size():
+    async def scenario():
+        pool = CrawlerPool(size=2)
+        await asyncio.gather(*(pool.arun(str(i)) for i in range(10)))
+        live = len(pool._slots)
+        await pool.close()
+        return live
+
+    assert asyncio.run(scenario()) == 2
+    assert len(FakeCrawler.instances) == 2
@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+for module in ("onnx", "onnxruntime", "tokenizers"):
+    pytest.importorskip(module)
+
+import onnx
+from onnx import TensorProto, helper, numpy_helper
+from tokenizers import Tokenizer, models, pre_tokenizers
+
+from embedding_backends import OnnxEmbeddings, make_embeddings, vector_db_dir
+
+VOCAB = {"[PAD]": 0, "[UNK]": 1, "kale": 2, "oats": 3, "rice": 4, "eggs": 5}
+DIM = 3
+# A row per token; padding gets a huge row so any leak into the mean shows up
+TABLE = np.array([[1000, 1000, 1000], [0, 0, 1], [1, 0, 0], [0, 1, 0], [3, 4, 0], [1, 1, 1]], dtype=np.float32)
+
+
+def write_model(directory, token_type_ids=True):
+    """
+    A token embedding lookup: input_ids -> [batch, tokens, DIM], like a transformer's last hidden state.
+    """
+    inputs = [
+        helper.make_tensor_value_info("input_ids", TensorProto.INT64, ["batch", "tokens"]),
+        helper.make_tensor_value_info("attention_mask", TensorProto.INT64, ["batch", "tokens"]),
+    ]
+    if token_type_ids:
+        inputs.append(helper.make_tensor_value_info("token_type_ids", TensorProto.INT64, ["batch", "tokens"]))
+    graph = helper.make_graph(
+        [helper.make_node("Gather", ["table", "input_ids"], ["last_hidden_state"])],
+        "lookup",
+        inputs,
+        [helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "tokens", DIM])],
+        [numpy_helper.from_array(TABLE, "table")],
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, str(directory / "model.onnx"))
+
+    tokenizer = Tokenizer(models.WordLevel(VOCAB, unk_token="[UNK]"))
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.save(str(directory / "tokenizer.json"))
+
+
+def expected(text):
+    vector = TABLE[[VOCAB.get(word, 1) for word in text.split()]].mean(axis=0)
+    return vector / np.linalg.norm(vector)
+
+
+@pytest.fixture
+def model_dir(tmp_path):
+    write_model(tmp_path)
+    return tmp_path
+
+
+def test_vectors_are_mean_pooled_over_real_tokens_and_unit_length(model_dir):
+    embeddings = OnnxEmbeddings(str(model_dir), batch_size=8, workers=1)
+
+    # Padded to the longest text in the batch; the padding must not count
+    vectors = embeddings.embed_documents(["rice", "kale oats rice eggs"])
+
+    assert np.allclose(vectors, [expected("rice"), expected("kale oats rice eggs")])
+    assert np.allclose(np.linalg.norm(vectors, axis=1), 1.0)
+    assert np.allclose(embeddings.embed_query("kale oats"), expected("kale oats"))
+
+
+def test_input_order_survives_length_sorted_parallel_batches(model_dir):
+    embeddings = OnnxEmbeddings(str(model_dir), batch_size=2, workers=3)
+    texts = ["kale oats rice eggs", "rice", "oats eggs", "kale", "eggs rice kale", "oats", "tofu"]
+
+    assert np.allclose(embeddings.embed_documents(texts), [expected(text) for text in texts])
+    assert embeddings.embed_documents([]) == []
+
+
+def test_models_without_token_type_ids(tmp_path):
+    write_model(tmp_path, token_type_ids=False)
+
+    assert np.allclose(OnnxEmbeddings(str(tmp_path), workers=1).embed_query("oats"), expected("oats"))
+
+
+def test_long_texts_are_truncated(model_dir):
+    embeddings = OnnxEmbeddings(str(model_dir), max_tokens=2, workers=1)
+
+    assert np.allclose(embeddings.embed_query("kale oats rice eggs"), expected("kale oats"))
+
+
+def test_model_name_identifies_the_model_file(model_dir):
+    assert OnnxEmbeddings(str(model_dir), workers=1).model == f"onnx:{model_dir.name}/model.onnx"
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError, match="Unknown embedding backend"):
+        make_embeddings("gpu")
+
+
+def test_each_backend_has_its_own_store_unless_overridden(monkeypatch):
+    monkeypatch.delenv("VECTOR_DB_DIR", raising=False)
+    assert (vector_db_dir("openai"), vector_db_dir("local")) == ("./hybrid_db", "./hybrid_db_local")
+
+    monkeypatch.setenv("VECTOR_DB_DIR", "/data/store")
+    assert vector_db_dir("local") == "/data/store"
@@ -0,0 +1,127 @@
+import hashlib
+import multiprocessing
+import os
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.embeddings import Embeddings
+
+import embedding_cache
+from embedding_cache import CachedEmbeddings
+
+
+def vector_of(text, dim=8):
+    return [float(b) for b in hashlib.sha256(text.encode("utf-8")).digest()[:dim]]
+
+
+class CountingEmbeddings(Embeddings):
+    def __init__(self, model="fake", dim=8):
+        self.model = model
+        self.dim = dim
+        self.embedded = []
+
+    def embed_documents(self, texts):
+        self.embedded.extend(texts)
+        return [vector_of(text, self.dim) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+def cache_in(directory, max_entries=100, memory_entries=0, **kwargs):
+    return CachedEmbeddings(CountingEmbeddings(**kwargs), str(directory), max_entries=max_entries,
+                            memory_entries=memory_entries)
+
+
+def vector_file(cache):
+    return os.path.join(cache.directory, "vectors.f32")
+
+
+def test_only_misses_reach_the_model_and_vectors_survive_a_restart(tmp_path):
+    cache = cache_in(tmp_path)
+    assert cache.embed_documents(["a", "b", "a"]) == [vector_of("a"), vector_of("b"), vector_of("a")]
+    assert cache.embed_query("b") == vector_of("b")
+    assert cache.underlying.embedded == ["a", "b"]
+
+    restarted = cache_in(tmp_path)
+    assert restarted.embed_documents(["b", "c"]) == [vector_of("b"), vector_of("c")]
+    assert restarted.underlying.embedded == ["c"]
+
+
+def test_least_recently_used_rows_are_overwritten_when_full(tmp_path):
+    cache = cache_in(tmp_path, max_entries=3)
+    cache.embed_documents(["a", "b", "c"])
+    cache.embed_query("a")
+
+    cache.embed_documents(["d"])
+
+    fresh = cache_in(tmp_path, max_entries=3)
+    assert fresh.embed_documents(["a", "c", "d", "b"]) == [vector_of(t) for t in "acdb"]
+    assert fresh.underlying.embedded == ["b"]
+
+
+def test_vector_file_grows_on_demand(tmp_path, monkeypatch):
+    monkeypatch.setattr(embedding_cache, "_GROW_ROWS", 2)
+    cache = cache_in(tmp_path, max_entries=5)
+
+    cache.embed_documents(["a"])
+    assert os.path.getsize(vector_file(cache)) == 2 * 8 * 4
+    cache.embed_documents(["b", "c"])
+    assert os.path.getsize(vector_file(cache)) == 4 * 8 * 4
+    cache.embed_documents(["d", "e", "f"])
+    assert os.path.getsize(vector_file(cache)) == 5 * 8 * 4
+
+
+def test_instances_sharing_a_directory_never_share_a_slot(tmp_path):
+    first, second = cache_in(tmp_path), cache_in(tmp_path)
+
+    first.embed_documents(["a", "b"])
+    second.embed_documents(["c", "d"])
+    first.embed_documents(["e"])
+
+    assert first.embed_documents(["c", "d"]) == [vector_of("c"), vector_of("d")]
+    fresh = cache_in(tmp_path)
+    assert fresh.embed_documents(list("abcde")) == [vector_of(t) for t in "abcde"]
+    assert fresh.underlying.embedded == []
+
+
+def fill(directory, worker):
+    cache = cache_in(directory, max_entries=1000)
+    for start in range(0, 200, 10):
+        cache.embed_documents([f"{worker}-{i}" for i in range(start, start + 10)])
+
+
+def test_concurrent_writer_processes_keep_every_vector_intact(tmp_path):
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=fill, args=(str(tmp_path), worker)) for worker in range(3)]
+    for process in workers:
+        process.start()
+    for process in workers:
+        process.join(60)
+    assert [process.exitcode for process in workers] == [0, 0, 0]
+
+    texts = [f"{worker}-{i}" for worker in range(3) for i in range(200)]
+    fresh = cache_in(tmp_path, max_entries=1000)
+    assert fresh.embed_documents(texts) == [vector_of(text) for text in texts]
+    assert fresh.underlying.embedded == []
+
+
+def test_another_model_gets_its_own_vectors(tmp_path):
+    cache_in(tmp_path).embed_documents(["a"])
+
+    other = cache_in(tmp_path, model="other", dim=4)
+
+    assert other.embed_documents(["a"]) == [vector_of("a", 4)]
+    assert other.underlying.embedded == ["a"]
+
+
+def test_a_new_capacity_starts_the_cache_over(tmp_path):
+    cache_in(tmp_path).embed_documents(["a", "b"])
+
+    smaller = cache_in(tmp_path, max_entries=10)
+
+    assert smaller.embed_documents(["a"]) == [vector_of("a")]
+    assert smaller.underlying.embedded == ["a"]
+    assert cache_in(tmp_path, max_entries=10).embed_documents(["a", "b"]) == [vector_of("a"), vector_of("b")]
@@ -0,0 +1,52 @@
+from history_store import HistoryStore
+
+
+def test_sessions_are_isolated():
+    store = HistoryStore()
+    store.append("a", "user", "hi")
+    store.append("b", "user", "hello")
+    assert [turn["content"] for turn in store.turns("a")] == ["hi"]
+    assert store.turns("missing") == []
+
+
+def test_pages_follow_the_cursor_until_caught_up():
+    store = HistoryStore()
+    for i in range(5):
+        store.append("s", "user", f"q{i}")
+
+    first = store.page("s", cursor=0, limit=2)
+    assert [turn["seq"] for turn in first["history"]] == [1, 2]
+    assert first["next_cursor"] == 2
+
+    second = store.page("s", cursor=first["next_cursor"], limit=2)
+    assert [turn["seq"] for turn in second["history"]] == [3, 4]
+
+    last = store.page("s", cursor=second["next_cursor"], limit=2)
+    assert [turn["seq"] for turn in last["history"]] == [5]
+    assert last["next_cursor"] is None
+    assert store.page("s", cursor=5)["history"] == []
+
+
+def test_retention_keeps_sequence_numbers():
+    store = HistoryStore(max_turns=3)
+    for i in range(5):
+        store.append("s", "user", f"q{i}")
+    assert [turn["seq"] for turn in store.turns("s")] == [3, 4, 5]
+
+
+def test_least_recently_used_sessions_are_dropped():
+    store = HistoryStore(max_sessions=2)
+    store.append("a", "user", "1")
+    store.append("b", "user", "2")
+    store.append("a", "user", "3")
+    store.append("c", "user", "4")
+    assert store.turns("b") == []
+    assert len(store.turns("a")) == 2
+
+
+def test_patient_binding_and_clear():
+    store = HistoryStore()
+    store.bind_patient("s", "MRN0000001")
+    assert store.patient_mrn("s") == "MRN0000001"
+    store.clear("s")
+    assert store.patient_mrn("s") is None
@@ -0,0 +1,115 @@
+import asyncio
+import threading
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+import hybrid_retrieval
+from hybrid_retrieval import BM25Index, HybridRetriever, reciprocal_rank_fusion
+
+DOCS = {
+    "chicken": "Chicken breast nutritional contents: 165 kcal and 31 g protein per 100 g.",
+    "rice": "Brown rice nutritional contents: 112 kcal and 24 g carbohydrate per 100 g.",
+    "spinach": "Spinach is rich in iron, folate and vitamin K.",
+    "lentils": "Lentils provide 9 g protein and 8 g fibre per 100 g cooked.",
+}
+
+
+class FakeDense(BaseRetriever):
+    documents: list
+    calls: int = 0
+
+    def _get_relevant_documents(self, query, *, run_manager):
+        self.calls += 1
+        return self.documents
+
+
+def index_of(docs=DOCS):
+    index = BM25Index()
+    index.add(list(docs), list(docs.values()), [{"name": name} for name in docs])
+    return index
+
+
+def test_bm25_index_ranks_and_counts_documents_with_every_term():
+    index = index_of()
+
+    results, all_terms = index.search("protein per 100 g", k=2)
+
+    assert [document.id for document, _ in results] == ["lentils", "chicken"]
+    assert all_terms == 2
+    assert index.document_frequency("protein") == 2
+    assert index.search("durian") == ([], 0)
+
+
+def test_bm25_index_replaces_and_removes_documents():
+    index = index_of()
+    index.add(["spinach"], ["Spinach is low in calories."])
+    index.remove(["rice"])
+
+    assert len(index) == 3
+    assert index.document_frequency("iron") == 0
+    assert index.search("rice")[0] == []
+
+
+def test_sync_matches_the_vector_store():
+    class Store:
+        def __init__(self, docs):
+            self.docs = docs
+
+        def get(self, ids=None, include=()):
+            ids = list(self.docs) if ids is None else ids
+            return {"ids": ids, "documents": [self.docs[i] for i in ids], "metadatas": [{} for _ in ids]}
+
+    index = index_of({"chicken": DOCS["chicken"], "gone": "Deleted elsewhere."})
+
+    assert index.sync(Store({"chicken": DOCS["chicken"], "rice": DOCS["rice"]})) == (1, 1)
+    assert len(index) == 2
+    assert index.search("brown rice")[0][0][0].id == "rice"
+
+
+def test_rrf_merges_by_content_and_rewards_agreement():
+    a, b, c = (Document(page_content=text) for text in ("a", "b", "c"))
+
+    fused = reciprocal_rank_fusion([[a, b], [Document(page_content="b"), c]], k=3)
+
+    assert [document.page_content for document in fused] == ["b", "a", "c"]
+
+
+def test_exact_term_queries_skip_the_dense_retriever(monkeypatch):
+    monkeypatch.setattr(hybrid_retrieval, "EXACT_MIN_HITS", 2)
+    dense = FakeDense(documents=[Document(page_content=DOCS["spinach"])])
+    retriever = HybridRetriever(vector_retriever=dense, keyword_index=index_of(), k=3)
+
+    keyword_only = retriever.invoke("protein")
+    assert dense.calls == 0
+    assert {document.id for document in keyword_only} == {"chicken", "lentils"}
+
+    hybrid = retriever.invoke("which vegetable has iron")
+    assert dense.calls == 1
+    assert hybrid[0].page_content == DOCS["spinach"]
+
+
+def test_async_path_searches_the_keyword_index_off_the_event_loop():
+    dense = FakeDense(documents=[Document(page_content=DOCS["rice"])])
+    index = index_of()
+    search_threads = []
+    original = index.search
+
+    def search(query, k=10):
+        search_threads.append(threading.current_thread())
+        return original(query, k)
+
+    index.search = search
+    retriever = HybridRetriever(vector_retriever=dense, keyword_index=index, k=3)
+
+    async def scenario():
+        return await retriever.ainvoke("brown rice carbohydrate"), threading.current_thread()
+
+    results, loop_thread = asyncio.run(scenario())
+
+    assert results[0].page_content == DOCS["rice"]
+    assert search_threads and search_threads[0] is not loop_thread
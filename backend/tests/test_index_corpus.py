@@ -0,0 +1,162 @@
+import threading
+import time
+
+import pytest
+
+for module in ("langchain", "PyPDF2", "reportlab"):
+    pytest.importorskip(module)
+
+from reportlab.pdfgen import canvas
+
+from index_corpus import IndexCheckpoint, chunk_id, file_hash, index_corpus, prepare, read_text
+
+PARAGRAPHS = [
+    "Oats are a good source of soluble fibre, which helps lower cholesterol.",
+    "Lentils provide protein and iron and suit vegetarian diets well.",
+    "Leafy greens such as spinach and kale are rich in folate.",
+]
+
+
+class FakeCollection:
+    def __init__(self):
+        self.docs = {}  # id -> (text, metadata)
+
+    def delete(self, where):
+        for doc_id in [doc_id for doc_id, (_, metadata) in self.docs.items() if metadata["source"] == where["source"]]:
+            del self.docs[doc_id]
+
+    def upsert(self, ids, embeddings, documents, metadatas):
+        for doc_id, text, metadata in zip(ids, documents, metadatas):
+            self.docs[doc_id] = (text, metadata)
+
+
+class FakeStore:
+    def __init__(self):
+        self._collection = FakeCollection()
+
+
+class FakeEmbeddings:
+    """
+    Records what it embeds; raises on call number `fail_on` to interrupt a run.
+    """
+
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.calls = 0
+        self.embedded = []
+        self._lock = threading.Lock()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+            failing = self.calls == self.fail_on
+            if not failing:
+                self.embedded.extend(texts)
+        if failing:
+            # Slow enough that earlier batches are stored (and checkpointed) before this one fails
+            time.sleep(0.2)
+            raise RuntimeError("embedding service down")
+        return [[1.0, 0.0] for _ in texts]
+
+
+def write_pdf(path, lines):
+    pdf = canvas.Canvas(str(path))
+    for i, line in enumerate(lines):
+        pdf.drawString(72, 720 - 20 * i, line)
+    pdf.save()
+
+
+def run(corpus, store, embeddings, checkpoint, batch_size=1):
+    return index_corpus(str(corpus), store, embeddings, checkpoint, workers=2, batch_size=batch_size,
+                        embed_workers=1, chunk_tokens=30)
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    root = tmp_path / "corpus"
+    (root / "notes").mkdir(parents=True)
+    for i, paragraph in enumerate(PARAGRAPHS):
+        (root / "notes" / f"{i}.md").write_text(paragraph, encoding="utf-8")
+    (root / "ignored.csv").write_text("a,b", encoding="utf-8")
+    return root
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    return IndexCheckpoint(str(tmp_path / "checkpoint.sqlite"))
+
+
+def test_prepare_splits_new_files_and_skips_unchanged_ones(tmp_path):
+    path = tmp_path / "guide.md"
+    path.write_text("\n\n".join(PARAGRAPHS * 3), encoding="utf-8")
+
+    relpath, digest, chunks, tokens = prepare(str(path), "guide.md", None, 30)
+
+    assert (relpath, digest) == ("guide.md", file_hash(str(path)))
+    assert len(chunks) > 1 and all(chunk.strip() for chunk in chunks)
+    assert PARAGRAPHS[1] in "\n\n".join(chunks)
+    assert tokens > 0
+    assert prepare(str(path), "guide.md", digest, 30) == ("guide.md", digest, None, 0)
+
+
+def test_pdf_text_is_extracted(tmp_path):
+    write_pdf(tmp_path / "leaflet.pdf", ["Eat more vegetables.", "Drink water."])
+
+    text = read_text(str(tmp_path / "leaflet.pdf"))
+
+    assert "Eat more vegetables." in text and "Drink water." in text
+
+
+def test_every_format_is_indexed_once_and_unchanged_files_are_skipped(corpus, checkpoint):
+    write_pdf(corpus / "leaflet.pdf", ["Eat more vegetables."])
+    store, embeddings = FakeStore(), FakeEmbeddings()
+
+    progress = run(corpus, store, embeddings, checkpoint)
+
+    assert (progress.files, progress.failed) == (4, 0)
+    assert set(checkpoint.known()) == {"leaflet.pdf", "notes/0.md", "notes/1.md", "notes/2.md"}
+    assert store._collection.docs[chunk_id("notes/1.md", 0)][0] == PARAGRAPHS[1]
+
+    again = run(corpus, store, FakeEmbeddings(), checkpoint)
+    assert (again.files, again.unchanged) == (0, 4)
+
+
+def test_an_interrupted_run_resumes_without_re_embedding_finished_files(corpus, checkpoint):
+    store = FakeStore()
+    with pytest.raises(RuntimeError, match="embedding service down"):
+        run(corpus, store, FakeEmbeddings(fail_on=2), checkpoint)
+    finished = checkpoint.known()
+    assert finished and len(finished) < len(PARAGRAPHS)
+
+    resumed = FakeEmbeddings()
+    progress = run(corpus, store, resumed, checkpoint)
+
+    finished_texts = {PARAGRAPHS[int(relpath[len("notes/")])] for relpath in finished}
+    assert not finished_texts & set(resumed.embedded)
+    assert progress.unchanged == len(finished)
+    assert sorted(text for text, _ in store._collection.docs.values()) == sorted(PARAGRAPHS)
+
+
+def test_unreadable_files_are_counted_as_failed_and_retried_next_run(corpus, checkpoint):
+    (corpus / "broken.pdf").write_bytes(b"not a pdf")
+    store = FakeStore()
+
+    progress = run(corpus, store, FakeEmbeddings(), checkpoint)
+
+    assert (progress.files, progress.failed) == (3, 1)
+    assert "broken.pdf" not in checkpoint.known()
+
+    write_pdf(corpus / "broken.pdf", ["Fixed."])
+    progress = run(corpus, store, FakeEmbeddings(), checkpoint)
+    assert (progress.files, progress.unchanged, progress.failed) == (1, 3, 0)
+
+
+def test_removed_files_lose_their_chunks(corpus, checkpoint):
+    store = FakeStore()
+    run(corpus, store, FakeEmbeddings(), checkpoint)
+
+    (corpus / "notes" / "2.md").unlink()
+    run(corpus, store, FakeEmbeddings(), checkpoint)
+
+    assert "notes/2.md" not in checkpoint.known()
+    assert sorted(text for text, _ in store._collection.docs.values()) == sorted(PARAGRAPHS[:2])
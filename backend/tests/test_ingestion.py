@@ -0,0 +1,140 @@
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+import ingestion
+from ingestion import ScrapeIngestor, content_hash
+
+SHARED = "Adults with diabetes should aim for regular meals with steady carbohydrate portions."
+ONLY_A = "Whole grains, legumes and vegetables release glucose slowly and help with control."
+ONLY_B = "Sugary drinks cause rapid glucose spikes and are best replaced with water or tea."
+NEW_B = "Walking after meals lowers blood glucose and is easy to fit into most routines."
+
+
+class FakeStore:
+    """
+    The parts of the LangChain Chroma API the ingestor uses, over a dict.
+    """
+
+    def __init__(self):
+        self.docs = {}  # id -> (text, metadata)
+        self.embedded = []
+
+    def get(self, ids=None, where=None, include=()):
+        found = [doc_id for doc_id in (self.docs if ids is None else ids) if doc_id in self.docs]
+        if where:
+            found = [doc_id for doc_id in found if all(self.docs[doc_id][1].get(k) == v for k, v in where.items())]
+        return {"ids": found}
+
+    def delete(self, ids):
+        for doc_id in ids:
+            self.docs.pop(doc_id, None)
+
+    def add_texts(self, texts, metadatas, ids):
+        self.embedded.extend(texts)
+        for doc_id, text, metadata in zip(ids, texts, metadatas):
+            self.docs[doc_id] = (text, dict(metadata))
+
+    def update_documents(self, ids, documents):
+        for doc_id, document in zip(ids, documents):
+            self.docs[doc_id] = (document.page_content, dict(document.metadata))
+
+    def similarity_search_with_relevance_scores(self, query, k, filter):
+        origin, fetched = filter["$and"]
+        cutoff = fetched["fetched_at"]["$gte"]
+        return [
+            (type("Doc", (), {"page_content": text, "metadata": metadata}), 1.0)
+            for text, metadata in self.docs.values()
+            if metadata["origin"] == origin["origin"] and metadata["fetched_at"] >= cutoff
+        ][:k]
+
+
+def page(*paragraphs):
+    return "\n\n".join(paragraphs)
+
+
+@pytest.fixture
+def store():
+    return FakeStore()
+
+
+@pytest.fixture
+def ingestor(store, tmp_path, monkeypatch):
+    # Small chunks so each paragraph is its own chunk
+    monkeypatch.setattr(ingestion, "INGEST_CHUNK_TOKENS", 30)
+    return ScrapeIngestor(store, refs_path=str(tmp_path / "refs.sqlite"))
+
+
+def test_chunks_are_stored_once_with_their_source(ingestor, store):
+    ingestor._ingest([("https://a.example/diabetes?utm_source=x", page(SHARED, ONLY_A), "q")])
+
+    assert set(store.docs) == {content_hash(SHARED), content_hash(ONLY_A)}
+    assert {metadata["source"] for _, metadata in store.docs.values()} == {"https://a.example/diabetes"}
+
+    ingestor._ingest([("https://a.example/diabetes", page(SHARED, ONLY_A), "q")])
+    assert len(store.embedded) == 2
+
+
+def test_reingesting_refreshes_fetched_at_so_recall_keeps_the_page(ingestor, store, monkeypatch):
+    monkeypatch.setattr(ingestion, "INGEST_MIN_HITS", 2)
+    ingestor._ingest([("https://a.example/diabetes", page(SHARED, ONLY_A), "q")])
+    for doc_id, (text, metadata) in store.docs.items():
+        store.docs[doc_id] = (text, {**metadata, "fetched_at": time.time() - ingestion.INGEST_MAX_AGE - 60})
+    assert ingestor._recall("diabetes meals") is None
+
+    ingestor._ingest([("https://a.example/diabetes", page(SHARED, ONLY_A), "diabetes meals")])
+
+    content, sources = ingestor._recall("diabetes meals")
+    assert sources == ["https://a.example/diabetes"]
+    assert SHARED in content
+    assert len(store.embedded) == 2
+
+
+def test_stale_chunks_are_removed_unless_another_page_still_has_them(ingestor, store):
+    ingestor._ingest([
+        ("https://a.example/diabetes", page(SHARED, ONLY_A), "q"),
+        ("https://b.example/diabetes", page(SHARED, ONLY_B), "q"),
+    ])
+
+    # B is re-crawled without the shared paragraph or its own one
+    ingestor._ingest([("https://b.example/diabetes", page(NEW_B), "q")])
+
+    assert set(store.docs) == {content_hash(SHARED), content_hash(ONLY_A), content_hash(NEW_B)}
+
+    # Once A drops it too, nothing references the shared chunk
+    ingestor._ingest([("https://a.example/diabetes", page(ONLY_A), "q")])
+    assert set(store.docs) == {content_hash(ONLY_A), content_hash(NEW_B)}
+
+
+def test_shared_chunk_survives_when_its_first_page_changes_in_a_later_run(ingestor, store):
+    ingestor._ingest([("https://a.example/diabetes", page(SHARED, ONLY_A), "q")])
+    ingestor._ingest([("https://b.example/diabetes", page(SHARED, ONLY_B), "q")])
+
+    ingestor._ingest([("https://a.example/diabetes", page(ONLY_A), "q")])
+
+    assert content_hash(SHARED) in store.docs
+
+
+def test_keyword_index_follows_the_store(store, tmp_path, monkeypatch):
+    from hybrid_retrieval import BM25Index
+
+    monkeypatch.setattr(ingestion, "INGEST_CHUNK_TOKENS", 30)
+    index = BM25Index()
+    ingestor = ScrapeIngestor(store, keyword_index=index, refs_path=str(tmp_path / "refs.sqlite"))
+    ingestor._ingest([("https://b.example/diabetes", page(ONLY_B), "q")])
+    ingestor._ingest([("https://b.example/diabetes", page(NEW_B), "q")])
+
+    assert len(index) == 1
+    assert index.search("walking")[0][0][0].page_content == NEW_B
+
+
+def test_submit_drops_pages_when_the_queue_is_full(store, tmp_path):
+    async def scenario():
+        ingestor = ScrapeIngestor(store, refs_path=str(tmp_path / "refs.sqlite"), queue_size=1)
+        ingestor.submit("q", [("https://a", "one"), ("https://b", "two")])
+        return ingestor._queue.qsize()
+
+    assert asyncio.run(scenario()) == 1
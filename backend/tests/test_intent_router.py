@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import pytest
+
+from intent_router import INTENTS, IntentRouter, load_examples
+
+
+@pytest.fixture(scope="module")
+def router():
+    return IntentRouter()
+
+
+@pytest.mark.parametrize("query, intent", [
+    ("hello there", "small_talk"),
+    ("what is the capital of france", "off_topic"),
+    ("what are the symptoms of type 2 diabetes", "medical"),
+    ("make me a weekly diet plan for weight loss", "diet_plan"),
+])
+def test_classifies_clear_queries_locally(router, query, intent):
+    predicted, score, margin = router.classify(query)
+    assert predicted == intent
+    assert score > 0 and margin > 0
+
+
+def test_unknown_vocabulary_has_no_verdict(router):
+    assert router.classify("zzzz qqqq") == (None, 0.0, 0.0)
+
+
+def test_unsure_queries_go_to_the_fallback():
+    calls = []
+
+    async def fallback(query):
+        calls.append(query)
+        return "medical"
+
+    router = IntentRouter(fallback=fallback, min_score=1.1)
+    verdict = asyncio.run(router.route("insulin dose"))
+    assert verdict.intent == "medical" and verdict.source == "llm"
+    assert calls == ["insulin dose"]
+
+
+def test_verdicts_are_memoised_per_normalised_query():
+    calls = []
+
+    async def fallback(query):
+        calls.append(query)
+        return "rag"
+
+    router = IntentRouter(fallback=fallback, min_score=1.1, memo_size=2)
+
+    async def run():
+        await router.route("Protein in eggs?")
+        await router.route("protein in eggs")
+        await router.route("fibre in oats")
+        await router.route("iron in spinach")
+        await router.route("Protein in eggs")
+
+    asyncio.run(run())
+    # The third distinct query evicted the first one from the memo
+    assert calls == ["Protein in eggs?", "fibre in oats", "iron in spinach", "Protein in eggs"]
+
+
+def test_load_examples_rejects_unknown_intents(tmp_path):
+    path = tmp_path / "intents.jsonl"
+    path.write_text(json.dumps({"text": "hi", "intent": "chitchat"}) + "\n")
+    with pytest.raises(ValueError):
+        load_examples(str(path))
+
+
+def test_bundled_examples_cover_every_intent():
+    assert {intent for _, intent in load_examples()} == set(INTENTS)
@@ -0,0 +1,82 @@
+import re
+
+import pytest
+
+from metrics import Counter, Histogram, Registry, stage_errors, stage_seconds, timed
+
+
+def test_histogram_buckets_are_cumulative_with_sum_and_count():
+    histogram = Histogram("latency_seconds", "Latency.", ["stage"], buckets=(1, 0.1))
+    for value in (0.05, 0.1, 0.5, 3):
+        histogram.observe(value, stage="map")
+
+    assert histogram.render() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{stage="map",le="0.1"} 2',
+        'latency_seconds_bucket{stage="map",le="1"} 3',
+        'latency_seconds_bucket{stage="map",le="+Inf"} 4',
+        'latency_seconds_sum{stage="map"} 3.65',
+        'latency_seconds_count{stage="map"} 4',
+    ]
+
+
+def test_counter_renders_each_label_set_with_escaped_values():
+    counter = Counter("requests_total", "Requests.", ["cache", "result"])
+    counter.inc(cache="page", result="hit")
+    counter.inc(2, cache="page", result="hit")
+    counter.inc(cache='say "hi"\\\n', result="miss")
+
+    samples = counter.render()[2:]
+
+    assert samples == [
+        'requests_total{cache="page",result="hit"} 3',
+        'requests_total{cache="say \\"hi\\"\\\\\\n",result="miss"} 1',
+    ]
+
+
+def test_unlabelled_metrics_and_the_registry_exposition():
+    registry = Registry()
+    registry.register(Counter("jobs_total", "Jobs.")).inc()
+    registry.register(Counter("empty_total", "Nothing yet."))
+
+    assert registry.render() == (
+        "# HELP jobs_total Jobs.\n# TYPE jobs_total counter\njobs_total 1\n"
+        "# HELP empty_total Nothing yet.\n# TYPE empty_total counter\n"
+    )
+
+
+def stage_count(stage):
+    state = stage_seconds._values.get((stage,))
+    return sum(state[0]) if state else 0
+
+
+def test_timed_records_latency_and_errors():
+    with timed("test_stage"):
+        pass
+    with pytest.raises(ValueError):
+        with timed("test_stage"):
+            raise ValueError("boom")
+
+    assert stage_count("test_stage") == 2
+    assert stage_errors._values[("test_stage",)] == 1
+
+
+def scraped_count(text, stage):
+    match = re.search(rf'^nutrino_stage_seconds_count\{{stage="{stage}"\}} (\d+)$', text, re.MULTILINE)
+    return int(match.group(1)) if match else 0
+
+
+def test_metrics_endpoint_exposes_stage_timers(main_module):
+    from fastapi.testclient import TestClient
+
+    client = TestClient(main_module.app)
+    before = scraped_count(client.get("/metrics").text, "greeting_check")
+
+    assert client.get("/search", params={"query": "hello"}).json()["message"].startswith("Hello")
+
+    response = client.get("/metrics")
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert "# TYPE nutrino_stage_seconds histogram" in response.text
+    assert scraped_count(response.text, "greeting_check") == before + 1
+    assert scraped_count(response.text, "search") >= 1
@@ -0,0 +1,90 @@
+import asyncio
+import glob
+import os
+
+from page_cache import PageCache, normalize_url
+
+
+def blobs(directory):
+    return glob.glob(os.path.join(directory, "blobs", "*", "*.z"))
+
+
+def test_normalize_url_drops_tracking_and_cosmetic_differences():
+    assert normalize_url("HTTPS://Example.com:443/diet/?utm_source=x&b=2&a=1#top") == "https://example.com/diet?a=1&b=2"
+    assert normalize_url("http://example.com:8080/") == "http://example.com:8080/"
+    assert normalize_url("https://example.com/a?fbclid=1") == normalize_url("https://example.com/a")
+
+
+def test_store_and_lookup_round_trip(tmp_path):
+    cache = PageCache(str(tmp_path), ttl=60)
+
+    async def scenario():
+        await cache.store("https://example.com/diet?utm_medium=x", "# Diet\n\nEat vegetables.", etag='"v1"')
+        return await cache.lookup("https://example.com/diet/")
+
+    entry = asyncio.run(scenario())
+
+    assert entry["markdown"] == "# Diet\n\nEat vegetables."
+    assert entry["etag"] == '"v1"'
+    assert entry["fresh"]
+    assert asyncio.run(cache.lookup("https://example.com/other")) is None
+
+
+def test_expired_entries_are_stale_until_touched(tmp_path):
+    cache = PageCache(str(tmp_path), ttl=60)
+    cache._store("https://example.com/a", "text")
+    cache._db.execute("UPDATE pages SET fetched_at = fetched_at - 120")
+    cache._db.commit()
+
+    assert not cache._lookup("https://example.com/a")["fresh"]
+    cache._touch("https://example.com/a")
+    assert cache._lookup("https://example.com/a")["fresh"]
+
+
+def test_identical_pages_share_one_blob_until_unused(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache._store("https://a.example/page", "same content")
+    cache._store("https://b.example/page", "same content")
+    assert len(blobs(str(tmp_path))) == 1
+
+    cache._store("https://a.example/page", "new content")
+    assert len(blobs(str(tmp_path))) == 2
+    cache._store("https://b.example/page", "newer content")
+    # Nothing points at "same content" any more
+    assert len(blobs(str(tmp_path))) == 2
+    assert cache._lookup("https://a.example/page")["markdown"] == "new content"
+
+
+def test_least_recently_used_pages_are_evicted(tmp_path):
+    cache = PageCache(str(tmp_path), max_bytes=10**6)
+    pages = {f"https://example.com/{i}": os.urandom(3000).hex() for i in range(3)}
+    for url, markdown in pages.items():
+        cache._store(url, markdown)
+    cache._db.execute("UPDATE pages SET last_access = 0 WHERE url = ?", (normalize_url("https://example.com/0"),))
+    cache._db.commit()
+
+    cache.max_bytes = cache._total_bytes() - 1
+    cache._evict()
+
+    assert cache._lookup("https://example.com/0") is None
+    assert cache._lookup("https://example.com/1")["markdown"] == pages["https://example.com/1"]
+    assert len(blobs(str(tmp_path))) == 2
+
+
+def test_missing_blob_counts_as_a_miss(tmp_path):
+    cache = PageCache(str(tmp_path))
+    cache._store("https://example.com/a", "text")
+    for path in blobs(str(tmp_path)):
+        os.remove(path)
+
+    assert cache._lookup("https://example.com/a") is None
+    assert cache._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0] == 0
+
+
+def test_nothing_is_written_until_the_cache_is_used(tmp_path):
+    directory = tmp_path / "cache"
+    cache = PageCache(str(directory))
+    assert not directory.exists()
+
+    assert cache._lookup("https://example.com/a") is None
+    assert (directory / "index.sqlite").exists()
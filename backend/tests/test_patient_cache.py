@@ -0,0 +1,129 @@
+import asyncio
+import threading
+import time
+from datetime import datetime, timezone
+
+import pytest
+from pymongo.errors import OperationFailure
+
+from patient_cache import LAST_UPDATED_FIELD, PatientCache
+
+
+class Loader:
+    def __init__(self, patients, delay=0):
+        self.patients = patients
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, mrn):
+        self.calls.append(mrn)
+        time.sleep(self.delay)
+        return self.patients.get(mrn)
+
+
+def patients(*mrns):
+    return {mrn: {"_id": f"id-{mrn}", "MRN Number": mrn} for mrn in mrns}
+
+
+def test_hits_are_served_from_memory_until_the_ttl():
+    loader = Loader(patients("MRN1"))
+    cache = PatientCache(None, loader, ttl=60)
+
+    async def scenario():
+        first = await cache.get("MRN1")
+        second = await cache.get("MRN1")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is second
+    assert loader.calls == ["MRN1"]
+
+    cache.ttl = 0
+    cache.invalidate("MRN1")
+    asyncio.run(cache.get("MRN1"))
+    asyncio.run(cache.get("MRN1"))
+    assert loader.calls == ["MRN1"] * 3
+
+
+def test_concurrent_misses_share_one_load():
+    loader = Loader(patients("MRN1"), delay=0.05)
+    cache = PatientCache(None, loader)
+
+    async def scenario():
+        return await asyncio.gather(*(cache.get("MRN1") for _ in range(5)))
+
+    results = asyncio.run(scenario())
+    assert loader.calls == ["MRN1"]
+    assert all(result is results[0] for result in results)
+
+
+def test_unknown_patients_are_cached_as_none_and_entries_are_bounded():
+    loader = Loader(patients("MRN1", "MRN2", "MRN3"))
+    cache = PatientCache(None, loader, max_entries=2)
+
+    async def scenario():
+        assert await cache.get("MISSING") is None
+        for mrn in ("MRN1", "MRN2", "MRN3"):
+            await cache.get(mrn)
+        await cache.get("MISSING")
+
+    asyncio.run(scenario())
+    assert list(cache._entries) == ["MRN3", "MISSING"]
+    assert loader.calls.count("MISSING") == 2
+    assert set(cache._ids) == {"id-MRN3"}
+
+
+def test_invalidate_by_document_id():
+    loader = Loader(patients("MRN1"))
+    cache = PatientCache(None, loader)
+    asyncio.run(cache.get("MRN1"))
+
+    cache.invalidate(document_id="id-MRN1")
+
+    assert cache._entries == {}
+    asyncio.run(cache.get("MRN1"))
+    assert loader.calls == ["MRN1", "MRN1"]
+
+
+def test_a_load_that_straddles_an_invalidation_is_not_cached():
+    loader = Loader(patients("MRN1"), delay=0.05)
+    cache = PatientCache(None, loader)
+
+    async def scenario():
+        load = asyncio.ensure_future(cache.get("MRN1"))
+        await asyncio.sleep(0.01)
+        cache.invalidate("MRN1")
+        await load
+
+    asyncio.run(scenario())
+    assert "MRN1" not in cache._entries
+
+
+def test_polling_fallback_invalidates_updated_patients(monkeypatch):
+    mongomock = pytest.importorskip("mongomock")
+    collection = mongomock.MongoClient()["test"]["patients"]
+    collection.insert_one({"_id": "id-MRN1", "MRN Number": "MRN1", LAST_UPDATED_FIELD: datetime(2000, 1, 1)})
+
+    def watch(*args, **kwargs):
+        raise OperationFailure("The $changeStream stage is only supported on replica sets", code=40573)
+
+    monkeypatch.setattr(collection, "watch", watch, raising=False)
+    cache = PatientCache(collection, lambda mrn: collection.find_one({"MRN Number": mrn}), poll_interval=0.05)
+    asyncio.run(cache.get("MRN1"))
+    invalidated = threading.Event()
+    original = cache.invalidate
+
+    def invalidate(mrn=None, document_id=None):
+        original(mrn, document_id)
+        invalidated.set()
+
+    cache.invalidate = invalidate
+    cache.start()
+    try:
+        time.sleep(0.1)
+        assert not invalidated.is_set()
+        collection.update_one({"_id": "id-MRN1"}, {"$set": {LAST_UPDATED_FIELD: datetime.now(timezone.utc)}})
+        assert invalidated.wait(2)
+    finally:
+        cache.stop()
+    assert "MRN1" not in cache._entries
@@ -0,0 +1,99 @@
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+from patient_db import (
+    MRN_KEY_FIELD, NAME_KEYS_FIELD, backfill_search_keys, compact_profile, duplicate_mrns, ensure_indexes,
+    name_keys, search_keys, search_patients, validate_patient,
+)
+
+
+@pytest.fixture
+def collection(mongo_collection):
+    return mongo_collection
+
+
+def add(collection, mrn, name):
+    patient = {"MRN Number": mrn, "Name": name}
+    collection.insert_one({**patient, **search_keys(patient)})
+
+
+def test_name_keys_are_lowercased_words_plus_the_full_name():
+    assert name_keys("  John   SMITH ") == ["john", "john smith", "smith"]
+    assert name_keys(None) == []
+
+
+def test_search_keys_only_cover_the_fields_present():
+    assert search_keys({"MRN Number": "mrn 12a", "Name": "Ann Lee"}) == {
+        MRN_KEY_FIELD: "MRN12A", NAME_KEYS_FIELD: ["ann", "ann lee", "lee"],
+    }
+    assert search_keys({"Age": 40}) == {}
+
+
+def test_validate_patient_coerces_and_reports_errors():
+    patient, errors = validate_patient({"MRN Number": " MRN1 ", "Age": "42", "Weight": "70.5",
+                                        "Preferred Cuisine": "Indian; Italian", "Unknown": "x"})
+    assert errors == []
+    assert patient == {"MRN Number": "MRN1", "Age": 42, "Weight": 70.5, "Preferred Cuisine": ["Indian", "Italian"]}
+
+    _, errors = validate_patient({"Age": "200", "Gender": "Robot"})
+    assert len(errors) == 3
+
+
+def test_blank_numeric_and_cuisine_cells_are_left_out():
+    patient, errors = validate_patient({"MRN Number": "MRN1", "Age": "", "Weight": " ", "Preferred Cuisine": "",
+                                        "Physical Activity Duration (minutes/day)": "", "Diet Type": ""})
+    assert errors == []
+    assert patient == {"MRN Number": "MRN1", "Diet Type": ""}
+
+
+def test_compact_profile_leaves_out_identifiers_and_empty_fields():
+    profile = compact_profile({"Name": "Ann Lee", "Email": "ann@example.com", "MRN Number": "MRN1",
+                               "Age": 40, "Weight": 62.0, "Physical Activity Duration (minutes/day)": 0,
+                               "Preferred Cuisine": ["Indian", "Italian"], "Diet Type": ""})
+    assert profile == "Age: 40\nPreferred Cuisine: Indian, Italian\nWeight (kg): 62"
+    assert compact_profile(None) == "No medical record on file"
+
+
+def test_mrn_prefix_search_ignores_case(collection):
+    ensure_indexes(collection)
+    add(collection, "MRN0012", "Ann Lee")
+    add(collection, "mrn0013", "Bo Chen")
+    add(collection, "MRN0020", "Cy Diaz")
+
+    found = search_patients(collection, "mRn001")
+
+    assert [row["MRN Number"] for row in found["results"]] == ["MRN0012", "mrn0013"]
+    assert not found["has_next"]
+
+
+def test_name_search_pages_are_disjoint_and_stable(collection):
+    ensure_indexes(collection)
+    for i in range(7):
+        add(collection, f"MRN{i:04d}", f"John Smith{i}" if i % 2 else f"Smith John{i}")
+
+    pages = [search_patients(collection, "smi", page=page, page_size=3) for page in range(3)]
+
+    mrns = [row["MRN Number"] for page in pages for row in page["results"]]
+    assert sorted(mrns) == [f"MRN{i:04d}" for i in range(7)]
+    assert [page["has_next"] for page in pages] == [True, True, False]
+    assert pages == [search_patients(collection, "smi", page=page, page_size=3) for page in range(3)]
+
+
+def test_duplicate_mrns_block_the_unique_index_and_are_reported(collection):
+    collection.insert_many([{"MRN Number": "MRN1"}, {"MRN Number": "MRN1"}, {"MRN Number": "MRN2"}])
+
+    with pytest.raises(DuplicateKeyError):
+        ensure_indexes(collection)
+
+    assert duplicate_mrns(collection) == [("MRN1", 2)]
+    # The search indexes are in place regardless
+    assert {"mrn_key", "name_keys"} <= set(collection.index_information())
+
+
+def test_backfill_adds_missing_search_keys(collection):
+    collection.insert_many([{"MRN Number": "mrn1", "Name": "Ann Lee"}, {"MRN Number": "MRN2"}])
+
+    assert backfill_search_keys(collection) == 2
+    assert collection.find_one({"MRN Number": "mrn1"})[MRN_KEY_FIELD] == "MRN1"
+    assert collection.find_one({"MRN Number": "MRN2"})[NAME_KEYS_FIELD] == []
+    assert backfill_search_keys(collection) == 0
@@ -0,0 +1,124 @@
+import csv
+import json
+
+import pytest
+
+from patient_db import MRN_KEY_FIELD, NAME_KEYS_FIELD
+from patient_io import Checkpoint, export_patients, import_patients
+
+
+def write_jsonl(path, lines):
+    path.write_text("".join(f"{line}\n" for line in lines), encoding="utf-8")
+    return str(path)
+
+
+def rejects(path):
+    with open(f"{path}.rejects.jsonl", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_bad_rows_are_rejected_and_the_rest_imported(mongo_collection, tmp_path):
+    path = write_jsonl(tmp_path / "patients.jsonl", [
+        json.dumps({"MRN Number": "MRN1", "Name": "Ann Lee", "Age": 40}),
+        "[1, 2, 3]",
+        "42",
+        "{not json",
+        json.dumps({"MRN Number": "MRN2", "Age": 300}),
+        json.dumps({"Name": "No MRN"}),
+        json.dumps({"MRN Number": "mrn3", "Name": "Bo Chen"}),
+    ])
+
+    import_patients(mongo_collection, path, "jsonl")
+
+    assert sorted(p["MRN Number"] for p in mongo_collection.find()) == ["MRN1", "mrn3"]
+    assert [(reject["position"], reject["errors"][0]) for reject in rejects(path)][:3] == [
+        (2, "expected a JSON object"), (3, "expected a JSON object"), (4, "malformed JSON"),
+    ]
+    assert len(rejects(path)) == 5
+    assert mongo_collection.find_one({"MRN Number": "mrn3"})[MRN_KEY_FIELD] == "MRN3"
+
+
+def test_partial_update_keeps_the_name_and_its_search_keys(mongo_collection, tmp_path):
+    import_patients(mongo_collection, write_jsonl(tmp_path / "first.jsonl", [
+        json.dumps({"MRN Number": "MRN1", "Name": "Ann Lee", "Age": 40}),
+    ]), "jsonl")
+    import_patients(mongo_collection, write_jsonl(tmp_path / "update.jsonl", [
+        json.dumps({"MRN Number": "MRN1", "Age": 41}),
+    ]), "jsonl")
+
+    patient = mongo_collection.find_one({"MRN Number": "MRN1"})
+    assert patient["Age"] == 41
+    assert patient["Name"] == "Ann Lee"
+    assert patient[NAME_KEYS_FIELD] == ["ann", "ann lee", "lee"]
+    assert patient["Record Version"] == 2
+
+
+def test_blank_csv_cells_keep_the_stored_values(mongo_collection, tmp_path):
+    import_patients(mongo_collection, write_jsonl(tmp_path / "first.jsonl", [
+        json.dumps({"MRN Number": "MRN1", "Name": "Ann Lee", "Age": 40, "Weight": 62.5}),
+    ]), "jsonl")
+    source = tmp_path / "update.csv"
+    with open(source, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["MRN Number", "Age", "Weight", "Diet Type"])
+        writer.writeheader()
+        writer.writerow({"MRN Number": "MRN1", "Age": "", "Weight": "", "Diet Type": "Vegetarian"})
+
+    import_patients(mongo_collection, str(source), "csv")
+
+    patient = mongo_collection.find_one({"MRN Number": "MRN1"})
+    assert (patient["Age"], patient["Weight"], patient["Diet Type"]) == (40, 62.5, "Vegetarian")
+
+
+def test_rejects_file_is_rewritten_unless_resuming(mongo_collection, tmp_path):
+    path = write_jsonl(tmp_path / "patients.jsonl", ["[1]", json.dumps({"MRN Number": "MRN1"}), "[2]"])
+
+    import_patients(mongo_collection, path, "jsonl")
+    import_patients(mongo_collection, path, "jsonl", restart=True)
+    assert [reject["position"] for reject in rejects(path)] == [1, 3]
+
+    # A resumed run only adds what it rejects after the checkpoint
+    Checkpoint(f"{path}.checkpoint", path).save(2)
+    import_patients(mongo_collection, path, "jsonl")
+    assert [reject["position"] for reject in rejects(path)] == [1, 3, 3]
+
+
+def test_import_resumes_after_the_checkpoint(mongo_collection, tmp_path):
+    path = write_jsonl(tmp_path / "patients.jsonl", [json.dumps({"MRN Number": f"MRN{i}"}) for i in range(1, 6)])
+    with open(f"{path}.checkpoint", "w", encoding="utf-8") as f:
+        json.dump({"identity": None, "position": 3}, f)
+
+    # A checkpoint for another version of the file is ignored
+    import_patients(mongo_collection, path, "jsonl", batch_size=2)
+    assert mongo_collection.count_documents({}) == 5
+
+    mongo_collection.delete_many({})
+    Checkpoint(f"{path}.checkpoint", path).save(3)
+    import_patients(mongo_collection, path, "jsonl", batch_size=2)
+    assert sorted(p["MRN Number"] for p in mongo_collection.find()) == ["MRN4", "MRN5"]
+
+
+def test_csv_export_round_trips(mongo_collection, tmp_path):
+    source = tmp_path / "patients.csv"
+    with open(source, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["MRN Number", "Name", "Age", "Preferred Cuisine"])
+        writer.writeheader()
+        writer.writerow({"MRN Number": "MRN1", "Name": "Ann Lee", "Age": "40", "Preferred Cuisine": "Indian;Italian"})
+    import_patients(mongo_collection, str(source), "csv")
+
+    exported = tmp_path / "export.jsonl"
+    export_patients(mongo_collection, str(exported), "jsonl")
+
+    (row,) = [json.loads(line) for line in exported.read_text(encoding="utf-8").splitlines()]
+    assert row == {"MRN Number": "MRN1", "Name": "Ann Lee", "Age": 40, "Preferred Cuisine": ["Indian", "Italian"]}
+    assert NAME_KEYS_FIELD not in row
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def test_export_writes_every_patient(mongo_collection, tmp_path, fmt):
+    mongo_collection.insert_many([{"MRN Number": f"MRN{i}", "Name": f"P{i}"} for i in range(3)])
+    path = tmp_path / f"export.{fmt}"
+
+    export_patients(mongo_collection, str(path), fmt)
+
+    lines = path.read_text(encoding="utf-8").splitlines()
+    assert len(lines) == 3 + (fmt == "csv")
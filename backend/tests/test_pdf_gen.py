@@ -0,0 +1,50 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+pytest.importorskip("reportlab")
+pytest.importorskip("PyPDF2")
+
+from PyPDF2 import PdfReader
+
+from pdf_gen import new_summary_pdf, summary_pdf_path, write_pdf
+
+
+def render(directory, text):
+    pdf_path = new_summary_pdf(directory)
+    summary_path = pdf_path[:-len(".pdf")] + ".txt"
+    with open(summary_path, "w") as f:
+        f.write(text)
+    write_pdf(summary_path, pdf_path)
+    return pdf_path
+
+
+def test_concurrent_summaries_get_their_own_files(tmp_path):
+    texts = [f"Summary for patient {i}" for i in range(6)]
+    with ThreadPoolExecutor(max_workers=6) as pool:
+        paths = list(pool.map(lambda text: render(str(tmp_path), text), texts))
+
+    assert len(set(paths)) == len(paths)
+    for path, text in zip(paths, texts):
+        assert text in PdfReader(path).pages[0].extract_text()
+
+
+def test_summary_pdf_path_stays_inside_the_directory(tmp_path):
+    path = new_summary_pdf(str(tmp_path))
+    name = os.path.basename(path)
+
+    assert summary_pdf_path(name, str(tmp_path)) == path
+    assert summary_pdf_path(f"../{name}", str(tmp_path)) == path
+    assert summary_pdf_path("../../etc/passwd", str(tmp_path)) is None
+    assert summary_pdf_path("chat_summary_missing.pdf", str(tmp_path)) is None
+
+
+def test_expired_summaries_are_removed(tmp_path):
+    old = new_summary_pdf(str(tmp_path))
+    os.utime(old, (time.time() - 7200, time.time() - 7200))
+    fresh = new_summary_pdf(str(tmp_path), ttl=3600)
+
+    assert not os.path.exists(old)
+    assert os.path.exists(fresh)
@@ -0,0 +1,48 @@
+from relevance import BM25, select_chunks
+from textutils import terms
+
+CHUNKS = [
+    "Breakfast ideas: oats with berries, eggs on wholegrain toast.",
+    "People with diabetes should keep carbohydrate portions steady and choose high fibre foods.",
+    "Our clinic is open Monday to Friday.",
+    "Insulin doses may need adjusting when diabetes medication or carbohydrate intake changes.",
+    "Hydration: water is the best drink.",
+]
+
+
+def test_bm25_prefers_rarer_terms_and_shorter_documents():
+    documents = [terms(text) for text in ("diabetes diet", "diabetes diet diet plan for the whole family week", "diet")]
+    index = BM25(documents)
+
+    scores = index.scores(terms("diabetes diet"))
+
+    assert scores[0] > scores[1] > scores[2] > 0
+    assert index.scores(terms("asthma")) == [0.0, 0.0, 0.0]
+
+
+def test_relevant_chunks_are_kept_in_page_order():
+    selected = select_chunks(CHUNKS, "carbohydrates and insulin for diabetes", top_k=2, token_budget=0)
+
+    assert selected == [CHUNKS[1], CHUNKS[3]]
+
+
+def test_only_matching_chunks_are_sent_when_anything_matches():
+    assert select_chunks(CHUNKS, "breakfast oats", top_k=4, token_budget=0) == [CHUNKS[0]]
+
+
+def test_no_match_falls_back_to_the_first_chunks():
+    assert select_chunks(CHUNKS, "asthma inhaler", top_k=2, token_budget=0) == CHUNKS[:2]
+
+
+def test_token_budget_skips_chunks_that_do_not_fit_but_keeps_the_best():
+    long_chunk = "diabetes " * 400
+    chunks = [long_chunk, CHUNKS[1], CHUNKS[3]]
+
+    # The best chunk goes through even when it alone exceeds the budget
+    assert select_chunks(chunks, "diabetes", top_k=0, token_budget=10) == [long_chunk]
+    assert select_chunks(chunks, "insulin carbohydrate", top_k=0, token_budget=60) == [CHUNKS[1], CHUNKS[3]]
+
+
+def test_single_chunk_and_empty_input_pass_through():
+    assert select_chunks([], "diabetes") == []
+    assert select_chunks([CHUNKS[2]], "diabetes") == [CHUNKS[2]]
@@ -0,0 +1,83 @@
+import pytest
+
+import response_cache
+from response_cache import ResponseCache, record_version
+from textutils import canonical_query, exact_terms
+
+SCOPE = ("medical", "MRN0000001", "v1")
+
+
+@pytest.mark.parametrize("cached, asked", [
+    ("symptoms of type 1 diabetes", "symptoms of type 2 diabetes"),
+    ("foods rich in vitamin B12", "foods rich in vitamin B6"),
+    ("foods to eat with gout", "foods not to eat with gout"),
+    ("foods to eat with gout", "foods to avoid with gout"),
+    ("foods I can eat with gout", "foods I can't eat with gout"),
+    ("foods rich in vitamin d", "foods rich in vitamin a"),
+    ("metformin 500 mg side effects", "metformin 850 mg side effects"),
+    ("iron rich foods", "foods without iron"),
+])
+def test_near_miss_clinical_questions_do_not_hit(cached, asked):
+    cache = ResponseCache()
+    cache.put(cached, SCOPE, f"answer to {cached}")
+    assert cache.get(asked, SCOPE) is None
+
+
+def test_exact_terms_gate_semantic_hits_even_for_identical_vectors():
+    # Every query embeds to the same vector, so only the exact-terms check can tell them apart
+    cache = ResponseCache(embed=lambda text: {"x": 1.0}, threshold=0.5)
+    cache.put("symptoms of type 1 diabetes", SCOPE, "type 1")
+    assert cache.get("symptoms of type 2 diabetes", SCOPE) is None
+    assert cache.get("signs of type 1 diabetes", SCOPE) == "type 1"
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_rephrasings_with_the_same_canonical_form_hit():
+    cache = ResponseCache()
+    cache.put("diet for diabetes", SCOPE, "diabetes diet")
+    assert cache.get("Diabetic diet?", SCOPE) == "diabetes diet"
+
+
+def test_canonical_query_keeps_negations_and_qualifiers():
+    assert "not" in canonical_query("foods not to eat with gout")
+    assert "not" in canonical_query("foods I don't eat")
+    assert canonical_query("vitamin a") != canonical_query("vitamin")
+    assert exact_terms(canonical_query("type 2 diabetes, 500mg metformin")) == {"2", "500mg"}
+
+
+def test_default_threshold_is_strict():
+    assert response_cache.RESPONSE_CACHE_THRESHOLD >= 0.9
+
+
+def test_answers_are_scoped():
+    cache = ResponseCache()
+    cache.put("diet for diabetes", SCOPE, "for patient 1")
+    assert cache.get("diet for diabetes", ("medical", "MRN0000002", "v1")) is None
+    cache.invalidate_scope(SCOPE)
+    assert cache.get("diet for diabetes", SCOPE) is None
+
+
+def test_expired_entries_are_not_served(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(response_cache.time, "monotonic", lambda: now[0])
+    cache = ResponseCache(ttl=10)
+    cache.put("diet for diabetes", SCOPE, "answer")
+    now[0] += 11
+    assert cache.get("diet for diabetes", SCOPE) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResponseCache(max_entries=2)
+    cache.put("diet for diabetes", SCOPE, "a")
+    cache.put("protein in eggs", SCOPE, "b")
+    cache.get("diet for diabetes", SCOPE)
+    cache.put("calories in bananas", SCOPE, "c")
+    assert cache.get("protein in eggs", SCOPE) is None
+    assert cache.get("diet for diabetes", SCOPE) == "a"
+
+
+def test_record_version_changes_with_the_record():
+    assert record_version(None) == "none"
+    assert record_version({"Age": 40}) != record_version({"Age": 41})
+    assert record_version({"a": 1, "b": 2}) == record_version({"b": 2, "a": 1})
@@ -0,0 +1,20 @@
+import pytest
+
+for module in ("asgi_lifespan", "fastapi", "uvicorn"):
+    pytest.importorskip(module)
+
+from search_bench import observed_branch
+
+
+@pytest.mark.parametrize("body, branch", [
+    ({"message": "Hello! How can I help?", "webscraping": False}, "greeting"),
+    ({"message": "Please ask me about health or nutrition.", "webscraping": False}, "off_topic"),
+    ({"message": "Sorry, I couldn't find relevant information."}, "no_results"),
+    ({"message": "Summary", "webscraping": True, "cachedResponse": False}, "medical"),
+    ({"message": "Plan", "sources": ["https://a"], "cachedResponse": False}, "diet_plan"),
+    ({"message": "165 kcal", "sources": ["doc"], "ragRetrieval": True, "cachedResponse": False}, "rag_hit"),
+    ({"message": "Durian is...", "ragRetrieval": True, "cachedResponse": False}, "rag_fallback"),
+    ({"message": "Summary", "webscraping": True, "cachedResponse": True}, "cached"),
+])
+def test_observed_branch(body, branch):
+    assert observed_branch(body) == branch
@@ -0,0 +1,118 @@
+import json
+import types
+import uuid
+
+import pytest
+
+from response_cache import ResponseCache
+
+
+def events(response):
+    """
+    (event, data) pairs of an SSE body, checking the framing: an event line, a data line, a blank line.
+    """
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.endswith("\n\n")
+    parsed = []
+    for block in response.text[:-2].split("\n\n"):
+        event, data = block.split("\n")
+        assert event.startswith("event: ") and data.startswith("data: ")
+        parsed.append((event[len("event: "):], json.loads(data[len("data: "):])))
+    return parsed
+
+
+class FakeRouter:
+    def __init__(self, intent):
+        self.intent = intent
+
+    async def route(self, query):
+        return types.SimpleNamespace(intent=self.intent, source="test")
+
+
+@pytest.fixture
+def client(main_module, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    async def get_patient(mrn):
+        return {"MRN Number": mrn, "Age": 40}
+
+    async def gather_content(query, intent, emit):
+        await emit("urls", {"urls": ["https://a.example/diabetes"]})
+        return "Scraped page about diabetes.", ["https://a.example/diabetes"]
+
+    async def llm_infer(patient, content, query, emit=None):
+        for token in ("Eat ", "more ", "greens."):
+            await emit("token", {"text": token})
+        return "Eat more greens."
+
+    monkeypatch.setattr(main_module, "intent_router", FakeRouter("medical"))
+    monkeypatch.setattr(main_module, "response_cache", ResponseCache())
+    monkeypatch.setattr(main_module.patient_cache, "get", get_patient)
+    monkeypatch.setattr(main_module, "gather_content", gather_content)
+    monkeypatch.setattr(main_module, "llm_infer", llm_infer)
+    return TestClient(main_module.app)
+
+
+def stream(client, query, session_id):
+    return events(client.get("/search/stream", params={"query": query, "session_id": session_id, "mrn": "MRN1"}))
+
+
+def test_tokens_are_forwarded_and_the_stream_ends_with_done(client):
+    received = stream(client, "diet for diabetes", "stream-tokens")
+
+    names = [event for event, _ in received]
+    assert names[:3] == ["classification", "cache", "urls"]
+    assert [data["text"] for event, data in received if event == "token"] == ["Eat ", "more ", "greens."]
+    assert names[-1] == "done"
+    done = received[-1][1]
+    assert done["message"] == "Eat more greens."
+    assert done["cachedResponse"] is False
+
+
+def test_a_repeated_question_streams_the_cached_answer(client):
+    stream(client, "diet for diabetes", "stream-cache")
+
+    received = stream(client, "diet for diabetes", "stream-cache")
+
+    assert ("cache", {"hit": True}) in received
+    assert not [event for event, _ in received if event == "token"]
+    assert received[-1][0] == "done"
+    assert received[-1][1]["cachedResponse"] is True
+    assert received[-1][1]["message"] == "Eat more greens."
+
+
+def test_a_stage_failing_mid_stream_is_delivered_as_an_error_event(client, main_module, monkeypatch):
+    async def llm_infer(patient, content, query, emit=None):
+        await emit("token", {"text": "Eat "})
+        raise RuntimeError("LLM provider unavailable")
+
+    monkeypatch.setattr(main_module, "llm_infer", llm_infer)
+
+    received = stream(client, "diet for diabetes", "stream-error")
+
+    assert ("token", {"text": "Eat "}) in received
+    assert received[-1] == ("error", {"detail": "LLM provider unavailable"})
+    assert "done" not in [event for event, _ in received]
+
+
+def test_rag_chain_tokens_are_forwarded(client, main_module, monkeypatch):
+    class FakeChain:
+        async def ainvoke(self, inputs, config):
+            run_id = uuid.uuid4()
+            for token in ("165 ", "kcal"):
+                for handler in config["callbacks"]:
+                    await handler.on_llm_new_token(token, run_id=run_id)
+            return {"result": "165 kcal", "source_documents": []}
+
+    monkeypatch.setattr(main_module, "intent_router", FakeRouter("rag"))
+    monkeypatch.setattr(main_module, "qa_chain", FakeChain())
+
+    received = stream(client, "calories in chicken breast", "stream-rag")
+
+    assert [data["text"] for event, data in received if event == "token"] == ["165 ", "kcal"]
+    assert received[-1][0] == "done"
+    assert received[-1][1]["ragRetrieval"] is True
+
+
+def test_an_empty_query_is_rejected_before_streaming(client):
+    assert client.get("/search/stream", params={"query": ""}).status_code == 400
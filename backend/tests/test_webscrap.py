@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+for module in ("dotenv", "groq", "tavily", "pymongo", "crawl4ai", "httpx"):
+    pytest.importorskip(module)
+
+import webscrap
+
+
+class FakeTavily:
+    def __init__(self, urls):
+        self.urls = urls
+
+    def search(self, query):
+        return {"results": [{"url": url} for url in self.urls]}
+
+
+def probe(delays, live):
+    probed = []
+
+    async def is_live(url):
+        await asyncio.sleep(delays.get(url, 0))
+        probed.append(url)
+        return url in live
+
+    return is_live, probed
+
+
+def test_best_ranked_live_urls_win_over_faster_ones(monkeypatch):
+    urls = ["https://a", "https://b", "https://c", "https://d", "https://e"]
+    is_live, _ = probe({"https://a": 0.05, "https://b": 0.03}, live={"https://a", "https://b", "https://d", "https://e"})
+    monkeypatch.setattr(webscrap, "tavily_client", FakeTavily(urls))
+    monkeypatch.setattr(webscrap, "is_live", is_live)
+
+    assert asyncio.run(webscrap.get_query_urls("diabetes diet", wanted=2)) == ["https://a", "https://b"]
+
+
+def test_dead_top_results_are_skipped_in_rank_order(monkeypatch):
+    urls = ["https://a", "https://b", "https://c", "https://d"]
+    is_live, _ = probe({"https://c": 0.02}, live={"https://c", "https://d"})
+    monkeypatch.setattr(webscrap, "tavily_client", FakeTavily(urls))
+    monkeypatch.setattr(webscrap, "is_live", is_live)
+
+    assert asyncio.run(webscrap.get_query_urls("diabetes diet", wanted=3)) == ["https://c", "https://d"]
+
+
+def test_lower_ranked_probes_are_cancelled_once_the_best_are_known(monkeypatch):
+    urls = ["https://a", "https://b", "https://slow"]
+    is_live, probed = probe({"https://slow": 10}, live=set(urls))
+    monkeypatch.setattr(webscrap, "tavily_client", FakeTavily(urls))
+    monkeypatch.setattr(webscrap, "is_live", is_live)
+
+    assert asyncio.run(webscrap.get_query_urls("diabetes diet", wanted=2)) == ["https://a", "https://b"]
+    assert "https://slow" not in probed
+
+
+def text_of(tokens):
+    """
+    Sentences adding up to about `tokens` tokens, whichever tokenizer count_tokens falls back to.
+    """
+    sentences = []
+    while webscrap.count_tokens(" ".join(sentences)) < tokens:
+        sentences.append(f"Fact {len(sentences)} about diabetes.")
+    return " ".join(sentences)
+
+
+def stub_complete(monkeypatch, reply):
+    calls = []
+
+    async def complete(messages, model="llama3-8b-8192", emit=None, stage="llm"):
+        calls.append(stage)
+        return reply
+
+    monkeypatch.setattr(webscrap, "complete", complete)
+    return calls
+
+
+def test_pack_batches_merges_at_least_two_parts_even_when_each_is_large():
+    parts = [text_of(70) for _ in range(5)]
+
+    batches = webscrap.pack_batches(parts, max_tokens=100)
+
+    assert all(len(batch) >= 2 for batch in batches[:-1])
+    assert all(webscrap.count_tokens(piece) <= 51 for batch in batches for piece in batch)
+    assert " ".join(piece for batch in batches for piece in batch).split() == " ".join(parts).split()
+
+
+def test_summaries_within_budget_are_not_reduced(monkeypatch):
+    calls = stub_complete(monkeypatch, "merged")
+
+    reduced = asyncio.run(webscrap.reduce_summaries(["one.", "two."], "q", max_tokens=100))
+
+    assert reduced == "one. two."
+    assert calls == []
+
+
+def test_reduce_runs_levels_until_the_summaries_fit(monkeypatch):
+    part = text_of(40)
+    # The model doesn't shrink anything: only fan-in brings the count down
+    calls = stub_complete(monkeypatch, part)
+    monkeypatch.setattr(webscrap, "REDUCE_MAX_LEVELS", 4)
+
+    reduced = asyncio.run(webscrap.reduce_summaries([part] * 8, "q", max_tokens=100))
+
+    # 8 -> 4 -> 2, and two parts fit the budget
+    assert reduced == f"{part} {part}"
+    assert calls == ["reduce"] * (4 + 2)
+
+
+def test_reduce_stops_at_the_level_limit_and_cuts_to_budget(monkeypatch, capsys):
+    calls = stub_complete(monkeypatch, text_of(300))
+    monkeypatch.setattr(webscrap, "REDUCE_MAX_LEVELS", 2)
+
+    reduced = asyncio.run(webscrap.reduce_summaries([text_of(300)] * 2, "q", max_tokens=100))
+
+    assert webscrap.count_tokens(reduced) <= 100
+    assert "Warning: summaries are still" in capsys.readouterr().out
+    assert calls
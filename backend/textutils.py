@@ -0,0 +1,122 @@
+import math
+import re
+from collections import Counter
+
+# Small shared text helpers for the local (CPU-only) parts of the pipeline: intent routing,
+# query normalisation and lexical scoring. Deliberately dependency free.
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+a an the and or but if of for to in on at by with from into about as is are was were be been being
+do does did doing have has had having i me my mine we our ours you your yours he him his she her it its
+they them their this that these those what which who whom whose when where why how can could should
+would will shall may might must am so than too very just also any some all each both few more most
+other such no nor not only own same there here then once again further up down out off over under
+please tell give let know want need like get s t
+""".split())
+
+# Words that flip the meaning of a query ("foods to eat" vs "foods not to eat"); canonical_query keeps
+# them even where they are stopwords.
+NEGATIONS = frozenset("""
+no not nor never without avoid avoiding except cannot dont doesnt didnt isnt arent cant shouldnt
+""".split())
+_CONTRACTIONS = ((re.compile(r"\bcan['\u2019]t\b"), "cannot"), (re.compile(r"\bwon['\u2019]t\b"), "will not"),
+                 (re.compile(r"n['\u2019]t\b"), " not"))
+# A short token after one of these names a different thing: "vitamin a" vs "vitamin d", "type 1" vs "type 2"
+_QUALIFIER_WORDS = frozenset("vitamin vitamins hepatitis type stage grade omega".split())
+
+# Ordered longest-first so "ational" wins over "al" etc.
+_SUFFIXES = (
+    ("ational", "ate"), ("ization", "ize"), ("fulness", "ful"), ("ousness", "ous"),
+    ("iveness", "ive"), ("ations", "ate"), ("ation", "ate"), ("ities", "ity"),
+    ("ness", ""), ("ment", ""), ("ings", ""), ("ing", ""), ("ies", "y"), ("ary", ""),
+    ("ers", ""), ("ed", ""), ("es", ""), ("ic", ""), ("al", ""), ("ly", ""), ("er", ""), ("s", ""),
+)
+
+
+def normalize_text(text):
+    """
+    Lowercase, drop punctuation and collapse whitespace.
+    """
+    return " ".join(_TOKEN_RE.findall(text.lower()))
+
+
+def tokenize(text):
+    return _TOKEN_RE.findall(text.lower())
+
+
+def stem(token):
+    """
+    Very light suffix stripping so "diabetes", "diabetic" and "diabetics" share a stem.
+    """
+    if len(token) <= 4 or token.isdigit():
+        return token
+    for suffix, replacement in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3:
+            return token[: -len(suffix)] + replacement
+    return token
+
+
+def terms(text, drop_stopwords=True):
+    """
+    Stemmed content terms of a text, in order.
+    """
+    return [stem(t) for t in tokenize(text) if not (drop_stopwords and t in STOPWORDS)]
+
+
+def canonical_query(text):
+    """
+    Order-insensitive canonical form of a query: stemmed content terms, deduplicated and sorted.
+    "diet for diabetes" and "Diabetic diet?" both become "diabet diet". Negations and qualifiers
+    ("vitamin a") are kept, since dropping them changes the question.
+    """
+    text = text.lower()
+    for pattern, replacement in _CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    tokens = tokenize(text)
+    kept = set()
+    for i, token in enumerate(tokens):
+        if token in NEGATIONS or (i and tokens[i - 1] in _QUALIFIER_WORDS and len(token) <= 3):
+            kept.add(token)
+        elif token not in STOPWORDS:
+            kept.add(stem(token))
+    return " ".join(sorted(kept))
+
+
+def exact_terms(canonical):
+    """
+    Terms of a canonical query that must match exactly for two queries to mean the same thing:
+    numbers and codes ("2", "b12", "500mg"), very short tokens ("d", "ms") and negations.
+    """
+    return frozenset(
+        term for term in canonical.split()
+        if term in NEGATIONS or len(term) <= 2 or any(char.isdigit() for char in term)
+    )
+
+
+def features(text):
+    """
+    Sparse bag of features for short texts: stemmed unigrams, bigrams and character trigrams
+    (the trigrams make the representation tolerant to typos and unseen inflections).
+    """
+    words = [stem(t) for t in tokenize(text)]
+    feats = Counter(words)
+    feats.update(f"{a}_{b}" for a, b in zip(words, words[1:]))
+    for word in words:
+        padded = f"#{word}#"
+        feats.update(f"#{padded[i:i + 3]}" for i in range(len(padded) - 2))
+    return feats
+
+
+def l2_normalize(vec):
+    norm = math.sqrt(sum(v * v for v in vec.values()))
+    if not norm:
+        return {}
+    return {k: v / norm for k, v in vec.items()}
+
+
+def dot(a, b):
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(v * b.get(k, 0.0) for k, v in a.items())
@@ -113,70 +113,310 @@ import os
 import asyncio
 from dotenv import load_dotenv
 from pymongo import MongoClient
-from groq import Groq
+from groq import AsyncGroq
 from tavily import TavilyClient
-from crawl4ai import AsyncWebCrawler
-import requests
+import httpx
+from concurrency import bounded_gather, run_blocking, TokenBucketLimiter
+from chunking import chunk_text, count_tokens, legacy_chunk_count, token_budget
+from content_cleaning import clean_pages, format_report
+from page_cache import PageCache
+from crawler_pool import CrawlerPool
+from patient_cache import PatientCache
+from patient_db import PROFILE_PROJECTION, compact_profile
+from relevance import select_chunks
+from metrics import timed, record_tokens, record_cache
 
 load_dotenv()
 
-groq_client = Groq(api_key=os.getenv("GROQ_API_KEY"))
+groq_client = AsyncGroq(api_key=os.getenv("GROQ_API_KEY"))
+
+# Max chunk summaries in flight per request, and the provider quota shared by every request
+MAP_CONCURRENCY = int(os.getenv("MAP_CONCURRENCY", "8"))
+GROQ_RPM = int(os.getenv("GROQ_RPM", "30"))
+GROQ_TPM = int(os.getenv("GROQ_TPM", "30000"))
+# Completion tokens count against TPM too; reserve this many per call on top of the prompt
+GROQ_COMPLETION_RESERVE = int(os.getenv("GROQ_COMPLETION_RESERVE", "256"))
+groq_limiter = TokenBucketLimiter(rpm=GROQ_RPM, tpm=GROQ_TPM)
+
+# Crawled pages are cached on disk so hot URLs cost a disk read instead of a browser session
+page_cache = PageCache()
+# Warm browsers shared by all requests; started/stopped from the FastAPI lifespan in main.py
+crawler_pool = CrawlerPool()
+# One pooled client for URL checks and revalidation: keep-alive connections are reused per host
+http_client = httpx.AsyncClient(
+    timeout=httpx.Timeout(10.0, connect=5.0),
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    follow_redirects=True,
+)
+tavily_client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
+
+# Combined partial summaries above this many tokens are reduced in batches before the final prompt
+REDUCE_TOKEN_BUDGET = int(os.getenv("REDUCE_TOKEN_BUDGET", str(token_budget("llama3-8b-8192"))))
+# Safety stop for the tree reduce; each level shrinks the input, so this is rarely reached
+REDUCE_MAX_LEVELS = int(os.getenv("REDUCE_MAX_LEVELS", "4"))
+
+# Pages to scrape per query; URL validation stops as soon as this many live URLs are found
+SCRAPE_PAGES = int(os.getenv("SCRAPE_PAGES", "3"))
+URL_CHECK_TIMEOUT = httpx.Timeout(
+    float(os.getenv("URL_CHECK_READ_TIMEOUT", "4")), connect=float(os.getenv("URL_CHECK_CONNECT_TIMEOUT", "2"))
+)
+
 mongo_client = MongoClient(os.getenv("MONGO_DB_CLIENT"))
 db = mongo_client["medical_records_db"]
 collection = db["patients"]
 
 async def crawl_url(url):
+    """
+    Crawl a page; returns (markdown, response headers with lowercase names).
+    """
     try:
-        async with AsyncWebCrawler(verbose=True) as crawler:
-            result = await crawler.arun(url=url)
-            return result.markdown
+        result = await crawler_pool.arun(url)
+        headers = getattr(result, "response_headers", None) or {}
+        return result.markdown, {name.lower(): value for name, value in headers.items()}
     except Exception as e:
         print(f"Error crawling {url}: {e}")
-        return None
+        return None, {}
 
-async def web_scrap_avail_links(avail_links):
-    tasks = [crawl_url(avail_links[i]) for i in range (3)]
-    results = await asyncio.gather(*tasks)
-    
-    with open("scrapped.txt", "w", encoding="utf-8") as file:
-        for result in results:
-            if result:
-                file.write(result + "\n")
-
-def get_query_urls(user_query):
-    client = TavilyClient(api_key=os.getenv("TAVILY_API_KEY"))
-    response = client.search(user_query)
-    
-    available_urls = []
-    for r in response["results"]:
-        try:
-            if requests.get(r["url"]).status_code == 200:
-                available_urls.append(r["url"])
-              #  print(f"Fectched one: {r['url']}")
-        except requests.RequestException as e:
-            print(f"Error fetching {r['url']}: {e}")
+async def revalidate(url, entry):
+    """
+    Conditional GET against the origin; True when it answers 304 Not Modified.
+    """
+    headers = {}
+    if entry["etag"]:
+        headers["If-None-Match"] = entry["etag"]
+    if entry["last_modified"]:
+        headers["If-Modified-Since"] = entry["last_modified"]
+    if not headers:
+        return False
+    try:
+        response = await http_client.get(url, headers=headers)
+        return response.status_code == 304
+    except httpx.HTTPError as e:
+        print(f"Error revalidating {url}: {e}")
+        return False
+
+async def fetch_page(url):
+    """
+    Read-through page cache in front of crawl_url().
+    """
+    entry = await page_cache.lookup(url)
+    if entry and (entry["fresh"] or await revalidate(url, entry)):
+        if not entry["fresh"]:
+            await page_cache.touch(url)
+        record_cache("page", True)
+        return entry["markdown"]
+    record_cache("page", False)
+
+    markdown, headers = await crawl_url(url)
+    if markdown:
+        await page_cache.store(url, markdown, headers.get("etag"), headers.get("last-modified"))
+    return markdown
+
+async def web_scrap_avail_links(avail_links, max_pages=SCRAPE_PAGES):
+    """
+    Crawl up to `max_pages` of the given links and return (url, cleaned markdown) pairs, in link order.
+    Fewer (or no) pages come back when links are missing or fail to crawl.
+    """
+    urls = avail_links[:max_pages]
+    with timed("crawl"):
+        results = await asyncio.gather(*(fetch_page(url) for url in urls))
+    crawled = [(url, result) for url, result in zip(urls, results) if result]
+
+    # Drop navigation, banners and text repeated across pages before we pay to summarise it
+    with timed("clean"):
+        cleaned, report = await run_blocking(clean_pages, [markdown for _, markdown in crawled])
+    print(format_report(report))
+    return [(url, page) for (url, _), page in zip(crawled, cleaned) if page]
+
+async def is_live(url):
+    """
+    Cheap liveness probe: HEAD, falling back to a one-byte ranged GET for servers that refuse HEAD.
+    """
+    try:
+        response = await http_client.head(url, timeout=URL_CHECK_TIMEOUT)
+        if response.is_success:
+            return True
+        if response.status_code not in (403, 405, 501):
+            return False
+        async with http_client.stream("GET", url, headers={"Range": "bytes=0-0"}, timeout=URL_CHECK_TIMEOUT) as response:
+            return response.is_success
+    except (httpx.HTTPError, httpx.InvalidURL) as e:
+        print(f"Error fetching {url}: {e}")
+        return False
+
+async def get_query_urls(user_query, wanted=SCRAPE_PAGES):
+    with timed("tavily_search"):
+        response = await run_blocking(tavily_client.search, user_query)
+    urls = [r["url"] for r in response["results"]]
+
+    # Probe every result concurrently and keep the `wanted` best-ranked live URLs. Stop as soon as those are
+    # known: every result ranked above them has been probed, so a slow top result isn't skipped for a fast one.
+    checks = {asyncio.create_task(is_live(url)): i for i, url in enumerate(urls)}
+    pending = set(checks)
+    probed = {}  # rank -> live
+
+    def best_known():
+        live = 0
+        for i in range(len(urls)):
+            if i not in probed:
+                return False
+            live += probed[i]
+            if live >= wanted:
+                return True
+        return True
+
+    try:
+        with timed("url_validation"):
+            while pending and not best_known():
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    probed[checks[task]] = task.result()
+    finally:
+        for task in pending:
+            task.cancel()
 
-    return available_urls
+    return [urls[i] for i in sorted(probed) if probed[i]][:wanted]
 
 def get_patient_by_mrn(mrn_number):
-    patient = collection.find_one({"MRN Number": mrn_number})
+    patient = collection.find_one({"MRN Number": mrn_number}, PROFILE_PROJECTION)
     if patient:
         patient["_id"] = str(patient["_id"])
     return patient
 
-def split_content(content, max_length=2000):
-    return [content[i:i + max_length] for i in range(0, len(content), max_length)]
+# Profiles rarely change between queries; main.py starts its change watcher with the app
+patient_cache = PatientCache(collection, get_patient_by_mrn)
+
+def split_content(content, model="llama3-8b-8192"):
+    """
+    Token-aware split of the scraped markdown into chunks sized for `model`.
+    """
+    content_chunks = chunk_text(content, model=model)
+    legacy_chunks = legacy_chunk_count(content)
+    print(f"Chunker: {len(content_chunks)} chunks for {model} "
+          f"(fixed 2000-char split: {legacy_chunks}), saved {legacy_chunks - len(content_chunks)} LLM calls")
+    return content_chunks
+
+def relevant_chunks(content, user_query):
+    """
+    Split the scraped content and keep the chunks that bear on the question. Tokenising and BM25
+    scoring are CPU work, so async callers run this on the worker pool.
+    """
+    return select_chunks(split_content(content), user_query)
+
+def estimate_tokens(messages):
+    return sum(count_tokens(message["content"]) for message in messages)
+
+async def complete(messages, model="llama3-8b-8192", emit=None, stage="llm"):
+    """
+    Run a Groq chat completion. With `emit`, the answer is streamed and every token is
+    forwarded as a "token" event while it is being collected. Latency and token counts are
+    recorded under `stage`.
+    """
+    prompt_tokens = estimate_tokens(messages)
+    await groq_limiter.acquire(prompt_tokens + GROQ_COMPLETION_RESERVE)
+
+    with timed(stage):
+        if emit is None:
+            chat_completion = await groq_client.chat.completions.create(
+                messages=messages,
+                model=model,
+            )
+            answer = chat_completion.choices[0].message.content.strip()
+            usage = chat_completion.usage
+            if usage:
+                record_tokens(stage, model, usage.prompt_tokens, usage.completion_tokens)
+            else:
+                record_tokens(stage, model, prompt_tokens, count_tokens(answer))
+            return answer
+
+        parts = []
+        stream = await groq_client.chat.completions.create(
+            messages=messages,
+            model=model,
+            stream=True,
+        )
+        async for chunk in stream:
+            token = chunk.choices[0].delta.content
+            if token:
+                parts.append(token)
+                await emit("token", {"text": token})
+        answer = "".join(parts).strip()
+        record_tokens(stage, model, prompt_tokens, count_tokens(answer))
+        return answer
+
+def prompt_profile(medical_rec, calls):
+    """
+    Compact rendering of the patient record for the prompts, logging the tokens it saves this request.
+    """
+    profile = compact_profile(medical_rec)
+    before, after = count_tokens(str(medical_rec)), count_tokens(profile)
+    print(f"Patient profile: {before} -> {after} tokens per prompt, {(before - after) * calls} tokens saved over {calls} calls")
+    return profile
+
+def pack_batches(parts, max_tokens):
+    """
+    Group consecutive parts into batches of about `max_tokens`, at least two parts to a batch so every
+    reduce call merges something. Parts over half the budget are split first, so any two of them fit;
+    only a part left over at the end gets a batch of its own.
+    """
+    half = max(1, max_tokens // 2)
+    pieces = []
+    for part in parts:
+        pieces.extend(chunk_text(part, max_tokens=half, overlap_tokens=0) if count_tokens(part) > half else [part])
+    batches, batch, used = [], [], 0
+    for piece in pieces:
+        tokens = count_tokens(piece)
+        if len(batch) >= 2 and used + tokens > max_tokens:
+            batches.append(batch)
+            batch, used = [], 0
+        batch.append(piece)
+        used += tokens
+    if batch:
+        batches.append(batch)
+    return batches
+
+async def reduce_batch(batch, user_query):
+    if len(batch) == 1:
+        # Nothing to merge; it goes up to the next level as it is
+        return batch[0]
+    reduce_prompt = [
+        {
+            "role": "user",
+            "content": f"Consider this as PROMPT-2: {' '.join(batch)}. These are partial summaries of the webscraped content I gathered based on the user query: {user_query}. Merge them into a single summary in the smallest possible form while retaining all key points and essential details. Remove repetition, do not add any information that is not in the summaries, and do not introduce or conclude the response."
+        }
+    ]
+    return await complete(reduce_prompt, stage="reduce")
 
-def summarize_chunks(medical_rec, content_chunks, user_query):
+async def reduce_summaries(summaries, user_query, max_tokens=REDUCE_TOKEN_BUDGET):
+    """
+    Tree reduce: while the combined partial summaries are over `max_tokens`, merge them in
+    token-budgeted batches of two or more, reducing the batches of each level concurrently, so depth
+    grows logarithmically with the scraped content. Whatever is still over budget after
+    REDUCE_MAX_LEVELS is cut to fit, with a warning.
+    """
+    level = 0
+    while summaries and count_tokens(" ".join(summaries)) > max_tokens and level < REDUCE_MAX_LEVELS:
+        batches = pack_batches(summaries, max_tokens)
+        level += 1
+        summaries = await bounded_gather((reduce_batch(batch, user_query) for batch in batches), MAP_CONCURRENCY)
+        print(f"Reduce level {level}: {sum(len(batch) for batch in batches)} summaries -> {len(summaries)}")
+    reduced = " ".join(summaries)
+    tokens = count_tokens(reduced)
+    if tokens > max_tokens:
+        print(f"Warning: summaries are still {tokens} tokens after {level} reduce levels (budget {max_tokens}); "
+              "keeping only the first chunk that fits")
+        reduced = chunk_text(reduced, max_tokens=max_tokens, overlap_tokens=0)[0]
+    return reduced
+
+async def summarize_chunks(medical_rec, content_chunks, user_query, emit=None):
     """
     Summarize each chunk individually.
     """
-    summarized_chunks = []
-    for i, chunk in enumerate(content_chunks):
+    async def summarize(i, chunk):
         combined_prompts = [
             {
                 "role": "user",
-                "content": f"Imagine you're a nutritionist with expertise in all types of medical conditions. {medical_rec}, this is a patient's medical history in JSON format. Based on that, you'll need to understand their medical records. For any subsequent prompts I give, you must tailor your response according to the restrictions and requirements outlined in the patient's medical records. Consider this as PROMPT-1. Do not provide any type of introduction or conclusion for the generated content by your side."
+                "content": f"Imagine you're a nutritionist with expertise in all types of medical conditions. {medical_rec}, this is a patient's medical history, one field per line. Based on that, you'll need to understand their medical records. For any subsequent prompts I give, you must tailor your response according to the restrictions and requirements outlined in the patient's medical records. Consider this as PROMPT-1. Do not provide any type of introduction or conclusion for the generated content by your side."
             },
             {
                 "role": "user",
@@ -184,24 +424,27 @@ def summarize_chunks(medical_rec, content_chunks, user_query):
             }
         ]
 
-        chat_completion = groq_client.chat.completions.create(
-            messages=combined_prompts,
-            model="llama3-8b-8192",
-        )
+        summary = await complete(combined_prompts, stage="map")
+        if emit:
+            await emit("chunk_summary", {"part": i + 1, "total": len(content_chunks)})
+        return summary
 
-        summarized_chunks.append(chat_completion.choices[0].message.content.strip())
+    # Map phase runs concurrently; gather keeps the summaries in chunk order
+    summarized_chunks = await bounded_gather(
+        (summarize(i, chunk) for i, chunk in enumerate(content_chunks)), MAP_CONCURRENCY
+    )
     
-    # Return the summarized chunks combined
-    return " ".join(summarized_chunks)
+    # Partial summaries in chunk order; reduce_summaries() combines them
+    return summarized_chunks
 
-def final_summary(medical_rec, summarized_content):
+async def final_summary(medical_rec, summarized_content, emit=None):
     """
     Take the summarized content from chunks and make a final concise summary.
     """
     final_prompt = [
         {
             "role": "user",
-            "content": f"Imagine you're a nutritionist with expertise in all types of medical conditions. {medical_rec}, this is a patient's medical history in JSON format. Based on that, you'll need to understand their medical records. For any subsequent prompts I give, you must tailor your response according to the restrictions and requirements outlined in the patient's medical records. Consider this as PROMPT-1. Do not provide any type of introduction or conclusion for the generated content by your side. Even if the provided query has nothing to do with the medical records, You will reply with saying that the person in the medical record has nothing to do with this medical issue. But for the information I would still provide you the medical diagnosis. You are not supposed to refer any other type of information other than the medical records i have given and the actual webscraped content i have provided."
+            "content": f"Imagine you're a nutritionist with expertise in all types of medical conditions. {medical_rec}, this is a patient's medical history, one field per line. Based on that, you'll need to understand their medical records. For any subsequent prompts I give, you must tailor your response according to the restrictions and requirements outlined in the patient's medical records. Consider this as PROMPT-1. Do not provide any type of introduction or conclusion for the generated content by your side. Even if the provided query has nothing to do with the medical records, You will reply with saying that the person in the medical record has nothing to do with this medical issue. But for the information I would still provide you the medical diagnosis. You are not supposed to refer any other type of information other than the medical records i have given and the actual webscraped content i have provided."
         },
         {
             "role": "user",
@@ -209,32 +452,31 @@ def final_summary(medical_rec, summarized_content):
         }
     ]
 
-    chat_completion = groq_client.chat.completions.create(
-        messages=final_prompt,
-        model="llama3-8b-8192",
-    )
-
-    return chat_completion.choices[0].message.content.strip()
+    return await complete(final_prompt, emit=emit, stage="final")
 
 
-def llm_infer(medical_rec, webscraped_content, user_query):
-    content_chunks = split_content(webscraped_content)
+async def llm_infer(medical_rec, webscraped_content, user_query, emit=None):
+    # Only the chunks that bear on the question are worth a map call
+    with timed("chunking"):
+        content_chunks = await run_blocking(relevant_chunks, webscraped_content, user_query)
+    # One map call per chunk plus the final summary
+    medical_rec = prompt_profile(medical_rec, len(content_chunks) + 1)
     
-    # Step 1: Summarize individual chunks
-    summarized_content = summarize_chunks(medical_rec, content_chunks, user_query)
+    # Step 1: Summarize individual chunks, then reduce the summaries until they fit the final prompt
+    partial_summaries = await summarize_chunks(medical_rec, content_chunks, user_query, emit)
+    summarized_content = await reduce_summaries(partial_summaries, user_query)
 
     # Step 2: Generate the final summary from the summarized chunks
-    final_response = final_summary(medical_rec, summarized_content)
+    final_response = await final_summary(medical_rec, summarized_content, emit)
 
     return final_response
 
-def summarize_chunks_diet_plan(medical_rec,content_chunks, user_query):
-    summarized_chunks = []
-    for i, chunk in enumerate(content_chunks):
+async def summarize_chunks_diet_plan(medical_rec,content_chunks, user_query, emit=None):
+    async def summarize(i, chunk):
         combined_prompts = [
             {
                 "role": "user",
-                "content": f"Imagine you're a nutritionist with expertise in creating a good diet planner based on patient's {medical_rec}, this is a patient's medical history in JSON format. Based on that, you'll need to understand their medical records. For any subsequent prompts I give, you must tailor your response according to the restrictions and requirements outlined in the patient's medical records. Consider this as PROMPT-1. Do not provide any type of introduction or conclusion for the generated content by your side."
+                "content": f"Imagine you're a nutritionist with expertise in creating a good diet planner based on patient's {medical_rec}, this is a patient's medical history, one field per line. Based on that, you'll need to understand their medical records. For any subsequent prompts I give, you must tailor your response according to the restrictions and requirements outlined in the patient's medical records. Consider this as PROMPT-1. Do not provide any type of introduction or conclusion for the generated content by your side."
             },
             {
                 "role": "user",
@@ -242,24 +484,27 @@ def summarize_chunks_diet_plan(medical_rec,content_chunks, user_query):
             }
         ]
 
-        chat_completion = groq_client.chat.completions.create(
-            messages=combined_prompts,
-            model="llama3-8b-8192",
-        )
+        summary = await complete(combined_prompts, stage="map")
+        if emit:
+            await emit("chunk_summary", {"part": i + 1, "total": len(content_chunks)})
+        return summary
 
-        summarized_chunks.append(chat_completion.choices[0].message.content.strip())
+    # Map phase runs concurrently; gather keeps the summaries in chunk order
+    summarized_chunks = await bounded_gather(
+        (summarize(i, chunk) for i, chunk in enumerate(content_chunks)), MAP_CONCURRENCY
+    )
     
-    # Return the summarized chunks combined
-    return " ".join(summarized_chunks)
+    # Partial summaries in chunk order; reduce_summaries() combines them
+    return summarized_chunks
 
-def final_summary_diet_plan(medical_rec, summarized_content):
+async def final_summary_diet_plan(medical_rec, summarized_content, emit=None):
     """
     Take the summarized content from chunks and make a final concise summary.
     """
     final_prompt = [
         {
             "role": "user",
-            "content": f"Imagine you're a nutritionist with expertise in creating a good diet planner based on patient's {medical_rec}, this is a patient's medical history in JSON format. Based on that, you'll need to understand their medical records. For any subsequent prompts I give, you must tailor your response according to the restrictions and requirements outlined in the patient's medical records. Consider this as PROMPT-1. Do not provide any type of introduction or conclusion for the generated content by your side. Even if the provided query has nothing to do with the medical records, You will reply with saying that the person in the medical record has nothing to do with this medical issue. But for the information I would still provide you the medical diagnosis. You are not supposed to refer any other type of information other than the medical records i have given and the actual webscraped content i have provided."
+            "content": f"Imagine you're a nutritionist with expertise in creating a good diet planner based on patient's {medical_rec}, this is a patient's medical history, one field per line. Based on that, you'll need to understand their medical records. For any subsequent prompts I give, you must tailor your response according to the restrictions and requirements outlined in the patient's medical records. Consider this as PROMPT-1. Do not provide any type of introduction or conclusion for the generated content by your side. Even if the provided query has nothing to do with the medical records, You will reply with saying that the person in the medical record has nothing to do with this medical issue. But for the information I would still provide you the medical diagnosis. You are not supposed to refer any other type of information other than the medical records i have given and the actual webscraped content i have provided."
         },
         {
             "role": "user",
@@ -267,18 +512,16 @@ def final_summary_diet_plan(medical_rec, summarized_content):
         }
     ]
 
-    chat_completion = groq_client.chat.completions.create(
-        messages=final_prompt,
-        model="llama3-8b-8192",
-    )
-
-    return chat_completion.choices[0].message.content.strip()
+    return await complete(final_prompt, emit=emit, stage="final")
 
-def diet_plan_call(medical_rec,webscraped_content,user_query):
+async def diet_plan_call(medical_rec,webscraped_content,user_query, emit=None):
     
-    content_chunks = split_content(webscraped_content)
-    summarized_content = summarize_chunks_diet_plan(medical_rec,content_chunks, user_query)
-    final_response = final_summary_diet_plan(medical_rec, summarized_content)
+    with timed("chunking"):
+        content_chunks = await run_blocking(relevant_chunks, webscraped_content, user_query)
+    medical_rec = prompt_profile(medical_rec, len(content_chunks) + 1)
+    partial_summaries = await summarize_chunks_diet_plan(medical_rec,content_chunks, user_query, emit)
+    summarized_content = await reduce_summaries(partial_summaries, user_query)
+    final_response = await final_summary_diet_plan(medical_rec, summarized_content, emit)
 
     return final_response
 
@@ -76,6 +76,12 @@ export default function App() {
   const [isSummarizing, setIsSummarizing] = useState(false);
   
   const messagesEndRef = useRef(null);
+  // Patient MRN handed over by the records app (?mrn=...) and sent with every query
+  const patientMrn = useRef(new URLSearchParams(window.location.search).get('mrn') || '');
+  // One backend history session per browser tab
+  const sessionId = useRef(
+    window.crypto?.randomUUID ? window.crypto.randomUUID() : `${Date.now()}-${Math.random().toString(36).slice(2)}`
+  );
 
   useEffect(() => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
@@ -96,7 +102,7 @@ export default function App() {
     setIsLoading(true);
   
     try {
-      const response = await fetch(`http://localhost:8000/search?query=${encodeURIComponent(query)}`);
+      const response = await fetch(`http://localhost:8000/search?query=${encodeURIComponent(query)}&session_id=${sessionId.current}&mrn=${encodeURIComponent(patientMrn.current)}`);
       const data = await response.json();
   
       if (data.webscraping) {
@@ -141,9 +147,16 @@ export default function App() {
 
   const fetchChatHistory = async () => {
     try {
-      const response = await fetch('http://localhost:8000/chat-history');
-      const data = await response.json();
-      setChatHistory(data.history);
+      // Follow the cursor until the backend reports we're caught up
+      let history = [];
+      let cursor = 0;
+      while (cursor !== null) {
+        const response = await fetch(`http://localhost:8000/chat-history?session_id=${sessionId.current}&cursor=${cursor}`);
+        const data = await response.json();
+        history = history.concat(data.history);
+        cursor = data.next_cursor;
+      }
+      setChatHistory(history);
     } catch (error) {
       console.error('Error fetching chat history:', error);
     }
@@ -162,7 +175,7 @@ export default function App() {
       setIsSummarizing(true);
       
       // First, call the summarization endpoint
-      const summaryResponse = await fetch('http://localhost:8000/summarize-chat', {
+      const summaryResponse = await fetch(`http://localhost:8000/summarize-chat?session_id=${sessionId.current}`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',